@@ -1,10 +1,25 @@
 """
-管理员相关API端点（占位符）
+管理员相关API端点
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime, timedelta
+
+from config import settings
+from database import get_db
+from models.user import User
+from schemas.analytics import AnalyticsSeriesResponse
+from services.analytics_service import AnalyticsService, METRICS, GRANULARITIES, truncate_time
+from utils.auth import get_current_admin_user
+from utils.sql_profiler import recent_profiles
 
 router = APIRouter()
 
+# 未指定开始时间时返回的时间桶数
+DEFAULT_BUCKETS = 30
+
+
 @router.get("/dashboard")
 async def get_admin_dashboard():
     """获取管理员面板数据"""
@@ -13,4 +28,71 @@ async def get_admin_dashboard():
 @router.get("/users")
 async def admin_manage_users():
     """管理用户"""
-    return {"message": "用户管理API开发中..."}
\ No newline at end of file
+    return {"message": "用户管理API开发中..."}
+
+@router.get("/analytics/metrics")
+async def get_analytics_metrics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """可查询的分析指标和时间粒度"""
+    return {
+        "metrics": list(METRICS),
+        "granularities": list(GRANULARITIES)
+    }
+
+
+@router.get("/analytics/{metric}", response_model=AnalyticsSeriesResponse)
+async def get_analytics_series(
+    metric: str,
+    granularity: str = Query("day", description="时间粒度: minute/hour/day/week/month"),
+    start: Optional[datetime] = Query(None, description="开始时间(UTC)，默认为结束时间前30个时间桶"),
+    end: Optional[datetime] = Query(None, description="结束时间(UTC，不含)，默认为当前时间"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """查询分析指标的时间序列（只读汇总表）"""
+    if metric not in METRICS:
+        raise HTTPException(status_code=404, detail="分析指标不存在")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="不支持的时间粒度")
+    
+    end = end or datetime.utcnow()
+    if start is None:
+        start = truncate_time(end, granularity)
+        for _ in range(DEFAULT_BUCKETS - 1):
+            start = truncate_time(start - timedelta(seconds=1), granularity)
+    start = truncate_time(start, granularity)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="开始时间必须早于结束时间")
+    
+    try:
+        points = await AnalyticsService(db).get_series(metric, granularity, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return AnalyticsSeriesResponse(
+        metric=metric,
+        granularity=granularity,
+        start=start,
+        end=end,
+        total_count=sum(point["count"] for point in points),
+        total_amount=round(sum(point["amount"] for point in points), 2),
+        points=points
+    )
+
+
+@router.get("/debug/sql-profiles")
+async def get_sql_profiles(
+    limit: int = Query(20, ge=1, le=200, description="返回最近的请求数"),
+    n_plus_one_only: bool = Query(False, description="只返回有N+1候选的请求"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """最近请求的SQL分析结果（需开启 SQL_PROFILER_ENABLED）"""
+    if not settings.SQL_PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="SQL分析未开启")
+
+    profiles = [
+        profile for profile in reversed(recent_profiles)
+        if not n_plus_one_only or profile["n_plus_one"]
+    ]
+    return {"profiles": profiles[:limit]}
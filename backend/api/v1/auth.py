@@ -15,7 +15,7 @@ from utils.auth import (
     create_tokens_for_user, verify_token, get_current_user,
     get_current_active_user
 )
-from utils.exceptions import AuthenticationError, ValidationError
+from utils.exceptions import AuthenticationError, ValidationError, ServiceUnavailableError
 
 router = APIRouter()
 security = HTTPBearer()
@@ -49,6 +49,8 @@ async def register(
             user=UserResponse.from_orm(user)
         )
     
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
         if "邮箱已被注册" in str(e) or "用户名已被使用" in str(e):
             raise HTTPException(
@@ -149,7 +151,7 @@ async def change_password(
         else:
             raise ValidationError("密码修改失败")
     
-    except AuthenticationError:
+    except (AuthenticationError, ServiceUnavailableError):
         raise
     except Exception as e:
         raise HTTPException(
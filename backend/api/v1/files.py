@@ -0,0 +1,56 @@
+"""
+媒体文件分发端点
+"""
+import os
+import posixpath
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse
+
+from storage.base import get_storage
+from utils.file_delivery import MediaFileResponse, get_strong_etag
+from utils.signed_url import protected_media, verify_media_signature
+
+router = APIRouter()
+
+
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_media_file(file_path: str, request: Request):
+    """
+    分发存储后端中的媒体文件
+
+    支持 Range（206）、强ETag、If-None-Match / If-Modified-Since（304）；
+    付费媒体原始文件必须携带有效的签名参数
+    """
+    # 规范化路径，避免用 ./ 或 ../ 变体绕过付费路径检查；隐藏目录（如上传暂存目录）不对外分发
+    key = posixpath.normpath(file_path)
+    if any(part.startswith(".") for part in key.split("/")):
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    is_protected = protected_media.is_protected(key)
+    if is_protected and not verify_media_signature(
+        request.url.path,
+        request.query_params.get("expires"),
+        request.query_params.get("signature")
+    ):
+        raise HTTPException(status_code=403, detail="访问链接无效或已过期")
+
+    storage = get_storage()
+    full_path = storage.local_path(key)
+    if not full_path:
+        if storage.is_remote:
+            # 远程存储：校验通过后重定向到短期有效的预签名地址，由对象存储处理Range
+            return RedirectResponse(storage.presign(key), status_code=307)
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    file_stat = os.stat(full_path)
+    etag = await get_strong_etag(full_path, file_stat)
+
+    return MediaFileResponse(
+        full_path,
+        file_stat,
+        request.headers,
+        etag,
+        method=request.method,
+        private=is_protected
+    )
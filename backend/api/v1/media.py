@@ -1,22 +1,60 @@
 """
 媒体相关API端点
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
+from config import settings
 from database import get_db
 from models.user import User
 from models.media import MediaType, MediaStatus
 from schemas.media import (
     MediaResponse, MediaCreate, MediaUpdate, MediaListQuery, MediaListResponse,
     MediaUploadResponse, MediaStatsResponse, MediaCategoryResponse, 
-    MediaCategoryCreate, MediaCategoryUpdate
+    MediaCategoryCreate, MediaCategoryUpdate, MediaBatchUploadItem, MediaBatchUploadResponse,
+    TagFacet
 )
 from services.media_service import MediaService, MediaCategoryService
+from services.feed_cache import feed_cache, get_viewer_class
+from services.counter_service import media_counters
+from services.analytics_service import analytics, METRIC_MEDIA_VIEW, METRIC_MEDIA_PURCHASE
+from services.user_cache import user_cache
 from utils.auth import get_current_user, get_current_admin_user, optional_current_user
+from utils.signed_url import sign_media_url
+from utils.write_coordinator import write_coordinator
+from utils.logger import get_logger
 
 router = APIRouter()
+logger = get_logger(__name__)
+
+
+async def _get_media_with_purchase(db: AsyncSession, media_id: int, user_id: Optional[int]):
+    """查询媒体及指定用户的购买记录ID（单条SQL）"""
+    from sqlalchemy import select, and_
+    from models.media import Media, MediaPurchase
+
+    if user_id is None:
+        media = await db.get(Media, media_id)
+        return media, None
+
+    result = await db.execute(
+        select(Media, MediaPurchase.id)
+        .outerjoin(
+            MediaPurchase,
+            and_(
+                MediaPurchase.media_id == Media.id,
+                MediaPurchase.user_id == user_id
+            )
+        )
+        .where(Media.id == media_id)
+        .limit(1)
+    )
+    row = result.first()
+    if row is None:
+        return None, None
+    return row[0], row[1]
 
 
 @router.get("/", response_model=MediaListResponse)
@@ -31,15 +69,20 @@ async def get_media_list(
     is_featured: Optional[bool] = Query(None, description="是否精选"),
     status: Optional[MediaStatus] = Query(None, description="状态"),
     owner_id: Optional[int] = Query(None, description="所有者ID"),
-    tags: Optional[str] = Query(None, description="标签"),
-    sort_by: Optional[str] = Query("created_at", description="排序字段"),
+    tags: Optional[str] = Query(None, description="标签，多个用逗号分隔"),
+    tag_mode: str = Query("any", pattern="^(any|all)$", description="多标签匹配方式: any(任一) 或 all(全部)"),
+    sort_by: Optional[str] = Query(None, description="排序字段（有搜索词时默认按相关度 relevance，否则按 created_at）"),
     order: Optional[str] = Query("desc", description="排序方向"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的 next_cursor，传入后忽略 page"),
+    with_total: Optional[bool] = Query(None, description="是否统计总数，默认页码分页统计、游标分页不统计"),
     current_user: Optional[User] = Depends(optional_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """获取媒体列表"""
-    print(f"[获取媒体列表] 用户: {current_user.username if current_user else '游客'}, 页码: {page}, 页大小: {page_size}")
-    print(f"[获取媒体列表] 筛选条件 - 类型: {media_type}, 付费: {is_paid}, 私密: {is_private}")
+    logger.debug(
+        "获取媒体列表: 用户=%s, 页码=%s, 页大小=%s, 类型=%s, 付费=%s, 私密=%s",
+        current_user.id if current_user else "游客", page, page_size, media_type, is_paid, is_private
+    )
     
     query = MediaListQuery(
         page=page,
@@ -53,10 +96,21 @@ async def get_media_list(
         status=status,
         owner_id=owner_id,
         tags=tags,
+        tag_mode=tag_mode,
         sort_by=sort_by,
-        order=order
+        order=order,
+        cursor=cursor,
+        with_total=with_total
     )
     
+    # 公开列表命中缓存时直接返回序列化好的响应，不访问数据库
+    viewer = get_viewer_class(query, current_user) if feed_cache.enabled else None
+    cache_key = await feed_cache.make_key(query, viewer) if viewer else None
+    if cache_key:
+        cached = await feed_cache.get(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
+    
     service = MediaService(db)
     result = await service.get_media_list(
         query,
@@ -64,14 +118,71 @@ async def get_media_list(
         is_admin=current_user.is_admin if current_user else False
     )
     
-    print(f"[获取媒体列表] 返回结果 - 总数: {result.total}, 当前页数据: {len(result.media_list)}")
-    if result.media_list:
-        for media in result.media_list:
-            print(f"  - ID: {media.id}, 标题: {media.title}, 状态: {media.status}")
+    if cache_key:
+        body = result.model_dump_json().encode()
+        await feed_cache.set(cache_key, body)
+        return Response(content=body, media_type="application/json")
     
     return result
 
 
+@router.get("/tags/facets", response_model=List[TagFacet])
+async def get_tag_facets(
+    search: Optional[str] = Query(None, description="搜索关键词"),
+    media_type: Optional[MediaType] = Query(None, description="媒体类型"),
+    category_id: Optional[int] = Query(None, description="分类ID"),
+    is_paid: Optional[bool] = Query(None, description="是否付费"),
+    is_featured: Optional[bool] = Query(None, description="是否精选"),
+    owner_id: Optional[int] = Query(None, description="所有者ID"),
+    tags: Optional[str] = Query(None, description="标签，多个用逗号分隔"),
+    tag_mode: str = Query("any", pattern="^(any|all)$", description="多标签匹配方式: any(任一) 或 all(全部)"),
+    limit: int = Query(20, ge=1, le=100, description="返回标签数量"),
+    current_user: Optional[User] = Depends(optional_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取当前筛选条件下的热门标签及媒体数量"""
+    query = MediaListQuery(
+        search=search,
+        media_type=media_type,
+        category_id=category_id,
+        is_paid=is_paid,
+        is_featured=is_featured,
+        owner_id=owner_id,
+        tags=tags,
+        tag_mode=tag_mode
+    )
+    
+    service = MediaService(db)
+    facets = await service.get_tag_facets(
+        query,
+        current_user_id=current_user.id if current_user else None,
+        is_admin=current_user.is_admin if current_user else False,
+        limit=limit
+    )
+    return [TagFacet(**facet) for facet in facets]
+
+
+@router.get("/likes/status")
+async def get_like_status(
+    ids: str = Query(..., description="媒体ID，多个用逗号分隔"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """批量查询当前用户是否点赞过指定媒体（用于列表页一次性显示点赞状态）"""
+    try:
+        media_ids = [int(media_id) for media_id in ids.split(",") if media_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="媒体ID格式错误")
+    if len(media_ids) > 100:
+        raise HTTPException(status_code=400, detail="一次最多查询100个媒体")
+    
+    service = MediaService(db)
+    liked_ids = await service.get_liked_media_ids(current_user.id, media_ids)
+    return {
+        "liked_ids": sorted(liked_ids)
+    }
+
+
 @router.post("/upload", response_model=MediaUploadResponse)
 async def upload_media(
     file: UploadFile = File(..., description="上传的文件"),
@@ -87,8 +198,7 @@ async def upload_media(
     db: AsyncSession = Depends(get_db)
 ):
     """上传媒体文件（仅管理员）"""
-    print(f"[上传媒体] 用户ID: {current_user.id}, 文件名: {file.filename}")
-    print(f"[上传媒体] 标题: {title}, 付费: {is_paid}, 价格: {price}")
+    logger.debug("上传媒体: 用户ID=%s, 文件名=%s, 标题=%s, 付费=%s, 价格=%s", current_user.id, file.filename, title, is_paid, price)
     
     media_data = MediaCreate(
         title=title,
@@ -104,7 +214,7 @@ async def upload_media(
     service = MediaService(db)
     media = await service.upload_media(file, current_user.id, media_data)
     
-    print(f"[上传媒体] 创建成功 - ID: {media.id}, 状态: {media.status}")
+    logger.info("媒体上传成功: ID=%s, 用户ID=%s", media.id, current_user.id)
     
     from schemas.media import MediaResponse
     media_response = MediaResponse.from_orm_model(media)
@@ -114,11 +224,67 @@ async def upload_media(
         message="文件上传成功"
     )
     
-    print(f"[上传媒体] 返回响应 - Media ID: {media_response.id}, Status: {media_response.status}")
-    
     return result
 
 
+@router.post("/upload/batch", response_model=MediaBatchUploadResponse)
+async def upload_media_batch(
+    files: List[UploadFile] = File(..., description="上传的文件列表"),
+    title: Optional[str] = Form(None, description="标题"),
+    description: Optional[str] = Form(None, description="描述"),
+    tags: Optional[str] = Form(None, description="标签"),
+    category_id: Optional[int] = Form(None, description="分类ID"),
+    is_paid: bool = Form(False, description="是否付费"),
+    price: float = Form(0.0, description="价格"),
+    is_private: bool = Form(False, description="是否私密"),
+    is_featured: bool = Form(False, description="是否精选"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """批量上传媒体文件（仅管理员），表单中的属性应用到本批次所有文件"""
+    if len(files) > settings.MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多上传 {settings.MAX_BATCH_UPLOAD_FILES} 个文件"
+        )
+    
+    logger.debug("批量上传媒体: 用户ID=%s, 文件数=%d", current_user.id, len(files))
+    
+    media_data = MediaCreate(
+        title=title,
+        description=description,
+        tags=tags,
+        category_id=category_id,
+        is_paid=is_paid,
+        price=price,
+        is_private=is_private,
+        is_featured=is_featured
+    )
+    
+    service = MediaService(db)
+    results = await service.upload_media_batch(files, current_user.id, media_data)
+    
+    items = [
+        MediaBatchUploadItem(
+            filename=item["filename"],
+            success=item["media"] is not None,
+            media=MediaResponse.from_orm_model(item["media"]) if item["media"] else None,
+            error=item["error"]
+        )
+        for item in results
+    ]
+    success_count = sum(1 for item in items if item.success)
+    
+    logger.info("批量上传媒体完成: 用户ID=%s, 成功=%d, 失败=%d", current_user.id, success_count, len(items) - success_count)
+    
+    return MediaBatchUploadResponse(
+        items=items,
+        success_count=success_count,
+        failed_count=len(items) - success_count,
+        message="批量上传完成"
+    )
+
+
 @router.get("/{media_id}", response_model=MediaResponse)
 async def get_media_detail(
     media_id: int,
@@ -299,13 +465,11 @@ async def access_paid_media(
     访问付费媒体内容
     需要扣除积分,价格字段转换为积分(price * 10)
     """
-    from sqlalchemy import select
-    from models.media import Media, MediaPurchase
+    from models.media import MediaPurchase
     from models.payment import CreditTransaction
 
-    # 查询媒体
-    result = await db.execute(select(Media).where(Media.id == media_id))
-    media = result.scalar_one_or_none()
+    # 一次查询同时取出媒体和当前用户的购买记录
+    media, purchase_id = await _get_media_with_purchase(db, media_id, current_user.id)
     
     if not media:
         raise HTTPException(status_code=404, detail="媒体不存在")
@@ -325,73 +489,91 @@ async def access_paid_media(
             "message": "管理员或所有者，无需支付",
             "media_id": media_id,
             "has_access": True,
-            "file_url": media.file_url
+            "file_url": sign_media_url(media.file_url)
         }
     
     # 检查用户是否已经购买过
-    result = await db.execute(
-        select(MediaPurchase).where(
-            MediaPurchase.user_id == current_user.id,
-            MediaPurchase.media_id == media_id
-        )
-    )
-    existing_purchase = result.scalar_one_or_none()
-    
-    if existing_purchase:
+    if purchase_id:
         return {
             "message": "您已购买过此内容",
             "media_id": media_id,
             "has_access": True,
-            "file_url": media.file_url
+            "file_url": sign_media_url(media.file_url)
         }
     
     # 计算需要的积分 (价格转换为积分, price字段以美元为单位, 1美元=10积分)
     required_credits = int(media.price * 10)
     
-    # 检查用户积分是否足够
-    if current_user.credits < required_credits:
-        raise HTTPException(
-            status_code=402,
-            detail=f"积分不足。需要 {required_credits} 积分，当前余额 {current_user.credits} 积分"
+    async def purchase_media(session: AsyncSession) -> Optional[int]:
+        """扣除积分并记录购买，已购买过时不扣除并返回None"""
+        # 上面的购买检查在写事务之外，并发请求可能都通过；在写事务中重新检查
+        existing = await session.execute(
+            select(MediaPurchase.id).where(
+                MediaPurchase.user_id == current_user.id,
+                MediaPurchase.media_id == media_id
+            )
         )
+        if existing.first() is not None:
+            return None
+        
+        # current_user 可能来自缓存，在写事务中读取最新余额
+        user = (await session.execute(select(User).where(User.id == current_user.id))).scalar_one()
+        
+        # 检查用户积分是否足够
+        if user.credits < required_credits:
+            raise HTTPException(
+                status_code=402,
+                detail=f"积分不足。需要 {required_credits} 积分，当前余额 {user.credits} 积分"
+            )
+        
+        # 扣除积分
+        balance_before = user.credits
+        user.credits -= required_credits
+        
+        # 创建购买记录
+        purchase = MediaPurchase(
+            user_id=current_user.id,
+            media_id=media_id,
+            price=media.price
+        )
+        
+        # 创建积分交易记录
+        transaction = CreditTransaction(
+            user_id=current_user.id,
+            amount=-required_credits,
+            balance_before=balance_before,
+            balance_after=user.credits,
+            transaction_type="consume",
+            description=f"查看付费内容: {media.title or media.filename}",
+            media_id=media_id
+        )
+        
+        session.add(purchase)
+        session.add(transaction)
+        return user.credits
     
-    # 扣除积分
-    balance_before = current_user.credits
-    current_user.credits -= required_credits
-    
-    # 创建购买记录
-    purchase = MediaPurchase(
-        user_id=current_user.id,
-        media_id=media_id,
-        price=media.price
-    )
-    
-    # 创建积分交易记录
-    transaction = CreditTransaction(
-        user_id=current_user.id,
-        amount=-required_credits,
-        balance_before=balance_before,
-        balance_after=current_user.credits,
-        transaction_type="consume",
-        description=f"查看付费内容: {media.title or media.filename}",
-        media_id=media_id
-    )
-    
-    db.add(purchase)
-    db.add(transaction)
+    credits_remaining = await write_coordinator.run(purchase_media)
+    if credits_remaining is None:
+        return {
+            "message": "您已购买过此内容",
+            "media_id": media_id,
+            "has_access": True,
+            "file_url": sign_media_url(media.file_url)
+        }
+    await user_cache.invalidate(current_user.id)
     
     # 增加查看次数
-    media.view_count += 1
-    
-    await db.commit()
+    await media_counters.incr(media_id, "view_count")
+    analytics.record(METRIC_MEDIA_VIEW)
+    analytics.record(METRIC_MEDIA_PURCHASE, amount=media.price)
     
     return {
         "message": f"成功扣除 {required_credits} 积分",
         "media_id": media_id,
         "has_access": True,
-        "file_url": media.file_url,
+        "file_url": sign_media_url(media.file_url),
         "credits_used": required_credits,
-        "credits_remaining": current_user.credits
+        "credits_remaining": credits_remaining
     }
 
 
@@ -404,12 +586,9 @@ async def check_media_access(
     """
     检查用户是否有权访问某个媒体内容
     """
-    from sqlalchemy import select
-    from models.media import Media, MediaPurchase
-    
-    # 查询媒体
-    result = await db.execute(select(Media).where(Media.id == media_id))
-    media = result.scalar_one_or_none()
+    media, purchase_id = await _get_media_with_purchase(
+        db, media_id, current_user.id if current_user else None
+    )
     
     if not media:
         raise HTTPException(status_code=404, detail="媒体不存在")
@@ -442,15 +621,7 @@ async def check_media_access(
         }
     
     # 检查是否已购买
-    result = await db.execute(
-        select(MediaPurchase).where(
-            MediaPurchase.user_id == current_user.id,
-            MediaPurchase.media_id == media_id
-        )
-    )
-    purchase = result.scalar_one_or_none()
-    
-    if purchase:
+    if purchase_id:
         return {
             "has_access": True,
             "is_paid": True,
@@ -14,6 +14,9 @@ from schemas.payment import (
     CreditTransactionResponse, CreditTransactionListResponse
 )
 from utils.auth import get_current_user
+from services.analytics_service import analytics, METRIC_REVENUE
+from services.user_cache import user_cache
+from utils.write_coordinator import write_coordinator
 from config import Settings
 
 router = APIRouter()
@@ -23,8 +26,7 @@ settings = Settings()
 @router.post("/credits/recharge", response_model=CreditRechargeResponse)
 async def recharge_credits(
     recharge_data: CreditRechargeRequest,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     积分充值
@@ -37,22 +39,24 @@ async def recharge_credits(
     order_no = f"CR{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:8].upper()}"
     
     # 创建充值订单
-    order = Order(
-        order_no=order_no,
-        user_id=current_user.id,
-        order_type=OrderType.CREDITS,
-        title=f"积分充值 - {credits}积分",
-        description=f"充值金额: ${recharge_data.amount} USD = {credits}积分",
-        amount=recharge_data.amount,
-        discount_amount=0.0,
-        final_amount=recharge_data.amount,
-        payment_method=recharge_data.payment_method,
-        status=OrderStatus.PENDING
-    )
-    
-    db.add(order)
-    await db.commit()
-    await db.refresh(order)
+    async def create_order(session: AsyncSession) -> Order:
+        order = Order(
+            order_no=order_no,
+            user_id=current_user.id,
+            order_type=OrderType.CREDITS,
+            title=f"积分充值 - {credits}积分",
+            description=f"充值金额: ${recharge_data.amount} USD = {credits}积分",
+            amount=recharge_data.amount,
+            discount_amount=0.0,
+            final_amount=recharge_data.amount,
+            payment_method=recharge_data.payment_method,
+            status=OrderStatus.PENDING
+        )
+        session.add(order)
+        await session.flush()
+        return order
+    
+    order = await write_coordinator.run(create_order)
     
     # 准备支付信息
     payment_info = {}
@@ -172,8 +176,7 @@ async def get_credit_balance(
 @router.post("/admin/credits/approve/{order_id}")
 async def approve_credit_recharge(
     order_id: int,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     管理员审核并完成积分充值
@@ -184,52 +187,57 @@ async def approve_credit_recharge(
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="需要管理员权限")
     
-    # 查询订单
-    result = await db.execute(select(Order).where(Order.id == order_id))
-    order = result.scalar_one_or_none()
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="订单不存在")
-    
-    if order.status != OrderStatus.PENDING:
-        raise HTTPException(status_code=400, detail="订单已处理或状态不正确")
-    
-    if order.order_type != OrderType.CREDITS:
-        raise HTTPException(status_code=400, detail="不是积分充值订单")
-    
-    # 查询用户
-    result = await db.execute(select(User).where(User.id == order.user_id))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="用户不存在")
-    
-    # 计算积分
-    credits = int(order.amount * 10)
-    
-    # 记录充值前的余额
-    balance_before = user.credits
-    
-    # 增加用户积分
-    user.credits += credits
-    
-    # 更新订单状态
-    order.status = OrderStatus.PAID
-    order.paid_at = datetime.utcnow()
-    
-    # 创建积分交易记录
-    transaction = CreditTransaction(
-        user_id=user.id,
-        amount=credits,
-        balance_before=balance_before,
-        balance_after=user.credits,
-        transaction_type="recharge",
-        description=f"充值积分 - 订单号: {order.order_no}",
-        order_id=order.id
-    )
-    
-    db.add(transaction)
-    await db.commit()
+    async def complete_order(session: AsyncSession):
+        # 在写事务中检查订单状态，重复审核不会重复充值
+        result = await session.execute(select(Order).where(Order.id == order_id))
+        order = result.scalar_one_or_none()
+        
+        if not order:
+            raise HTTPException(status_code=404, detail="订单不存在")
+        
+        if order.status != OrderStatus.PENDING:
+            raise HTTPException(status_code=400, detail="订单已处理或状态不正确")
+        
+        if order.order_type != OrderType.CREDITS:
+            raise HTTPException(status_code=400, detail="不是积分充值订单")
+        
+        # 查询用户
+        result = await session.execute(select(User).where(User.id == order.user_id))
+        user = result.scalar_one_or_none()
+        
+        if not user:
+            raise HTTPException(status_code=404, detail="用户不存在")
+        
+        # 计算积分
+        credits = int(order.amount * 10)
+        
+        # 记录充值前的余额
+        balance_before = user.credits
+        
+        # 增加用户积分
+        user.credits += credits
+        
+        # 更新订单状态
+        order.status = OrderStatus.PAID
+        order.paid_at = datetime.utcnow()
+        
+        # 创建积分交易记录
+        transaction = CreditTransaction(
+            user_id=user.id,
+            amount=credits,
+            balance_before=balance_before,
+            balance_after=user.credits,
+            transaction_type="recharge",
+            description=f"充值积分 - 订单号: {order.order_no}",
+            order_id=order.id
+        )
+        
+        session.add(transaction)
+        return order, user, credits
+    
+    order, user, credits = await write_coordinator.run(complete_order)
+    await user_cache.invalidate(user.id)
+    analytics.record(METRIC_REVENUE, amount=order.final_amount, at=order.paid_at)
     
     return {
         "message": "积分充值成功",
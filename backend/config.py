@@ -35,6 +35,21 @@ class Settings(BaseSettings):
         env="DATABASE_URL"
     )
     
+    # SQLite调优配置
+    SQLITE_SYNCHRONOUS: str = Field(default="NORMAL", env="SQLITE_SYNCHRONOUS")  # WAL 模式下 NORMAL 只在检查点时同步磁盘
+    SQLITE_BUSY_TIMEOUT_MS: int = Field(default=5000, env="SQLITE_BUSY_TIMEOUT_MS")  # 等待其他进程释放锁的时间
+    SQLITE_CACHE_SIZE_KB: int = Field(default=16384, env="SQLITE_CACHE_SIZE_KB")  # 每个连接的页缓存
+    SQLITE_MMAP_SIZE: int = Field(default=256 * 1024 * 1024, env="SQLITE_MMAP_SIZE")  # 内存映射读取的大小（字节）
+    SQLITE_WRITER_POOL_SIZE: int = Field(default=1, env="SQLITE_WRITER_POOL_SIZE")  # 写连接数
+    SQLITE_WRITER_POOL_TIMEOUT: int = Field(default=30, env="SQLITE_WRITER_POOL_TIMEOUT")  # 等待写连接的秒数
+    SQLITE_READER_POOL_SIZE: int = Field(default=8, env="SQLITE_READER_POOL_SIZE")  # 只读连接数
+    SQLITE_READER_MAX_OVERFLOW: int = Field(default=8, env="SQLITE_READER_MAX_OVERFLOW")  # 只读连接池允许的临时连接数
+    
+    # 写入协调器配置（消息、计数、购买、订单等写入在一个事务中组提交）
+    WRITE_BATCH_MAX_JOBS: int = Field(default=64, env="WRITE_BATCH_MAX_JOBS")  # 每次组提交最多包含的作业数
+    WRITE_QUEUE_MAX_PENDING: int = Field(default=1000, env="WRITE_QUEUE_MAX_PENDING")  # 排队作业上限，超出返回503
+    WRITE_LOCK_RETRIES: int = Field(default=3, env="WRITE_LOCK_RETRIES")  # 批次遇到锁冲突时的重试次数
+    
     # Redis配置（用于缓存和会话）
     REDIS_URL: str = Field(default="redis://localhost:6379", env="REDIS_URL")
     REDIS_DB: int = Field(default=0, env="REDIS_DB")
@@ -42,9 +57,61 @@ class Settings(BaseSettings):
     # 文件上传配置
     UPLOAD_DIR: str = Field(default="static/uploads", env="UPLOAD_DIR")
     MAX_FILE_SIZE: int = Field(default=50 * 1024 * 1024, env="MAX_FILE_SIZE")  # 50MB
+    UPLOAD_FANOUT_LEVELS: int = Field(default=2, env="UPLOAD_FANOUT_LEVELS")  # 哈希前缀目录层数: ab/cd/<hash>
+    MAX_BATCH_UPLOAD_FILES: int = Field(default=200, env="MAX_BATCH_UPLOAD_FILES")  # 批量上传单次最多文件数
+    MEDIA_WORKER_THREADS: int = Field(default=4, env="MEDIA_WORKER_THREADS")  # 缩略图等衍生文件处理线程数
     ALLOWED_IMAGE_TYPES: List[str] = ["image/jpeg", "image/png", "image/gif", "image/webp"]
     ALLOWED_VIDEO_TYPES: List[str] = ["video/mp4", "video/avi", "video/mov", "video/wmv"]
     
+    # 存储后端配置
+    STORAGE_BACKEND: str = Field(default="local", env="STORAGE_BACKEND")  # local 或 s3
+    STORAGE_LOCAL_ROOTS: List[str] = Field(default=[], env="STORAGE_LOCAL_ROOTS")  # 本地分片目录，默认只用 UPLOAD_DIR
+    S3_ENDPOINT_URL: str = Field(default="", env="S3_ENDPOINT_URL")  # 如 MinIO: http://localhost:9000
+    S3_REGION: str = Field(default="us-east-1", env="S3_REGION")
+    S3_BUCKET: str = Field(default="", env="S3_BUCKET")
+    S3_ACCESS_KEY: str = Field(default="", env="S3_ACCESS_KEY")
+    S3_SECRET_KEY: str = Field(default="", env="S3_SECRET_KEY")
+    S3_PUBLIC_BASE_URL: str = Field(default="", env="S3_PUBLIC_BASE_URL")  # 缩略图的公共读CDN地址，原始文件始终经由本服务分发
+    S3_PUBLIC_THUMBNAILS_ONLY: bool = Field(default=False, env="S3_PUBLIC_THUMBNAILS_ONLY")  # 确认公共读策略只开放缩略图（*/thumb_*），否则不允许配置 S3_PUBLIC_BASE_URL
+    S3_MULTIPART_PART_SIZE: int = Field(default=8 * 1024 * 1024, env="S3_MULTIPART_PART_SIZE")  # bytes
+    
+    # 文件分发配置
+    MEDIA_CACHE_MAX_AGE: int = Field(default=3600, env="MEDIA_CACHE_MAX_AGE")  # 秒
+    MEDIA_IMMUTABLE_MAX_AGE: int = Field(default=31536000, env="MEDIA_IMMUTABLE_MAX_AGE")  # 秒
+    MEDIA_STREAM_CHUNK_SIZE: int = Field(default=256 * 1024, env="MEDIA_STREAM_CHUNK_SIZE")  # bytes
+    MEDIA_URL_EXPIRE_SECONDS: int = Field(default=3600, env="MEDIA_URL_EXPIRE_SECONDS")  # 付费内容签名URL有效期
+    PROTECTED_MEDIA_REFRESH_SECONDS: int = Field(default=60, env="PROTECTED_MEDIA_REFRESH_SECONDS")  # 秒
+    
+    # 媒体列表缓存配置
+    FEED_CACHE_ENABLED: bool = Field(default=True, env="FEED_CACHE_ENABLED")
+    FEED_CACHE_TTL: int = Field(default=30, env="FEED_CACHE_TTL")  # 秒，同时决定浏览数、点赞数的最大延迟
+    FEED_CACHE_L1_SIZE: int = Field(default=256, env="FEED_CACHE_L1_SIZE")  # 进程内缓存条数
+    FEED_CACHE_VERSION_CHECK_SECONDS: float = Field(default=1.0, env="FEED_CACHE_VERSION_CHECK_SECONDS")  # 从Redis同步版本号的间隔
+    
+    # 计数器配置
+    COUNTER_FLUSH_INTERVAL: int = Field(default=5, env="COUNTER_FLUSH_INTERVAL")  # 浏览/下载计数写回数据库的间隔（秒）
+    
+    # 已认证用户缓存配置
+    USER_CACHE_ENABLED: bool = Field(default=True, env="USER_CACHE_ENABLED")
+    USER_CACHE_TTL: int = Field(default=120, env="USER_CACHE_TTL")  # Redis中的缓存时间（秒）
+    USER_CACHE_L1_TTL: int = Field(default=5, env="USER_CACHE_L1_TTL")  # 进程内缓存时间（秒），即其他进程感知变更的最大延迟
+    USER_CACHE_L1_SIZE: int = Field(default=10000, env="USER_CACHE_L1_SIZE")  # 进程内缓存用户数
+    
+    # 密码哈希配置
+    PASSWORD_HASH_EXECUTOR: str = Field(default="process", env="PASSWORD_HASH_EXECUTOR")  # process 或 thread（安装 bcrypt 库时可用线程）
+    PASSWORD_HASH_WORKERS: int = Field(default=4, env="PASSWORD_HASH_WORKERS")  # 哈希并发数，0 表示在事件循环中同步计算
+    PASSWORD_HASH_MAX_PENDING: int = Field(default=64, env="PASSWORD_HASH_MAX_PENDING")  # 排队+执行中的上限，超出返回503
+    PASSWORD_HASH_SCHEME: str = Field(default="bcrypt", env="PASSWORD_HASH_SCHEME")  # bcrypt 或 argon2（argon2id，需要 argon2-cffi）
+    PASSWORD_HASH_COST: int = Field(default=0, env="PASSWORD_HASH_COST")  # bcrypt rounds / argon2 time_cost，0 表示启动时自动校准
+    PASSWORD_HASH_TARGET_MS: int = Field(default=250, env="PASSWORD_HASH_TARGET_MS")  # 自动校准时单次哈希的延迟预算（毫秒）
+    PASSWORD_HASH_ARGON2_MEMORY_KB: int = Field(default=65536, env="PASSWORD_HASH_ARGON2_MEMORY_KB")  # argon2 内存成本
+    PASSWORD_HASH_ARGON2_PARALLELISM: int = Field(default=2, env="PASSWORD_HASH_ARGON2_PARALLELISM")  # argon2 并行度
+    
+    # 运营分析配置
+    ANALYTICS_FLUSH_INTERVAL: int = Field(default=10, env="ANALYTICS_FLUSH_INTERVAL")  # 事件写入汇总表的间隔（秒）
+    ANALYTICS_MINUTE_RETENTION_HOURS: int = Field(default=48, env="ANALYTICS_MINUTE_RETENTION_HOURS")  # 分钟粒度保留时长
+    ANALYTICS_HOUR_RETENTION_DAYS: int = Field(default=90, env="ANALYTICS_HOUR_RETENTION_DAYS")  # 小时粒度保留天数
+    
     # 邮件配置
     SMTP_HOST: str = Field(default="smtp.gmail.com", env="SMTP_HOST")
     SMTP_PORT: int = Field(default=587, env="SMTP_PORT")
@@ -65,6 +132,12 @@ class Settings(BaseSettings):
     # 限流配置
     RATE_LIMIT_REQUESTS: int = Field(default=100, env="RATE_LIMIT_REQUESTS")
     RATE_LIMIT_WINDOW: int = Field(default=60, env="RATE_LIMIT_WINDOW")  # 秒
+    RATE_LIMIT_ENABLED: bool = Field(default=True, env="RATE_LIMIT_ENABLED")
+    RATE_LIMIT_AUTH_REQUESTS: int = Field(default=10, env="RATE_LIMIT_AUTH_REQUESTS")  # 登录/注册，按IP计数
+    RATE_LIMIT_AUTH_WINDOW: int = Field(default=60, env="RATE_LIMIT_AUTH_WINDOW")  # 秒
+    RATE_LIMIT_UPLOAD_REQUESTS: int = Field(default=30, env="RATE_LIMIT_UPLOAD_REQUESTS")  # 上传，按用户计数
+    RATE_LIMIT_UPLOAD_WINDOW: int = Field(default=60, env="RATE_LIMIT_UPLOAD_WINDOW")  # 秒
+    RATE_LIMIT_TRUST_PROXY: bool = Field(default=False, env="RATE_LIMIT_TRUST_PROXY")  # 是否信任 X-Forwarded-For 中的客户端IP
     
     # WebSocket配置
     WS_MESSAGE_MAX_SIZE: int = Field(default=1024, env="WS_MESSAGE_MAX_SIZE")  # bytes
@@ -72,8 +145,23 @@ class Settings(BaseSettings):
     WS_PING_TIMEOUT: int = Field(default=20, env="WS_PING_TIMEOUT")  # 秒
     
     # 日志配置
-    LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")
-    LOG_FILE: str = Field(default="logs/app.log", env="LOG_FILE")
+    LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")  # 可按模块设置，如 "INFO,services.media_service=DEBUG"
+    LOG_FILE: str = Field(default="logs/app.log", env="LOG_FILE")  # JSON行格式，为空时输出到标准输出
+    LOG_MAX_BYTES: int = Field(default=10 * 1024 * 1024, env="LOG_MAX_BYTES")  # 单个日志文件大小上限，超出后轮转
+    LOG_BACKUP_COUNT: int = Field(default=5, env="LOG_BACKUP_COUNT")  # 保留的轮转文件数
+    LOG_QUEUE_SIZE: int = Field(default=10000, env="LOG_QUEUE_SIZE")  # 待写入日志队列上限，满时丢弃
+    ACCESS_LOG_ENABLED: bool = Field(default=True, env="ACCESS_LOG_ENABLED")
+    ACCESS_LOG_SAMPLE_RATE: float = Field(default=1.0, env="ACCESS_LOG_SAMPLE_RATE")  # 正常请求的抽样比例
+    ACCESS_LOG_SLOW_MS: int = Field(default=1000, env="ACCESS_LOG_SLOW_MS")  # 超过该耗时的请求总是记录
+    
+    # 监控指标配置
+    METRICS_ENABLED: bool = Field(default=False, env="METRICS_ENABLED")  # 是否开放 /metrics（无鉴权，开启时只应在内网可访问）
+    PROMETHEUS_MULTIPROC_DIR: str = Field(default="", env="PROMETHEUS_MULTIPROC_DIR")  # 多进程部署时的指标目录，启动前需清空
+    
+    # SQL分析配置（开发用）
+    SQL_PROFILER_ENABLED: bool = Field(default=False, env="SQL_PROFILER_ENABLED")  # 记录每个请求的SQL并返回 X-DB-Queries / X-DB-Time
+    SQL_PROFILER_REPEAT_THRESHOLD: int = Field(default=5, env="SQL_PROFILER_REPEAT_THRESHOLD")  # 同一语句形状执行达到该次数视为N+1候选
+    SQL_PROFILER_HISTORY: int = Field(default=50, env="SQL_PROFILER_HISTORY")  # 调试接口保留的最近请求数
     
     class Config:
         env_file = ".env"
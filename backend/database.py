@@ -1,13 +1,18 @@
 """
 数据库连接和配置
 """
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 import redis.asyncio as redis
+import time
 from typing import AsyncGenerator
 
 from config import settings
+from utils.logger import get_logger
+from utils.sqlite_engine import create_engines, RoutingSession
+
+logger = get_logger(__name__)
 
 # SQLite 数据库配置
 # 创建数据库目录
@@ -24,17 +29,16 @@ sync_engine = create_engine(
     echo=settings.DEBUG
 )
 
-# 异步引擎（用于FastAPI应用）
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=False
-)
+# 异步引擎（用于FastAPI应用）：engine 为写引擎（建表等DDL也使用它），reader_engine 为只读连接池
+engine, reader_engine = create_engines(settings.DATABASE_URL)
 
-# 数据库会话
+# 数据库会话（读语句使用读连接池，写入后使用写连接）
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
-    expire_on_commit=False
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+    info={"writer_engine": engine, "reader_engine": reader_engine}
 )
 
 # 数据库基类
@@ -49,6 +53,46 @@ class RedisDB:
 
 redis_db = RedisDB()
 
+# Redis出错后暂停使用的秒数
+REDIS_RETRY_SECONDS = 30
+
+
+class RedisBackoff:
+    """
+    可选的Redis访问
+
+    缓存、计数器、限流等在Redis不可用时退回进程内实现：
+    出错后 REDIS_RETRY_SECONDS 秒内 client() 返回None，不再反复等待连接超时。
+    """
+
+    def __init__(self, component: str, fallback: str):
+        self.component = component
+        self.fallback = fallback
+        self._retry_at = 0.0
+        self._scripts = {}
+        self._scripts_client = None
+
+    def client(self):
+        """可用的Redis连接，未连接或暂停使用期间返回None"""
+        client = redis_db.redis_client
+        if client is None or time.monotonic() < self._retry_at:
+            return None
+        return client
+
+    def failed(self, error: Exception):
+        """访问Redis出错，暂停使用一段时间"""
+        self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+        logger.warning("%s无法访问Redis，%s: %s", self.component, self.fallback, error)
+
+    def script(self, client, source: str):
+        """注册Lua脚本（按连接缓存，重连后重新注册）"""
+        if self._scripts_client is not client:
+            self._scripts = {}
+            self._scripts_client = client
+        if source not in self._scripts:
+            self._scripts[source] = client.register_script(source)
+        return self._scripts[source]
+
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """获取数据库会话"""
@@ -72,11 +116,107 @@ async def create_all_tables():
     async with engine.begin() as conn:
         # 导入所有模型以确保它们被注册
         from models.user import User
-        from models.media import Media, MediaCategory
+        from models.media import Media, MediaCategory, MediaBlob, Tag, MediaTag, MediaLike, MediaStatsRollup
         from models.chat import ChatRoom, ChatMessage, OnlineUser
         from models.payment import Order, VIPPlan
+        from models.analytics import AnalyticsRollup
 
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_dedupe_media_purchases)
+        await conn.run_sync(_add_missing_indexes)
+        await conn.run_sync(_rewrite_public_original_urls)
+        
+        # 媒体全文索引（SQLite FTS5）
+        from services.search_service import create_search_index
+        await conn.run_sync(create_search_index)
+        
+        # 媒体统计汇总表（首次创建时回填）
+        from services.stats_service import create_stats_rollup
+        await conn.run_sync(create_stats_rollup)
+        
+        # 运营分析汇总表（首次创建时按历史记录回填）
+        from services.analytics_service import create_analytics_rollups
+        await conn.run_sync(create_analytics_rollups)
+
+
+def _add_missing_columns(sync_conn):
+    """为已存在的表补充模型中新增的列（create_all 不会修改已有表）"""
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
+            if isinstance(default, bool):
+                ddl += f" DEFAULT {int(default)}"
+            elif isinstance(default, (int, float)):
+                ddl += f" DEFAULT {default}"
+            sync_conn.exec_driver_sql(ddl)
+            
+            # 新增列上的索引
+            for index in table.indexes:
+                if column in index.columns.values():
+                    index.create(sync_conn, checkfirst=True)
+
+
+def _add_missing_indexes(sync_conn):
+    """为已存在的表补充模型中新增的索引"""
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(sync_conn)
+
+
+def _dedupe_media_purchases(sync_conn):
+    """
+    购买记录的 (user_id, media_id) 索引改为唯一索引前，删除并发购买产生的重复记录（保留最早的一条）
+
+    重复扣除的积分仍记录在 credit_transactions 中，可据此退还。
+    """
+    inspector = inspect(sync_conn)
+    if not inspector.has_table("media_purchases"):
+        return
+    existing_indexes = {index["name"] for index in inspector.get_indexes("media_purchases")}
+    if "uq_media_purchases_user_id_media_id" in existing_indexes:
+        return
+
+    result = sync_conn.exec_driver_sql(
+        "DELETE FROM media_purchases WHERE id NOT IN "
+        "(SELECT MIN(id) FROM media_purchases GROUP BY user_id, media_id)"
+    )
+    if result.rowcount:
+        logger.warning("删除了 %d 条重复的媒体购买记录", result.rowcount)
+    sync_conn.exec_driver_sql("DROP INDEX IF EXISTS ix_media_purchases_user_id_media_id")
+
+
+def _rewrite_public_original_urls(sync_conn):
+    """早期版本把原始文件URL写成公共CDN地址，改回经由本服务分发（付费文件需要校验签名）"""
+    if not settings.S3_PUBLIC_BASE_URL:
+        return
+
+    from sqlalchemy import update, func
+    from models.media import Media
+    from storage.base import MEDIA_URL_PREFIX
+
+    public_prefix = settings.S3_PUBLIC_BASE_URL.rstrip("/") + "/"
+    sync_conn.execute(
+        update(Media)
+        .where(Media.file_url.startswith(public_prefix, autoescape=True))
+        .values(file_url=MEDIA_URL_PREFIX + func.substr(Media.file_url, len(public_prefix) + 1))
+    )
 
 
 async def connect_to_databases():
@@ -100,6 +240,8 @@ async def close_database_connections():
 
     # 关闭SQLite连接
     await engine.dispose()
+    if reader_engine is not engine:
+        await reader_engine.dispose()
 
     print("✅ 已关闭所有数据库连接")
 
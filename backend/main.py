@@ -5,16 +5,31 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import uvicorn
 import os
+import asyncio
 from contextlib import asynccontextmanager
 
 from config import settings
-from database import engine, create_all_tables
+from database import engine, reader_engine, create_all_tables, connect_to_databases, close_database_connections
 from api.v1.router import api_router
+from api.v1 import files
 from utils.exceptions import CustomHTTPException
+from utils.middleware import RateLimitMiddleware, AccessLogMiddleware, MetricsMiddleware, SqlProfilerMiddleware
+from utils.sql_profiler import install_profiler
+from utils.metrics import instrument_engine, render_metrics, mark_process_dead, METRICS_CONTENT_TYPE
+from utils.logger import log_pipeline, get_logger
+from utils.auth import password_hash_pool
+from utils.write_coordinator import write_coordinator
+from utils.password_hashing import configure_password_hashing
+from utils.signed_url import protected_media
+from services.counter_service import media_counters
+from services.analytics_service import analytics
+from storage.base import get_storage
+
+logger = get_logger(__name__)
 
 
 @asynccontextmanager
@@ -22,13 +37,38 @@ async def lifespan(app: FastAPI):
     """应用程序生命周期管理"""
     # 启动时
     print("🚀 启动个人展示网站后端服务...")
+    log_pipeline.start()
+    configure_password_hashing()
     await create_all_tables()
     print("✅ 数据库表已创建")
+    await connect_to_databases()
+    write_coordinator.start()
+    await protected_media.load()
+    refresh_task = asyncio.create_task(protected_media.refresh_periodically())
+    counter_task = asyncio.create_task(media_counters.flush_periodically())
+    analytics_task = asyncio.create_task(analytics.flush_periodically())
     
     yield
     
     # 关闭时
     print("🛑 关闭服务...")
+    refresh_task.cancel()
+    counter_task.cancel()
+    analytics_task.cancel()
+    try:
+        await media_counters.flush()
+    except Exception:
+        logger.exception("计数器落库失败")
+    try:
+        await analytics.flush()
+    except Exception:
+        logger.exception("分析数据写入失败")
+    await write_coordinator.stop()
+    await get_storage().close()
+    password_hash_pool.shutdown()
+    await close_database_connections()
+    log_pipeline.stop()
+    mark_process_dead()
 
 
 # 创建FastAPI应用实例
@@ -41,6 +81,15 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# SQL分析（开发用），位于最内层只统计业务处理中的查询
+if settings.SQL_PROFILER_ENABLED:
+    install_profiler(engine)
+    install_profiler(reader_engine)
+    app.add_middleware(SqlProfilerMiddleware)
+
+# 限流中间件，注册在CORS之前，429响应同样带CORS头
+app.add_middleware(RateLimitMiddleware)
+
 # CORS中间件配置
 app.add_middleware(
     CORSMiddleware,
@@ -57,8 +106,22 @@ if not settings.DEBUG:
         allowed_hosts=settings.ALLOWED_HOSTS
     )
 
-# 静态文件服务
+# 请求耗时指标
+app.add_middleware(MetricsMiddleware)
+
+# 访问日志中间件，最后注册位于最外层，被限流和拒绝的请求也会记录
+app.add_middleware(AccessLogMiddleware)
+
+# SQL耗时指标
+instrument_engine(engine)
+if reader_engine is not engine:
+    instrument_engine(reader_engine)
+
+# 媒体文件分发（Range / ETag / 条件GET），需在静态目录挂载之前注册
 os.makedirs("static/uploads", exist_ok=True)
+app.include_router(files.router, prefix="/static/uploads", tags=["文件"])
+
+# 静态文件服务
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
@@ -71,7 +134,8 @@ async def custom_http_exception_handler(request: Request, exc: CustomHTTPExcepti
             "success": False,
             "message": exc.detail,
             "error_code": exc.error_code
-        }
+        },
+        headers=exc.headers
     )
 
 @app.exception_handler(StarletteHTTPException)
@@ -111,7 +175,18 @@ async def general_exception_handler(request: Request, exc: Exception):
 # 健康检查
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "message": "服务运行正常"}
+    return {
+        "status": "ok",
+        "message": "服务运行正常",
+        "password_hash_pool": password_hash_pool.stats(),
+        "write_coordinator": write_coordinator.stats(),
+        "log_queue": log_pipeline.stats()
+    }
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 # 注册API路由
 app.include_router(api_router, prefix="/api/v1")
@@ -0,0 +1,24 @@
+"""
+运营分析模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Float
+
+from database import Base
+
+
+class AnalyticsRollup(Base):
+    """
+    分析指标时间序列汇总（按分钟/小时/天分桶）
+
+    主键 (metric, granularity, bucket_start) 同时是按时间范围查询的索引
+    """
+    __tablename__ = "analytics_rollups"
+
+    metric = Column(String(50), primary_key=True, comment="指标名")
+    granularity = Column(String(10), primary_key=True, comment="时间粒度: minute/hour/day")
+    bucket_start = Column(DateTime, primary_key=True, comment="时间桶起点(UTC)")
+    count = Column(Integer, default=0, nullable=False, comment="事件数")
+    amount = Column(Float, default=0.0, nullable=False, comment="金额合计")
+
+    def __repr__(self):
+        return f"<AnalyticsRollup(metric='{self.metric}', granularity='{self.granularity}', bucket_start={self.bucket_start}, count={self.count})>"
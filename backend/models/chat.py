@@ -1,7 +1,7 @@
 """
 聊天相关模型
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -11,6 +11,11 @@ from database import Base
 class ChatRoom(Base):
     """聊天室模型"""
     __tablename__ = "chat_rooms"
+    __table_args__ = (
+        Index("ix_chat_rooms_name", "name"),
+        Index("ix_chat_rooms_created_by_updated_at", "created_by", "updated_at"),
+        Index("ix_chat_rooms_is_active_created_at", "is_active", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False, comment="聊天室名称")
@@ -39,6 +44,10 @@ class ChatRoom(Base):
 class ChatMessage(Base):
     """聊天消息模型"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_room_id_created_at", "room_id", "created_at"),
+        Index("ix_chat_messages_sender_id", "sender_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -83,6 +92,10 @@ class ChatMessage(Base):
 class OnlineUser(Base):
     """在线用户记录"""
     __tablename__ = "online_users"
+    __table_args__ = (
+        Index("ix_online_users_room_id", "room_id"),
+        Index("ix_online_users_user_id", "user_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
@@ -1,7 +1,7 @@
 """
 媒体文件模型
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -47,6 +47,18 @@ class MediaCategory(Base):
 class Media(Base):
     """媒体文件模型"""
     __tablename__ = "media"
+    __table_args__ = (
+        # 列表排序索引：等值过滤 status + 排序键(is_featured, 排序列, id)，支持游标分页；
+        # is_private 不放入索引，匿名和所有者查询不带该条件时也能按索引顺序读取
+        Index("ix_media_status_featured_created_at", "status", "is_featured", "created_at", "id"),
+        Index("ix_media_status_featured_view_count", "status", "is_featured", "view_count", "id"),
+        Index("ix_media_status_featured_like_count", "status", "is_featured", "like_count", "id"),
+        Index("ix_media_status_featured_title", "status", "is_featured", "title", "id"),
+        Index("ix_media_status_featured_file_size", "status", "is_featured", "file_size", "id"),
+        # 按所有者/分类筛选及计数
+        Index("ix_media_owner_id_status", "owner_id", "status"),
+        Index("ix_media_category_id_status", "category_id", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -65,6 +77,7 @@ class Media(Base):
     width = Column(Integer, comment="宽度")
     height = Column(Integer, comment="高度")
     duration = Column(Float, comment="视频时长(秒)")
+    content_hash = Column(String(64), index=True, comment="文件内容SHA-256")
     
     # 内容信息
     title = Column(String(200), comment="标题")
@@ -148,9 +161,104 @@ class Media(Base):
         return data
 
 
+class MediaBlob(Base):
+    """媒体文件内容（按内容哈希去重，多个媒体记录可共享同一份文件）"""
+    __tablename__ = "media_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False, comment="文件内容SHA-256")
+    
+    # 存储信息
+    filename = Column(String(255), nullable=False, comment="存储文件名")
+    file_path = Column(String(500), nullable=False, comment="文件路径")
+    thumbnail_path = Column(String(500), comment="缩略图路径")
+    
+    # 文件属性
+    media_type = Column(Enum(MediaType), nullable=False, comment="媒体类型")
+    mime_type = Column(String(100), comment="MIME类型")
+    file_size = Column(Integer, comment="文件大小(字节)")
+    width = Column(Integer, comment="宽度")
+    height = Column(Integer, comment="高度")
+    
+    # 引用计数：为0时删除文件
+    ref_count = Column(Integer, default=0, nullable=False, comment="引用次数")
+    
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    
+    def __repr__(self):
+        return f"<MediaBlob(id={self.id}, content_hash='{self.content_hash}', ref_count={self.ref_count})>"
+
+
+class Tag(Base):
+    """标签模型"""
+    __tablename__ = "tags"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), unique=True, index=True, nullable=False, comment="标签名（小写）")
+    
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    
+    def __repr__(self):
+        return f"<Tag(id={self.id}, name='{self.name}')>"
+
+
+class MediaTag(Base):
+    """媒体-标签关联（倒排索引：按 tag_id 查媒体走 (tag_id, media_id) 索引）"""
+    __tablename__ = "media_tags"
+    __table_args__ = (
+        Index("ix_media_tags_tag_id_media_id", "tag_id", "media_id"),
+    )
+    
+    media_id = Column(Integer, ForeignKey("media.id", ondelete="CASCADE"), primary_key=True, comment="媒体ID")
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True, comment="标签ID")
+    
+    def __repr__(self):
+        return f"<MediaTag(media_id={self.media_id}, tag_id={self.tag_id})>"
+
+
+class MediaLike(Base):
+    """媒体点赞记录（主键 (user_id, media_id) 即“我是否点赞”的查询索引）"""
+    __tablename__ = "media_likes"
+    __table_args__ = (
+        Index("ix_media_likes_media_id", "media_id"),
+    )
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, comment="用户ID")
+    media_id = Column(Integer, ForeignKey("media.id", ondelete="CASCADE"), primary_key=True, comment="媒体ID")
+    
+    created_at = Column(DateTime, server_default=func.now(), comment="点赞时间")
+    
+    def __repr__(self):
+        return f"<MediaLike(user_id={self.user_id}, media_id={self.media_id})>"
+
+
+class MediaStatsRollup(Base):
+    """
+    媒体统计汇总（按全站/所有者/分类），随媒体新增、修改、删除增量维护
+
+    scope 为 global（scope_id=0）、owner 或 category
+    """
+    __tablename__ = "media_stats_rollup"
+    
+    scope = Column(String(20), primary_key=True, comment="统计维度")
+    scope_id = Column(Integer, primary_key=True, comment="所有者ID或分类ID，全站为0")
+    total_media = Column(Integer, default=0, nullable=False, comment="媒体总数")
+    total_images = Column(Integer, default=0, nullable=False, comment="图片数")
+    total_videos = Column(Integer, default=0, nullable=False, comment="视频数")
+    total_size = Column(Integer, default=0, nullable=False, comment="文件总大小(字节)")
+    paid_media = Column(Integer, default=0, nullable=False, comment="付费媒体数")
+    
+    def __repr__(self):
+        return f"<MediaStatsRollup(scope='{self.scope}', scope_id={self.scope_id}, total_media={self.total_media})>"
+
+
 class MediaPurchase(Base):
-    """媒体购买记录"""
+    """媒体购买记录（每个用户对同一媒体只有一条）"""
     __tablename__ = "media_purchases"
+    __table_args__ = (
+        Index("uq_media_purchases_user_id_media_id", "user_id", "media_id", unique=True),
+        Index("ix_media_purchases_media_id", "media_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="购买用户ID")
@@ -1,7 +1,7 @@
 """
 支付相关模型
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -82,6 +82,9 @@ class VIPPlan(Base):
 class Order(Base):
     """订单模型"""
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_user_id_status_created_at", "user_id", "status", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     order_no = Column(String(32), unique=True, nullable=False, comment="订单号")
@@ -158,6 +161,9 @@ class Order(Base):
 class PaymentLog(Base):
     """支付日志模型"""
     __tablename__ = "payment_logs"
+    __table_args__ = (
+        Index("ix_payment_logs_order_id", "order_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, comment="订单ID")
@@ -188,6 +194,9 @@ class PaymentLog(Base):
 class CreditTransaction(Base):
     """积分交易记录模型"""
     __tablename__ = "credit_transactions"
+    __table_args__ = (
+        Index("ix_credit_transactions_user_id_created_at", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
@@ -1,7 +1,7 @@
 """
 用户模型
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -26,6 +26,10 @@ class UserStatus(str, enum.Enum):
 class User(Base):
     """用户模型"""
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_is_admin", "is_admin"),
+        Index("ix_users_created_at", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False, comment="邮箱")
@@ -0,0 +1,24 @@
+"""
+运营分析相关的Pydantic模式
+"""
+from pydantic import BaseModel
+from typing import List
+from datetime import datetime
+
+
+class AnalyticsPoint(BaseModel):
+    """时间序列中的一个时间桶"""
+    bucket_start: datetime
+    count: int
+    amount: float
+
+
+class AnalyticsSeriesResponse(BaseModel):
+    """分析指标时间序列响应模式"""
+    metric: str
+    granularity: str
+    start: datetime
+    end: datetime
+    total_count: int
+    total_amount: float
+    points: List[AnalyticsPoint]
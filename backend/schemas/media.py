@@ -104,12 +104,6 @@ class MediaResponse(MediaBase):
         if media_obj.tags:
             tags_list = [tag.strip() for tag in media_obj.tags.split(',') if tag.strip()]
         
-        print(f"[MediaResponse.from_orm_model] 转换 Media ID: {media_obj.id}")
-        print(f"  ORM file_url: {media_obj.file_url}")
-        print(f"  ORM thumbnail_url: {media_obj.thumbnail_url}")
-        print(f"  ORM file_path: {media_obj.file_path}")
-        print(f"  ORM thumbnail_path: {media_obj.thumbnail_path}")
-        
         return cls(
             id=media_obj.id,
             filename=media_obj.filename,
@@ -152,6 +146,22 @@ class MediaUploadResponse(BaseModel):
     message: str
 
 
+class MediaBatchUploadItem(BaseModel):
+    """批量上传单个文件的结果"""
+    filename: Optional[str] = None
+    success: bool
+    media: Optional[MediaResponse] = None
+    error: Optional[str] = None
+
+
+class MediaBatchUploadResponse(BaseModel):
+    """媒体批量上传响应模式"""
+    items: List[MediaBatchUploadItem]
+    success_count: int
+    failed_count: int
+    message: str
+
+
 class MediaListQuery(BaseModel):
     """媒体列表查询模式"""
     page: int = Field(1, ge=1)
@@ -165,17 +175,28 @@ class MediaListQuery(BaseModel):
     status: Optional[MediaStatus] = None
     owner_id: Optional[int] = None
     tags: Optional[str] = None
+    tag_mode: str = Field("any", pattern="^(any|all)$", description="多标签匹配方式: any(任一) 或 all(全部)")
     sort_by: Optional[str] = Field("created_at", description="排序字段")
     order: Optional[str] = Field("desc", description="排序方向: asc 或 desc")
+    cursor: Optional[str] = Field(None, description="游标分页：上一页返回的 next_cursor")
+    with_total: Optional[bool] = Field(None, description="是否统计总数，默认页码分页统计、游标分页不统计")
+
+
+class TagFacet(BaseModel):
+    """标签分面统计"""
+    name: str
+    count: int
 
 
 class MediaListResponse(BaseModel):
     """媒体列表响应模式"""
     media_list: List[MediaResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+    has_more: bool = False
 
 
 class MediaPurchaseResponse(BaseModel):
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+登录洪峰压测
+
+在临时数据库上进程内启动应用，持续并发登录的同时定时请求 /health，
+统计登录吞吐量、503 拒绝数以及无关接口的延迟分位数。
+用 --workers 0 可对比在事件循环中同步计算哈希（旧行为）的效果，
+用 --executor thread/process 对比线程池和进程池。
+/health 按固定节拍发送，延迟从计划发送时间算起，事件循环被阻塞的时间也会计入。
+
+用法：
+    python scripts/bench_login_storm.py [--workers 4] [--executor process] [--concurrency 32] [--duration 10]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 使用临时数据库，需在导入项目模块之前设置
+_temp_dir = tempfile.mkdtemp(prefix="login_storm_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_temp_dir, 'bench.db')}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="登录洪峰压测")
+    parser.add_argument("--workers", type=int, default=None, help="密码哈希并发数，0 表示同步计算（默认取配置）")
+    parser.add_argument("--executor", choices=["thread", "process"], default=None, help="执行池类型（默认取配置）")
+    parser.add_argument("--max-pending", type=int, default=None, help="排队上限（默认取配置）")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发登录数")
+    parser.add_argument("--duration", type=float, default=10.0, help="压测时长（秒）")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="/health 探测间隔（秒）")
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.workers is not None:
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+if args.executor is not None:
+    os.environ["PASSWORD_HASH_EXECUTOR"] = args.executor
+if args.max_pending is not None:
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(args.max_pending)
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from database import AsyncSessionLocal, create_all_tables, engine, reader_engine
+from schemas.user import UserCreate
+from services.user_service import create_user
+from utils.auth import password_hash_pool
+import main
+
+USERNAME = "benchuser"
+PASSWORD = "bench123456"
+
+
+def percentile(values, ratio: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(len(values) * ratio), len(values) - 1)
+    return values[index]
+
+
+async def login_worker(client, deadline, stats):
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        response = await client.post("/api/v1/auth/login", json={"username": USERNAME, "password": PASSWORD})
+        elapsed = time.monotonic() - started
+        if response.status_code == 200:
+            stats["ok"].append(elapsed)
+        elif response.status_code == 503:
+            stats["rejected"] += 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")) / 10)
+        else:
+            stats["errors"] += 1
+
+
+async def probe_worker(client, deadline, interval, latencies):
+    # 按固定节拍计划发送时间，避免事件循环阻塞期间少发的探测被漏算
+    scheduled = time.monotonic()
+    while scheduled < deadline:
+        await asyncio.sleep(max(0.0, scheduled - time.monotonic()))
+        await client.get("/health")
+        latencies.append(time.monotonic() - scheduled)
+        scheduled += interval
+        # 落后超过一个节拍时，错过的探测按等待时间依次补记
+        now = time.monotonic()
+        while scheduled + interval < now and scheduled < deadline:
+            latencies.append(now - scheduled)
+            scheduled += interval
+
+
+async def run():
+    await create_all_tables()
+    async with AsyncSessionLocal() as db:
+        await create_user(db, UserCreate(
+            email="bench@example.com", username=USERNAME, password=PASSWORD, confirm_password=PASSWORD
+        ))
+
+    # 应用抛出的异常按500计入错误，不中断压测
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 空载时的探测延迟
+        idle = []
+        await probe_worker(client, time.monotonic() + 1, args.probe_interval, idle)
+
+        stats = {"ok": [], "rejected": 0, "errors": 0}
+        probe = []
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(
+            probe_worker(client, deadline, args.probe_interval, probe),
+            *(login_worker(client, deadline, stats) for _ in range(args.concurrency))
+        )
+
+    await engine.dispose()
+    await reader_engine.dispose()
+
+    ok = stats["ok"]
+    pool = password_hash_pool.stats()
+    print(f"\n哈希执行池: {pool['executor']} x {pool['workers']}，并发登录: {args.concurrency}，时长: {args.duration}s")
+    print(f"登录成功: {len(ok)} 次，吞吐量 {len(ok) / args.duration:.1f} 次/秒，"
+          f"p50 {percentile(ok, 0.5) * 1000:.0f}ms，p99 {percentile(ok, 0.99) * 1000:.0f}ms")
+    print(f"503拒绝: {stats['rejected']} 次，其他错误: {stats['errors']} 次")
+    print(f"/health 空载: p50 {percentile(idle, 0.5) * 1000:.1f}ms，p99 {percentile(idle, 0.99) * 1000:.1f}ms")
+    print(f"/health 压测中: {len(probe)} 次，p50 {percentile(probe, 0.5) * 1000:.1f}ms，"
+          f"p99 {percentile(probe, 0.99) * 1000:.1f}ms，最大 {max(probe, default=0) * 1000:.1f}ms")
+    print(f"执行池指标: {pool}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+媒体列表接口延迟压测
+
+在临时数据库上写入一批媒体，进程内反复请求 GET /api/v1/media/（关闭列表缓存，每次都走数据库和序列化），
+统计延迟分位数以及每个请求向标准输出写出的字节数（测量期间标准输出被计数后丢弃）。
+用 --log-level DEBUG 可对比开启调试日志的开销。
+
+用法：
+    python scripts/bench_media_list.py [--media 200] [--page-size 100] [--requests 200]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+# 使用临时数据库并关闭列表缓存和限流，需在导入项目模块之前设置
+_temp_dir = tempfile.mkdtemp(prefix="media_list_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_temp_dir, 'bench.db')}"
+os.environ["FEED_CACHE_ENABLED"] = "false"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["ACCESS_LOG_ENABLED"] = "false"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="媒体列表接口延迟压测")
+    parser.add_argument("--media", type=int, default=200, help="写入的媒体数")
+    parser.add_argument("--page-size", type=int, default=100, help="每页条数")
+    parser.add_argument("--requests", type=int, default=200, help="请求次数")
+    parser.add_argument("--log-level", default=None, help="日志级别（默认取配置）")
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.log_level:
+    os.environ["LOG_LEVEL"] = args.log_level
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from database import AsyncSessionLocal, create_all_tables, engine, reader_engine
+from models.user import User
+from models.media import Media, MediaType, MediaStatus
+import main
+
+
+class CountingSink:
+    """丢弃写入内容，只统计字节数"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        self.bytes += len(text.encode())
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def percentile(values, ratio: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+async def seed_media(count: int):
+    async with AsyncSessionLocal() as db:
+        owner = User(email="bench@example.com", username="bench", hashed_password="x", is_admin=True)
+        db.add(owner)
+        await db.flush()
+        for i in range(count):
+            db.add(Media(
+                filename=f"{i}.jpg", file_path=f"image/00/00/{i}.jpg", thumbnail_path=f"image/00/00/{i}_thumb.jpg",
+                media_type=MediaType.IMAGE, title=f"媒体 {i}", tags="cat,旅行", owner_id=owner.id,
+                status=MediaStatus.ACTIVE
+            ))
+        await db.commit()
+
+
+async def run():
+    await create_all_tables()
+    await seed_media(args.media)
+
+    transport = httpx.ASGITransport(app=main.app)
+    params = {"page_size": args.page_size}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        sink = CountingSink()
+        with contextlib.redirect_stdout(sink):
+            # 预热
+            for _ in range(5):
+                await client.get("/api/v1/media/", params=params)
+            sink.bytes = 0
+
+            latencies = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = await client.get("/api/v1/media/", params=params)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+
+    await engine.dispose()
+    await reader_engine.dispose()
+
+    mean = sum(latencies) / len(latencies)
+    print(f"媒体数: {args.media}，每页: {args.page_size}，请求: {args.requests}")
+    print(f"延迟: 平均 {mean * 1000:.2f}ms，p50 {percentile(latencies, 0.5) * 1000:.2f}ms，"
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f}ms")
+    print(f"每个请求写出标准输出: {sink.bytes / args.requests / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+SQLite 读写混合吞吐压测
+
+在临时数据库上并发执行读写混合负载：
+- 读：查询聊天室最近50条消息 + 一页媒体
+- 写：先读媒体再写入一条聊天消息并累加浏览数（与聊天、计数器的写入路径相同，读后写最容易触发锁冲突）
+
+--baseline 使用未调优的引擎（默认回滚日志、单一连接池、无 busy_timeout 等 PRAGMA）作对比，
+默认使用 database.AsyncSessionLocal（WAL + 单写连接 + 只读连接池），每个写操作各自提交；
+--coordinator 在此基础上把写操作交给写入协调器组提交。
+--processes 模拟多 worker 部署，多个进程同时访问同一个数据库文件（锁冲突主要出现在进程之间）。
+统计每秒完成的读写操作数、延迟分位数和 "database is locked" 错误数。
+
+用法：
+    python scripts/bench_sqlite_mixed.py [--baseline | --coordinator] [--processes 4] [--concurrency 16] [--write-ratio 0.2] [--duration 10]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 使用临时数据库，需在导入项目模块之前设置
+_temp_dir = tempfile.mkdtemp(prefix="sqlite_mixed_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_temp_dir, 'bench.db')}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="SQLite 读写混合吞吐压测")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--baseline", action="store_true", help="使用未调优的引擎对比")
+    mode.add_argument("--coordinator", action="store_true", help="写操作通过写入协调器组提交")
+    parser.add_argument("--processes", type=int, default=1, help="进程数")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个进程的并发任务数")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="写操作占比")
+    parser.add_argument("--duration", type=float, default=10.0, help="压测时长（秒）")
+    parser.add_argument("--media", type=int, default=200, help="写入的媒体数")
+    return parser.parse_args()
+
+
+args = parse_args()
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from config import settings
+from database import AsyncSessionLocal, Base, engine, reader_engine
+from utils.write_coordinator import write_coordinator
+from models.user import User
+from models.media import Media, MediaType, MediaStatus
+from models.chat import ChatRoom, ChatMessage
+import models.payment  # noqa: F401  注册 User 关系引用的模型
+import models.analytics  # noqa: F401
+
+
+def percentile(values, ratio: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def build_session_factory():
+    """返回 (会话工厂, 需要释放的引擎列表)"""
+    if args.baseline:
+        baseline_engine = create_async_engine(settings.DATABASE_URL, echo=False)
+        return async_sessionmaker(baseline_engine, class_=AsyncSession, expire_on_commit=False), [baseline_engine]
+    return AsyncSessionLocal, [engine, reader_engine]
+
+
+async def seed(session_factory, write_engine):
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_factory() as db:
+        owner = User(email="bench@example.com", username="bench", hashed_password="x", is_admin=True)
+        db.add(owner)
+        await db.flush()
+        room = ChatRoom(name="压测房间", created_by=owner.id)
+        db.add(room)
+        for i in range(args.media):
+            db.add(Media(
+                filename=f"{i}.jpg", file_path=f"image/00/00/{i}.jpg", media_type=MediaType.IMAGE,
+                title=f"媒体 {i}", owner_id=owner.id, status=MediaStatus.ACTIVE
+            ))
+        await db.commit()
+        return owner.id, room.id
+
+
+async def read_op(db, room_id):
+    await db.execute(
+        select(ChatMessage).where(ChatMessage.room_id == room_id).order_by(ChatMessage.id.desc()).limit(50)
+    )
+    await db.execute(
+        select(Media).where(Media.status == MediaStatus.ACTIVE).order_by(Media.id.desc()).limit(20)
+    )
+
+
+async def write_job(db, user_id, room_id):
+    media_id = random.randint(1, args.media)
+    await db.execute(select(Media.view_count).where(Media.id == media_id))
+    db.add(ChatMessage(content="压测消息", room_id=room_id, sender_id=user_id))
+    await db.execute(update(Media).where(Media.id == media_id).values(view_count=Media.view_count + 1))
+
+
+async def write_op(db, user_id, room_id):
+    if args.coordinator:
+        await write_coordinator.run(lambda session: write_job(session, user_id, room_id))
+        return
+    await write_job(db, user_id, room_id)
+    await db.commit()
+
+
+async def worker(session_factory, deadline, user_id, room_id, stats):
+    while time.monotonic() < deadline:
+        is_write = random.random() < args.write_ratio
+        kind = "write" if is_write else "read"
+        started = time.monotonic()
+        try:
+            async with session_factory() as db:
+                if is_write:
+                    await write_op(db, user_id, room_id)
+                else:
+                    await read_op(db, room_id)
+        except OperationalError as e:
+            if "locked" in str(e):
+                stats["locked"] += 1
+            else:
+                stats["errors"] += 1
+            continue
+        stats[kind].append(time.monotonic() - started)
+
+
+async def prepare():
+    session_factory, engines = build_session_factory()
+    ids = await seed(session_factory, engines[0])
+    for bench_engine in engines:
+        await bench_engine.dispose()
+    return ids
+
+
+async def load(user_id, room_id):
+    session_factory, engines = build_session_factory()
+    stats = {"read": [], "write": [], "locked": 0, "errors": 0, "batches": 0}
+    if args.coordinator:
+        write_coordinator.start()
+    deadline = time.monotonic() + args.duration
+    await asyncio.gather(*(
+        worker(session_factory, deadline, user_id, room_id, stats) for _ in range(args.concurrency)
+    ))
+    if args.coordinator:
+        await write_coordinator.stop()
+        stats["batches"] = write_coordinator.stats()["batches_total"]
+    for bench_engine in engines:
+        await bench_engine.dispose()
+    return stats
+
+
+def load_process(user_id, room_id, results):
+    results.put(asyncio.run(load(user_id, room_id)))
+
+
+def run():
+    user_id, room_id = asyncio.run(prepare())
+
+    # fork 启动的子进程各自建立连接（父进程的连接已在 prepare 中释放）
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [
+        context.Process(target=load_process, args=(user_id, room_id, results)) for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    stats = {"read": [], "write": [], "locked": 0, "errors": 0, "batches": 0}
+    for _ in processes:
+        result = results.get()
+        for key in stats:
+            stats[key] += result[key]
+    for process in processes:
+        process.join()
+
+    if args.baseline:
+        mode = "未调优引擎"
+    elif args.coordinator:
+        mode = "调优引擎 + 写入协调器组提交"
+    else:
+        mode = "调优引擎（WAL + 单写连接 + 只读连接池）"
+    print(f"{mode}，进程: {args.processes} x 并发 {args.concurrency}，写占比: {args.write_ratio:.0%}，"
+          f"时长: {args.duration}s")
+    for kind, label in (("read", "读"), ("write", "写")):
+        latencies = stats[kind]
+        print(f"{label}: {len(latencies) / args.duration:.1f} 次/秒，"
+              f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms，p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+    print(f"database is locked: {stats['locked']} 次，其他错误: {stats['errors']} 次")
+    if stats["batches"]:
+        print(f"组提交: {stats['batches']} 个事务，平均每个事务 {len(stats['write']) / stats['batches']:.1f} 个写操作")
+
+
+if __name__ == "__main__":
+    run()
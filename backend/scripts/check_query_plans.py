@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+查询计划检查脚本
+
+在临时 SQLite 数据库上执行各服务的热点查询，记录实际发出的 SELECT 语句，
+逐条执行 EXPLAIN QUERY PLAN；任何查询对业务表做全表扫描（SCAN <表> 且未使用索引）
+即报告失败并以非零状态退出，可在 CI 中执行，防止索引回退。
+
+用法：
+    python scripts/check_query_plans.py [-v]
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+
+# 使用临时数据库，需在导入项目模块之前设置
+_temp_dir = tempfile.mkdtemp(prefix="query_plans_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_temp_dir, 'plans.db')}"
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from database import Base, engine, reader_engine, AsyncSessionLocal, create_all_tables
+from models.user import User
+from models.media import Media, MediaCategory, MediaPurchase, MediaType, MediaStatus
+from models.chat import ChatRoom, ChatMessage
+from models.payment import CreditTransaction
+from schemas.media import MediaListQuery
+from services.media_service import MediaService
+from services.chat_service import chat_service
+from services import user_service
+
+
+# 全表扫描：SCAN <表名>，且后面没有 USING INDEX / USING COVERING INDEX
+_SCAN_RE = re.compile(r"^SCAN (\w+)(?! USING (?:COVERING )?INDEX)(?: |$)")
+
+# 行数固定且很少的配置表，允许全表扫描
+ALLOWED_SCAN_TABLES = {"vip_plans", "media_categories"}
+
+
+async def seed_data():
+    """写入少量数据，使各查询路径都能执行到"""
+    async with AsyncSessionLocal() as db:
+        admin = User(email="admin@example.com", username="admin", hashed_password="x", is_admin=True)
+        user = User(email="user@example.com", username="user", hashed_password="x")
+        db.add_all([admin, user])
+        await db.flush()
+
+        category = MediaCategory(name="默认")
+        db.add(category)
+        await db.flush()
+
+        media = Media(
+            filename="a.jpg", file_path="image/aa/bb/a.jpg", media_type=MediaType.IMAGE,
+            title="示例", tags="cat", is_paid=True, price=1, owner_id=admin.id,
+            category_id=category.id, status=MediaStatus.ACTIVE
+        )
+        db.add(media)
+        # 第二条可见媒体，使游标翻页能取到下一页
+        db.add(Media(
+            filename="b.jpg", file_path="image/cc/dd/b.jpg", media_type=MediaType.IMAGE,
+            title="示例二", owner_id=admin.id, category_id=category.id, status=MediaStatus.ACTIVE
+        ))
+        await db.flush()
+
+        room = ChatRoom(name=f"private_{admin.id}_{user.id}", created_by=admin.id, is_public=False)
+        db.add(room)
+        await db.flush()
+
+        db.add_all([
+            MediaPurchase(user_id=user.id, media_id=media.id, price=1),
+            CreditTransaction(user_id=user.id, amount=-1, balance_before=1, balance_after=0, transaction_type="consume"),
+            ChatMessage(content="hi", room_id=room.id, sender_id=user.id)
+        ])
+        await db.commit()
+
+        from services.tag_service import TagService
+        await TagService(db).set_media_tags(media.id, media.tags)
+        await db.commit()
+
+        return admin, user, media, room
+
+
+def build_cases(admin, user, media, room):
+    """热点查询用例：(名称, 接收会话并执行查询的协程函数)"""
+    from api.v1.media import _get_media_with_purchase
+    from api.v1.payment import get_credit_transactions
+
+    cases = []
+    for sort_by in ("created_at", "views", "likes", "title", "file_size"):
+        for order in ("desc", "asc"):
+            cases.append((
+                f"媒体列表 sort_by={sort_by} order={order}",
+                lambda db, sort_by=sort_by, order=order: MediaService(db).get_media_list(
+                    MediaListQuery(sort_by=sort_by, order=order)
+                )
+            ))
+
+    cases += [
+        ("媒体列表 游标翻页", lambda db: _list_next_page(db)),
+        ("媒体列表 全文检索", lambda db: MediaService(db).get_media_list(MediaListQuery(search="示例"))),
+        ("媒体列表 标签任一", lambda db: MediaService(db).get_media_list(MediaListQuery(tags="cat,dog"))),
+        ("媒体列表 标签全部", lambda db: MediaService(db).get_media_list(MediaListQuery(tags="cat,dog", tag_mode="all"))),
+        ("媒体列表 按分类", lambda db: MediaService(db).get_media_list(MediaListQuery(category_id=media.category_id))),
+        ("媒体列表 按所有者", lambda db: MediaService(db).get_media_list(
+            MediaListQuery(owner_id=admin.id), current_user_id=admin.id
+        )),
+        ("标签分面", lambda db: MediaService(db).get_tag_facets(MediaListQuery())),
+        ("媒体详情", lambda db: MediaService(db).get_media_by_id(media.id)),
+        ("点赞状态批量查询", lambda db: MediaService(db).get_liked_media_ids(user.id, [media.id])),
+        ("媒体及购买记录", lambda db: _get_media_with_purchase(db, media.id, user.id)),
+        ("用户媒体计数", lambda db: MediaService(db)._update_user_media_count(admin.id)),
+        ("用户媒体统计", lambda db: MediaService(db).get_media_stats(admin.id)),
+        ("积分交易记录", lambda db: get_credit_transactions(page=1, page_size=20, current_user=user, db=db)),
+        ("分析时间序列", lambda db: _analytics_series(db)),
+        ("按ID查用户", lambda db: user_service.get_user_by_id(db, user.id)),
+        ("按用户名或邮箱查用户", lambda db: user_service.get_user_by_username_or_email(db, "user")),
+        ("用户私聊房间", lambda db: chat_service.get_user_private_room(db, user.id)),
+        ("管理员聊天列表", lambda db: chat_service.get_admin_chat_list(db, admin.id)),
+        ("聊天室列表", lambda db: chat_service.get_chat_rooms(db)),
+        ("房间消息", lambda db: chat_service.get_room_messages(db, room.id)),
+    ]
+    return cases
+
+
+async def _list_next_page(db):
+    service = MediaService(db)
+    first = await service.get_media_list(MediaListQuery(page_size=1))
+    if not first.next_cursor:
+        raise RuntimeError("第一页没有返回 next_cursor，游标翻页查询未被检查")
+    await service.get_media_list(MediaListQuery(page_size=1, cursor=first.next_cursor))
+
+
+async def _analytics_series(db):
+    from datetime import datetime, timedelta
+    from services.analytics_service import AnalyticsService, METRIC_MEDIA_VIEW
+
+    end = datetime.utcnow()
+    await AnalyticsService(db).get_series(METRIC_MEDIA_VIEW, "hour", end - timedelta(days=1), end)
+
+
+async def explain(statement: str, parameters) -> list:
+    """执行 EXPLAIN QUERY PLAN，返回计划明细"""
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in result.all()]
+
+
+async def main(verbose: bool) -> int:
+    await create_all_tables()
+    admin, user, media, room = await seed_data()
+
+    table_names = set(Base.metadata.tables)
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            captured.append((statement, parameters))
+
+    # 读语句走只读连接池，两个引擎都需要记录
+    engines = {engine.sync_engine, reader_engine.sync_engine}
+    for sync_engine in engines:
+        event.listen(sync_engine, "before_cursor_execute", capture)
+
+    failures = []
+    checked_count = 0
+    for name, run in build_cases(admin, user, media, room):
+        captured.clear()
+        async with AsyncSessionLocal() as db:
+            await run(db)
+        statements = list(captured)
+
+        for statement, parameters in statements:
+            plan = await explain(statement, parameters)
+            checked_count += 1
+            scans = [
+                detail for detail in plan
+                if (match := _SCAN_RE.match(detail))
+                and match.group(1) in table_names
+                and match.group(1) not in ALLOWED_SCAN_TABLES
+            ]
+            if scans:
+                failures.append((name, statement, plan))
+            if verbose or scans:
+                flag = "❌" if scans else "✅"
+                print(f"{flag} {name}")
+                for detail in plan:
+                    print(f"     {detail}")
+
+    for sync_engine in engines:
+        event.remove(sync_engine, "before_cursor_execute", capture)
+    await engine.dispose()
+    await reader_engine.dispose()
+
+    print(f"\n共检查 {checked_count} 条查询，{len(failures)} 条存在全表扫描")
+    for name, statement, _ in failures:
+        print(f"\n[{name}]\n{statement}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查热点查询是否使用索引")
+    parser.add_argument("-v", "--verbose", action="store_true", help="打印全部查询计划")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.verbose)))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+标签数据迁移脚本
+
+将 Media.tags 中逗号分隔的标签写入规范化的 tags / media_tags 表。
+按主键分批处理，每批一个事务；脚本可重复执行（每次会替换媒体的标签关联）。
+
+用法：
+    python scripts/migrate_tags.py [--batch-size 500]
+"""
+import argparse
+import asyncio
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal, create_all_tables
+from models.media import Media
+from services.tag_service import TagService
+
+
+async def migrate(batch_size: int):
+    """按主键分批迁移"""
+    await create_all_tables()
+
+    last_id = 0
+    migrated_count = 0
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Media.id, Media.tags)
+                .where(Media.id > last_id)
+                .order_by(Media.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            await TagService(db).set_media_tags_many([(row.id, row.tags) for row in rows])
+            await db.commit()
+            migrated_count += len(rows)
+
+        print(f"已处理到媒体ID {last_id}，累计 {migrated_count} 条")
+
+    print(f"✅ 标签迁移完成，共处理 {migrated_count} 条媒体")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移逗号分隔标签到标签表")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批处理的记录数")
+    args = parser.parse_args()
+
+    asyncio.run(migrate(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+上传文件目录布局迁移脚本
+
+将旧布局（<类型>/<用户ID>/<文件名>）的文件迁移到按内容哈希分目录的布局
+（<类型>/ab/cd/<哈希><扩展名>），可在服务运行期间执行：
+
+1. 先为还没有内容哈希的付费媒体计算并写入哈希（路径不变），然后等待运行中的服务刷新付费文件集合
+   （PROTECTED_MEDIA_REFRESH_SECONDS 的两倍），新key在被引用之前就已受保护；
+2. 把文件复制到新key（新key已存在则跳过），旧文件保持可访问；
+3. 每批更新一次数据库记录并提交；
+4. 提交后删除不再被任何记录引用的旧文件。
+
+服务已全部停止时可以用 --no-wait 跳过第1步的等待。
+脚本可重复执行，已经是新布局的记录会被跳过。
+
+用法：
+    python scripts/migrate_upload_layout.py [--batch-size 100] [--sleep 0.5] [--dry-run] [--keep-old] [--no-wait]
+"""
+import argparse
+import asyncio
+import hashlib
+import sys
+import os
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func, or_
+
+from config import settings
+from database import AsyncSessionLocal, create_all_tables
+from models.media import Media, MediaBlob
+from storage.base import get_storage, normalize_key
+from utils.file import get_upload_key, get_thumbnail_filename, is_sharded_key, get_file_url
+
+
+async def compute_content_hash(key: str) -> str:
+    """流式计算存储对象的SHA-256"""
+    sha256 = hashlib.sha256()
+    async for chunk in get_storage().stream(key):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+async def copy_object(old_key: str, new_key: str, content_type: str = None):
+    """复制存储对象，目标已存在时跳过"""
+    storage = get_storage()
+    if await storage.exists(new_key):
+        return
+    await storage.put_multipart(new_key, storage.stream(old_key), content_type)
+
+
+async def is_referenced(db, key: str) -> bool:
+    """是否仍有媒体记录引用该key"""
+    result = await db.execute(
+        select(func.count(Media.id)).where(or_(
+            Media.file_path == key,
+            Media.thumbnail_path == key,
+            Media.file_path.like(f"%/{key}"),
+            Media.thumbnail_path.like(f"%/{key}")
+        ))
+    )
+    return result.scalar() > 0
+
+
+async def migrate_media(media: Media, dry_run: bool) -> list:
+    """迁移单条媒体记录的文件，返回可以删除的旧key"""
+    storage = get_storage()
+    old_key = normalize_key(media.file_path)
+    if not await storage.exists(old_key):
+        print(f"⚠️  媒体 {media.id} 的文件不存在，跳过: {old_key}")
+        return []
+
+    content_hash = media.content_hash or await compute_content_hash(old_key)
+    file_type = media.media_type.value
+    filename = f"{content_hash}{Path(old_key).suffix.lower()}"
+    new_key = get_upload_key(file_type, content_hash, filename)
+
+    old_thumbnail_key = normalize_key(media.thumbnail_path)
+    new_thumbnail_key = None
+    if old_thumbnail_key and await storage.exists(old_thumbnail_key):
+        new_thumbnail_key = get_upload_key(
+            file_type, content_hash, get_thumbnail_filename(file_type, filename)
+        )
+
+    print(f"  媒体 {media.id}: {old_key} -> {new_key}")
+    if dry_run:
+        return []
+
+    await copy_object(old_key, new_key, media.mime_type)
+    if new_thumbnail_key:
+        await copy_object(old_thumbnail_key, new_thumbnail_key, "image/jpeg")
+
+    media.filename = filename
+    media.file_path = new_key
+    media.file_url = get_file_url(new_key)
+    media.content_hash = content_hash
+    if new_thumbnail_key:
+        media.thumbnail_path = new_thumbnail_key
+        media.thumbnail_url = get_file_url(new_thumbnail_key)
+
+    return [key for key in (old_key, old_thumbnail_key if new_thumbnail_key else None)
+            if key and key not in (new_key, new_thumbnail_key)]
+
+
+async def sync_blob(db, media: Media):
+    """登记或更新内容哈希对应的文件记录，引用计数以实际媒体数量为准"""
+    result = await db.execute(
+        select(MediaBlob).where(MediaBlob.content_hash == media.content_hash)
+    )
+    blob = result.scalar_one_or_none()
+    if blob is None:
+        blob = MediaBlob(content_hash=media.content_hash)
+        db.add(blob)
+
+    blob.filename = media.filename
+    blob.file_path = media.file_path
+    blob.thumbnail_path = media.thumbnail_path
+    blob.media_type = media.media_type
+    blob.mime_type = media.mime_type
+    blob.file_size = media.file_size
+    blob.width = media.width
+    blob.height = media.height
+
+    await db.flush()
+    result = await db.execute(
+        select(func.count(Media.id)).where(Media.content_hash == media.content_hash)
+    )
+    blob.ref_count = result.scalar()
+
+
+async def publish_paid_hashes(batch_size: int, dry_run: bool) -> int:
+    """
+    为旧布局中没有内容哈希的付费媒体写入哈希，返回写入的记录数
+
+    运行中的服务按内容哈希保护付费文件，只在启动和定期刷新时从数据库加载。
+    迁移前先写入哈希，等服务刷新后新key就已受保护；旧路径仍按 file_url 保护。
+    """
+    last_id = 0
+    published_count = 0
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Media)
+                .where(Media.id > last_id, Media.is_paid == True, Media.content_hash.is_(None))
+                .order_by(Media.id)
+                .limit(batch_size)
+            )
+            batch = result.scalars().all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for media in batch:
+                old_key = normalize_key(media.file_path)
+                if is_sharded_key(old_key):
+                    continue
+                try:
+                    content_hash = await compute_content_hash(old_key)
+                except Exception as e:
+                    print(f"⚠️  媒体 {media.id} 计算内容哈希失败: {e}")
+                    continue
+                if not dry_run:
+                    media.content_hash = content_hash
+                published_count += 1
+
+            if dry_run:
+                await db.rollback()
+            else:
+                await db.commit()
+
+    return published_count
+
+
+async def migrate(batch_size: int, sleep: float, dry_run: bool, keep_old: bool, wait: bool = True):
+    """按主键分批迁移"""
+    await create_all_tables()
+
+    published_count = await publish_paid_hashes(batch_size, dry_run)
+    if published_count and not dry_run:
+        print(f"已为 {published_count} 条付费媒体写入内容哈希")
+        if wait:
+            wait_seconds = settings.PROTECTED_MEDIA_REFRESH_SECONDS * 2
+            print(f"等待 {wait_seconds} 秒，让运行中的服务刷新付费文件集合")
+            await asyncio.sleep(wait_seconds)
+
+    last_id = 0
+    migrated_count = 0
+    deleted_count = 0
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Media).where(Media.id > last_id).order_by(Media.id).limit(batch_size)
+            )
+            batch = result.scalars().all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            stale_keys = []
+            for media in batch:
+                if is_sharded_key(normalize_key(media.file_path)):
+                    continue
+                try:
+                    stale_keys.extend(await migrate_media(media, dry_run))
+                except Exception as e:
+                    print(f"⚠️  媒体 {media.id} 迁移失败: {e}")
+                    continue
+                if not dry_run:
+                    await sync_blob(db, media)
+                migrated_count += 1
+
+            if dry_run:
+                await db.rollback()
+            else:
+                await db.commit()
+
+            # 提交之后再删除旧文件，保证任何时刻数据库引用的文件都存在
+            if stale_keys and not keep_old:
+                removable = [key for key in set(stale_keys) if not await is_referenced(db, key)]
+                deleted_count += await get_storage().delete_many(removable)
+
+        print(f"已处理到媒体ID {last_id}，累计迁移 {migrated_count} 条")
+        if sleep:
+            await asyncio.sleep(sleep)
+
+    await get_storage().close()
+    print(f"✅ 迁移完成: 迁移 {migrated_count} 条记录，删除旧文件 {deleted_count} 个")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移上传文件到哈希分目录布局")
+    parser.add_argument("--batch-size", type=int, default=100, help="每批处理的记录数")
+    parser.add_argument("--sleep", type=float, default=0.5, help="每批之间的间隔(秒)，降低对线上服务的影响")
+    parser.add_argument("--dry-run", action="store_true", help="只打印迁移计划，不做修改")
+    parser.add_argument("--keep-old", action="store_true", help="保留旧文件（供仍在使用旧URL的客户端过渡）")
+    parser.add_argument("--no-wait", action="store_true", help="服务已全部停止时跳过等待付费文件集合刷新")
+    args = parser.parse_args()
+
+    asyncio.run(migrate(args.batch_size, args.sleep, args.dry_run, args.keep_old, not args.no_wait))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+重建媒体统计汇总表
+
+汇总表与媒体记录同步更新，通常不需要手动重建；在直接修改数据库后执行。
+使用 --check 只比较汇总表与聚合查询结果，不做修改。
+
+用法：
+    python scripts/rebuild_media_stats.py [--check]
+"""
+import argparse
+import asyncio
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal, create_all_tables
+from models.media import MediaStatsRollup
+from services.stats_service import MediaStatsService, SCOPE_OWNER, SCOPE_CATEGORY
+
+
+async def check() -> int:
+    """比较汇总表与聚合查询，返回不一致的行数"""
+    mismatched_count = 0
+    async with AsyncSessionLocal() as db:
+        service = MediaStatsService(db)
+        result = await db.execute(select(MediaStatsRollup.scope, MediaStatsRollup.scope_id))
+        scopes = [("global", 0)] + [row for row in result.all() if row[0] != "global"]
+
+        for scope, scope_id in scopes:
+            kwargs = {}
+            if scope == SCOPE_OWNER:
+                kwargs["owner_id"] = scope_id
+            elif scope == SCOPE_CATEGORY:
+                kwargs["category_id"] = scope_id
+
+            stored = await service.get_stats(**kwargs)
+            actual = await service.compute_stats(**kwargs)
+            if stored != actual:
+                mismatched_count += 1
+                print(f"⚠️  {scope}:{scope_id} 汇总 {stored.model_dump()} != 实际 {actual.model_dump()}")
+
+    if mismatched_count:
+        print(f"⚠️  共 {mismatched_count} 行不一致，可去掉 --check 重建")
+    else:
+        print(f"✅ 汇总表与媒体数据一致，共检查 {len(scopes)} 行")
+    return mismatched_count
+
+
+async def rebuild():
+    """重建汇总表"""
+    async with AsyncSessionLocal() as db:
+        row_count = await MediaStatsService(db).rebuild()
+
+    print(f"✅ 媒体统计汇总重建完成，共 {row_count} 行")
+
+
+async def main(check_only: bool) -> int:
+    await create_all_tables()
+    if check_only:
+        return 1 if await check() else 0
+    await rebuild()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重建媒体统计汇总表")
+    parser.add_argument("--check", action="store_true", help="只检查汇总表是否与媒体数据一致")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.check)))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+重建媒体全文索引
+
+索引与媒体记录同步写入，通常不需要手动重建；在直接修改数据库、
+调整分词规则或索引损坏后执行。
+
+用法：
+    python scripts/rebuild_search_index.py [--batch-size 500]
+"""
+import argparse
+import asyncio
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncSessionLocal, create_all_tables
+from services.search_service import MediaSearchService, is_search_index_enabled
+
+
+async def rebuild(batch_size: int):
+    """重建索引"""
+    await create_all_tables()
+
+    if not is_search_index_enabled():
+        print("⚠️  当前数据库不支持全文索引，无需重建")
+        return
+
+    async with AsyncSessionLocal() as db:
+        indexed_count = await MediaSearchService(db).rebuild(batch_size)
+
+    print(f"✅ 全文索引重建完成，共 {indexed_count} 条媒体")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重建媒体全文索引")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批读取的记录数")
+    args = parser.parse_args()
+
+    asyncio.run(rebuild(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
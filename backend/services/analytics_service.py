@@ -0,0 +1,292 @@
+"""
+运营分析服务
+
+业务代码调用 analytics.record() 上报事件，事件在进程内按 (指标, 粒度, 时间桶) 累加，
+后台任务定期用 UPSERT 把增量写入 analytics_rollups（分钟/小时/天三种粒度）。
+查询只读汇总表，周、月由天粒度汇总得到，不扫描原始业务表。
+分钟、小时粒度只保留最近一段时间，天粒度永久保留。时间一律为UTC。
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete, func, literal, insert as sa_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import AsyncSessionLocal
+from models.analytics import AnalyticsRollup
+from utils.logger import get_logger
+from utils.write_coordinator import write_coordinator
+
+logger = get_logger(__name__)
+
+
+METRIC_MEDIA_VIEW = "media_view"          # 媒体浏览
+METRIC_MEDIA_PURCHASE = "media_purchase"  # 付费媒体购买，金额为媒体价格
+METRIC_REVENUE = "revenue"                # 充值收入，金额为订单实付金额
+METRIC_USER_SIGNUP = "user_signup"        # 用户注册
+
+METRICS = (METRIC_MEDIA_VIEW, METRIC_MEDIA_PURCHASE, METRIC_REVENUE, METRIC_USER_SIGNUP)
+
+# 汇总表中存储的粒度
+STORED_GRANULARITIES = ("minute", "hour", "day")
+# 查询支持的粒度（week/month 由 day 汇总）
+GRANULARITIES = STORED_GRANULARITIES + ("week", "month")
+
+# 单次查询最多返回的时间桶数
+MAX_BUCKETS = 2000
+
+
+def truncate_time(at: datetime, granularity: str) -> datetime:
+    """取时间所在时间桶的起点"""
+    if granularity == "minute":
+        return at.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return at.replace(minute=0, second=0, microsecond=0)
+    day = at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    raise ValueError(f"不支持的时间粒度: {granularity}")
+
+
+def next_bucket(bucket_start: datetime, granularity: str) -> datetime:
+    """下一个时间桶的起点"""
+    if granularity == "month":
+        if bucket_start.month == 12:
+            return bucket_start.replace(year=bucket_start.year + 1, month=1)
+        return bucket_start.replace(month=bucket_start.month + 1)
+    steps = {
+        "minute": timedelta(minutes=1),
+        "hour": timedelta(hours=1),
+        "day": timedelta(days=1),
+        "week": timedelta(weeks=1),
+    }
+    return bucket_start + steps[granularity]
+
+
+def _storage_granularity(granularity: str) -> str:
+    return "day" if granularity in ("week", "month") else granularity
+
+
+def _retention_cutoff(granularity: str, now: datetime) -> Optional[datetime]:
+    """该粒度最早保留的时间，None 表示永久保留"""
+    if granularity == "minute":
+        return truncate_time(now - timedelta(hours=settings.ANALYTICS_MINUTE_RETENTION_HOURS), "minute")
+    if granularity == "hour":
+        return truncate_time(now - timedelta(days=settings.ANALYTICS_HOUR_RETENTION_DAYS), "hour")
+    return None
+
+
+def _upsert_statement():
+    stmt = sqlite_insert(AnalyticsRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=[AnalyticsRollup.metric, AnalyticsRollup.granularity, AnalyticsRollup.bucket_start],
+        set_={
+            "count": AnalyticsRollup.count + stmt.excluded.count,
+            "amount": AnalyticsRollup.amount + stmt.excluded.amount,
+        }
+    )
+
+
+class AnalyticsRecorder:
+    """事件上报（进程内累加 + 定期批量写入汇总表）"""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[str, str, datetime], List] = defaultdict(lambda: [0, 0.0])
+
+    def record(self, metric: str, amount: float = 0.0, count: int = 1, at: Optional[datetime] = None):
+        """上报事件，不访问数据库"""
+        if metric not in METRICS:
+            raise ValueError(f"不支持的分析指标: {metric}")
+
+        at = at or datetime.utcnow()
+        for granularity in STORED_GRANULARITIES:
+            bucket = self._pending[(metric, granularity, truncate_time(at, granularity))]
+            bucket[0] += count
+            bucket[1] += amount or 0.0
+
+    async def flush(self) -> int:
+        """把累计的事件写入汇总表，返回写入的行数"""
+        pending, self._pending = self._pending, defaultdict(lambda: [0, 0.0])
+        rows = [
+            {"metric": metric, "granularity": granularity, "bucket_start": bucket_start, "count": count, "amount": amount}
+            for (metric, granularity, bucket_start), (count, amount) in pending.items()
+        ]
+        if not rows:
+            return 0
+
+        async def upsert_rows(db):
+            await db.execute(_upsert_statement(), rows)
+
+        try:
+            await write_coordinator.run(upsert_rows)
+        except Exception:
+            # 写入失败时放回缓冲区，下次重试
+            for key, (count, amount) in pending.items():
+                self._pending[key][0] += count
+                self._pending[key][1] += amount
+            raise
+
+        return len(rows)
+
+    async def prune(self):
+        """删除超过保留期的分钟/小时数据"""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            for granularity in ("minute", "hour"):
+                await db.execute(
+                    delete(AnalyticsRollup).where(
+                        AnalyticsRollup.granularity == granularity,
+                        AnalyticsRollup.bucket_start < _retention_cutoff(granularity, now)
+                    )
+                )
+            await db.commit()
+
+    async def flush_periodically(self):
+        """后台定期写入汇总表并清理过期数据"""
+        last_prune = datetime.utcnow()
+        while True:
+            await asyncio.sleep(settings.ANALYTICS_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+                if datetime.utcnow() - last_prune >= timedelta(hours=1):
+                    await self.prune()
+                    last_prune = datetime.utcnow()
+            except Exception:
+                logger.exception("分析数据写入失败")
+
+
+# 历史数据回填来源：(指标, 时间列, 金额列, 额外条件)
+def _backfill_sources():
+    from models.user import User
+    from models.media import MediaPurchase
+    from models.payment import Order, OrderStatus
+
+    return [
+        (METRIC_USER_SIGNUP, User.created_at, None, None),
+        (METRIC_MEDIA_PURCHASE, MediaPurchase.created_at, MediaPurchase.price, None),
+        (METRIC_REVENUE, Order.paid_at, Order.final_amount, Order.status == OrderStatus.PAID),
+    ]
+
+
+_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+
+def create_analytics_rollups(sync_conn):
+    """
+    汇总表为空时（首次升级）按注册、购买、充值的历史记录回填
+
+    媒体浏览没有历史明细，从上线后开始统计
+    """
+    if sync_conn.dialect.name != "sqlite":
+        return
+
+    has_rollup = sync_conn.execute(select(AnalyticsRollup.metric).limit(1)).first()
+    if has_rollup:
+        return
+
+    now = datetime.utcnow()
+    rows = []
+    for metric, time_column, amount_column, condition in _backfill_sources():
+        for granularity, fmt in _BUCKET_FORMATS.items():
+            bucket = func.strftime(fmt, time_column).label("bucket")
+            amount = func.coalesce(func.sum(amount_column), 0.0) if amount_column is not None else literal(0.0)
+            stmt = select(bucket, func.count().label("count"), amount.label("amount")).where(time_column.isnot(None))
+            if condition is not None:
+                stmt = stmt.where(condition)
+            cutoff = _retention_cutoff(granularity, now)
+            if cutoff is not None:
+                stmt = stmt.where(time_column >= cutoff)
+            stmt = stmt.group_by(bucket)
+
+            for row in sync_conn.execute(stmt):
+                rows.append({
+                    "metric": metric,
+                    "granularity": granularity,
+                    "bucket_start": datetime.strptime(row.bucket, "%Y-%m-%d %H:%M:%S"),
+                    "count": row.count,
+                    "amount": float(row.amount or 0.0),
+                })
+
+    if rows:
+        sync_conn.execute(sa_insert(AnalyticsRollup), rows)
+        print(f"✅ 分析汇总已按历史数据回填，共 {len(rows)} 行")
+
+
+class AnalyticsService:
+    """分析数据查询（只读汇总表）"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_series(
+        self,
+        metric: str,
+        granularity: str,
+        start: datetime,
+        end: datetime
+    ) -> List[dict]:
+        """
+        查询 [start, end) 内的时间序列，没有事件的时间桶补0
+
+        周以周一为起点，月以1日为起点
+        """
+        start = truncate_time(start, granularity)
+        buckets = []
+        bucket = start
+        while bucket < end:
+            buckets.append(bucket)
+            if len(buckets) > MAX_BUCKETS:
+                raise ValueError(f"时间范围过大，最多返回 {MAX_BUCKETS} 个时间点")
+            bucket = next_bucket(bucket, granularity)
+
+        values = {bucket: [0, 0.0] for bucket in buckets}
+        result = await self.db.execute(
+            select(AnalyticsRollup.bucket_start, AnalyticsRollup.count, AnalyticsRollup.amount).where(
+                AnalyticsRollup.metric == metric,
+                AnalyticsRollup.granularity == _storage_granularity(granularity),
+                AnalyticsRollup.bucket_start >= start,
+                AnalyticsRollup.bucket_start < end
+            )
+        )
+        for bucket_start, count, amount in result.all():
+            target = values.get(truncate_time(bucket_start, granularity))
+            if target is not None:
+                target[0] += count
+                target[1] += amount
+
+        return [
+            {"bucket_start": bucket, "count": count, "amount": round(amount, 2)}
+            for bucket, (count, amount) in values.items()
+        ]
+
+    async def get_total(self, metric: str, start: datetime, end: datetime) -> Tuple[int, float]:
+        """按天粒度汇总 [start, end) 内的事件数和金额"""
+        result = await self.db.execute(
+            select(
+                func.coalesce(func.sum(AnalyticsRollup.count), 0),
+                func.coalesce(func.sum(AnalyticsRollup.amount), 0.0)
+            ).where(
+                AnalyticsRollup.metric == metric,
+                AnalyticsRollup.granularity == "day",
+                AnalyticsRollup.bucket_start >= truncate_time(start, "day"),
+                AnalyticsRollup.bucket_start < end
+            )
+        )
+        count, amount = result.one()
+        return int(count), float(amount)
+
+
+# 全局事件上报
+analytics = AnalyticsRecorder()
@@ -12,6 +12,8 @@ from sqlalchemy.orm import selectinload
 from models.chat import ChatRoom, ChatMessage
 from models.user import User
 from schemas.chat import ChatMessageResponse, ChatRoomResponse, WSMessage, WSChatMessage
+from utils.metrics import observe_duration, WS_CONNECTIONS, WS_BROADCAST_DURATION, WS_BROADCAST_RECIPIENTS
+from utils.write_coordinator import write_coordinator
 
 
 class ConnectionManager:
@@ -55,6 +57,7 @@ class ConnectionManager:
         if room_id not in self.room_connections:
             self.room_connections[room_id] = {}
         self.room_connections[room_id][user_id] = websocket
+        WS_CONNECTIONS.labels(str(room_id)).set(len(self.room_connections[room_id]))
         
         # 存储用户信息
         self.user_info[user_id] = user_data
@@ -85,6 +88,7 @@ class ConnectionManager:
         if room_id in self.room_connections:
             if user_id in self.room_connections[room_id]:
                 del self.room_connections[room_id][user_id]
+            WS_CONNECTIONS.labels(str(room_id)).set(len(self.room_connections[room_id]))
             if not self.room_connections[room_id]:
                 del self.room_connections[room_id]
                 
@@ -117,15 +121,19 @@ class ConnectionManager:
             return
             
         disconnect_users = []
-        for user_id, websocket in self.room_connections[room_id].items():
-            if exclude_user and user_id == exclude_user:
-                continue
-                
-            try:
-                await websocket.send_text(json.dumps(message, ensure_ascii=False))
-            except Exception as e:
-                print(f"广播消息失败 (用户 {user_id}): {e}")
-                disconnect_users.append(user_id)
+        recipients = 0
+        with observe_duration(WS_BROADCAST_DURATION):
+            for user_id, websocket in self.room_connections[room_id].items():
+                if exclude_user and user_id == exclude_user:
+                    continue
+                    
+                recipients += 1
+                try:
+                    await websocket.send_text(json.dumps(message, ensure_ascii=False))
+                except Exception as e:
+                    print(f"广播消息失败 (用户 {user_id}): {e}")
+                    disconnect_users.append(user_id)
+        WS_BROADCAST_RECIPIENTS.observe(recipients)
                 
         # 清理断开的连接
         for user_id in disconnect_users:
@@ -331,26 +339,26 @@ class ChatService:
         
     async def save_message(
         self, 
-        session: AsyncSession, 
         message_data: WSChatMessage, 
         sender_id: int
     ) -> ChatMessage:
-        """保存消息到数据库"""
-        message = ChatMessage(
-            content=message_data.content,
-            message_type=message_data.message_type,
-            room_id=message_data.room_id,
-            sender_id=sender_id
-        )
-        
-        session.add(message)
-        await session.commit()
-        await session.refresh(message)
-        
-        # 加载发送者信息
-        await session.refresh(message, ['sender'])
+        """保存消息到数据库（通过写入协调器与其他写入组提交）"""
+        async def insert_message(session: AsyncSession) -> ChatMessage:
+            message = ChatMessage(
+                content=message_data.content,
+                message_type=message_data.message_type,
+                room_id=message_data.room_id,
+                sender_id=sender_id
+            )
+            session.add(message)
+            await session.flush()
+            await session.refresh(message)
+            
+            # 加载发送者信息
+            await session.refresh(message, ['sender'])
+            return message
         
-        return message
+        return await write_coordinator.run(insert_message)
         
     async def handle_websocket_message(
         self, 
@@ -389,7 +397,7 @@ class ChatService:
             elif message.type == "send_message":
                 # 保存消息到数据库
                 message_data = WSChatMessage(**message.data)
-                saved_message = await self.save_message(session, message_data, user_id)
+                saved_message = await self.save_message(message_data, user_id)
                 
                 # 构建响应消息
                 response_message = {
@@ -0,0 +1,240 @@
+"""
+媒体计数器服务
+
+浏览、下载次数先在Redis（HINCRBY）或进程内累加，后台任务定期把聚合后的增量
+用批量 UPDATE media SET x = x + ? 写回数据库，读接口不再触发写事务。
+数据库中的计数最多落后 COUNTER_FLUSH_INTERVAL 秒，需要即时数值时加上 get_pending()。
+
+Redis中的增量落库时先用脚本原子地改名为落库中的键并登记到索引，落库提交后才删除；
+落库失败时放回待落库的哈希，进程在落库途中退出留下的键超过 FLUSHING_STALE_SECONDS 后由其他进程放回。
+"""
+import asyncio
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update, bindparam, func
+
+from config import settings
+from database import RedisBackoff
+from models.media import Media
+from utils.logger import get_logger
+from utils.write_coordinator import write_coordinator
+
+logger = get_logger(__name__)
+
+
+COUNTER_FIELDS = ("view_count", "download_count")
+
+PENDING_KEY = "media:counters:pending"
+FLUSHING_KEY_PREFIX = "media:counters:flushing:"
+# 落库中的键 -> 取走时间（Redis TIME 秒数）
+FLUSHING_INDEX_KEY = "media:counters:flushing-index"
+
+# 落库中的增量超过该秒数仍未删除，视为取走它的进程已退出
+FLUSHING_STALE_SECONDS = 300
+
+# 取走待落库的增量：KEYS 为待落库哈希、落库中哈希、落库中索引；待落库哈希不存在时返回空
+TAKE_PENDING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {}
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('ZADD', KEYS[3], redis.call('TIME')[1], KEYS[2])
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# 把落库中的增量放回：KEYS[1] 为待落库哈希，KEYS[2] 为落库中索引，其余为要放回的落库中哈希
+RETURN_FLUSHING_SCRIPT = """
+for i = 3, #KEYS do
+    local fields = redis.call('HGETALL', KEYS[i])
+    for j = 1, #fields, 2 do
+        redis.call('HINCRBY', KEYS[1], fields[j], fields[j + 1])
+    end
+    redis.call('DEL', KEYS[i])
+    redis.call('ZREM', KEYS[2], KEYS[i])
+end
+return #KEYS - 2
+"""
+
+
+def _field_key(media_id: int, field: str) -> str:
+    return f"{media_id}:{field}"
+
+
+class MediaCounterService:
+    """媒体计数器（写入缓冲 + 定期批量落库）"""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, str], int] = defaultdict(int)
+        self._redis = RedisBackoff("计数器", "暂时使用进程内计数")
+
+    async def incr(self, media_id: int, field: str, delta: int = 1):
+        """累加计数，不访问数据库"""
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"不支持的计数字段: {field}")
+
+        client = self._redis.client()
+        if client is not None:
+            try:
+                await client.hincrby(PENDING_KEY, _field_key(media_id, field), delta)
+                return
+            except Exception as e:
+                self._redis.failed(e)
+        self._pending[(media_id, field)] += delta
+
+    async def get_pending(self, media_id: int, field: str) -> int:
+        """尚未写回数据库的增量"""
+        pending = self._pending.get((media_id, field), 0)
+        client = self._redis.client()
+        if client is not None:
+            try:
+                pending += int(await client.hget(PENDING_KEY, _field_key(media_id, field)) or 0)
+            except Exception as e:
+                self._redis.failed(e)
+        return pending
+
+    async def _take_redis_pending(self) -> Tuple[Optional[str], Dict[Tuple[int, str], int]]:
+        """原子地取走Redis中的增量，返回 (落库中的键, 增量)；多个进程不会重复落库"""
+        client = self._redis.client()
+        if client is None:
+            return None, {}
+
+        flushing_key = f"{FLUSHING_KEY_PREFIX}{uuid.uuid4().hex}"
+        try:
+            raw = await self._redis.script(client, TAKE_PENDING_SCRIPT)(
+                keys=[PENDING_KEY, flushing_key, FLUSHING_INDEX_KEY]
+            )
+        except Exception as e:
+            self._redis.failed(e)
+            return None, {}
+        if not raw:
+            return None, {}
+
+        deltas = {}
+        for key, value in zip(raw[::2], raw[1::2]):
+            media_id, field = key.split(":", 1)
+            deltas[(int(media_id), field)] = int(value)
+        return flushing_key, deltas
+
+    async def _return_flushing(self, flushing_keys: List[str]):
+        """把落库中的增量放回待落库的哈希"""
+        client = self._redis.client()
+        if client is None or not flushing_keys:
+            return
+        try:
+            await self._redis.script(client, RETURN_FLUSHING_SCRIPT)(
+                keys=[PENDING_KEY, FLUSHING_INDEX_KEY, *flushing_keys]
+            )
+        except Exception as e:
+            # 键仍留在索引中，超时后会被重新放回
+            self._redis.failed(e)
+
+    async def _finish_flushing(self, flushing_key: str):
+        """增量已落库，删除落库中的键"""
+        client = self._redis.client()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.delete(flushing_key)
+                pipe.zrem(FLUSHING_INDEX_KEY, flushing_key)
+                await pipe.execute()
+        except Exception as e:
+            # 留下的键超时后会被放回，增量会重复累加一次
+            self._redis.failed(e)
+
+    async def _recover_stale_flushing(self):
+        """放回超时未删除的落库中的增量（取走它的进程已退出）"""
+        client = self._redis.client()
+        if client is None:
+            return
+        try:
+            now, _ = await client.time()
+            stale_keys = await client.zrangebyscore(
+                FLUSHING_INDEX_KEY, "-inf", now - FLUSHING_STALE_SECONDS
+            )
+        except Exception as e:
+            self._redis.failed(e)
+            return
+        if stale_keys:
+            logger.warning("计数器放回 %d 批未完成落库的增量", len(stale_keys))
+            await self._return_flushing(stale_keys)
+
+    async def _index_leftover_flushing(self):
+        """启动时把索引中没有的落库中的键登记到索引，超时后放回"""
+        client = self._redis.client()
+        if client is None:
+            return
+        try:
+            now, _ = await client.time()
+            async for key in client.scan_iter(match=f"{FLUSHING_KEY_PREFIX}*"):
+                await client.zadd(FLUSHING_INDEX_KEY, {key: now}, nx=True)
+        except Exception as e:
+            self._redis.failed(e)
+
+    def _restore(self, deltas: Dict[Tuple[int, str], int]):
+        """落库失败时把增量放回缓冲区"""
+        for (media_id, field), delta in deltas.items():
+            self._pending[(media_id, field)] += delta
+
+    async def flush(self) -> int:
+        """把累计的增量批量写回数据库，返回更新的行数"""
+        await self._recover_stale_flushing()
+
+        deltas = defaultdict(int)
+        local, self._pending = self._pending, defaultdict(int)
+        for key, delta in local.items():
+            deltas[key] += delta
+        flushing_key, redis_deltas = await self._take_redis_pending()
+        for key, delta in redis_deltas.items():
+            deltas[key] += delta
+
+        by_field = defaultdict(list)
+        for (media_id, field), delta in deltas.items():
+            if delta and field in COUNTER_FIELDS:
+                by_field[field].append({"media_id": media_id, "delta": delta})
+        if not by_field:
+            if flushing_key:
+                await self._finish_flushing(flushing_key)
+            return 0
+
+        table = Media.__table__
+
+        async def apply_deltas(db):
+            for field, rows in by_field.items():
+                # 计数列可能为NULL，按0处理
+                column = table.c[field]
+                stmt = (
+                    update(table)
+                    .where(table.c.id == bindparam("media_id"))
+                    .values({field: func.coalesce(column, 0) + bindparam("delta")})
+                )
+                await db.execute(stmt, rows)
+
+        try:
+            await write_coordinator.run(apply_deltas)
+        except Exception:
+            # 进程内的增量放回缓冲区，Redis中的增量放回待落库的哈希
+            self._restore(local)
+            if flushing_key:
+                await self._return_flushing([flushing_key])
+            raise
+
+        if flushing_key:
+            await self._finish_flushing(flushing_key)
+        return sum(len(rows) for rows in by_field.values())
+
+    async def flush_periodically(self):
+        """后台定期落库"""
+        await self._index_leftover_flushing()
+        while True:
+            await asyncio.sleep(settings.COUNTER_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("计数器落库失败")
+
+
+# 全局媒体计数器
+media_counters = MediaCounterService()
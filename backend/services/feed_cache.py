@@ -0,0 +1,148 @@
+"""
+媒体列表响应缓存
+
+公开媒体列表按“规范化查询条件 + 访问者类别 + 版本号”缓存序列化后的JSON：
+进程内L1（TTL + LRU）命中时不访问Redis和数据库，未命中再查Redis中的L2。
+媒体新增、修改、删除后递增Redis中的版本号，旧版本的缓存键自然失效；
+其他进程最多在 FEED_CACHE_VERSION_CHECK_SECONDS 秒后读到新版本。
+浏览数、点赞数的变化不递增版本号，由 FEED_CACHE_TTL 控制其延迟。
+Redis不可用时只使用L1，并在一段时间内不再尝试连接Redis。
+"""
+import json
+import time
+import hashlib
+from typing import Optional
+
+from config import settings
+from database import RedisBackoff
+from schemas.media import MediaListQuery
+from services.tag_service import parse_tags
+from utils.cache import TTLCache
+from utils.metrics import record_cache
+
+
+FEED_VERSION_KEY = "media:feed:version"
+FEED_KEY_PREFIX = "media:feed:"
+
+
+def get_viewer_class(query: MediaListQuery, current_user) -> Optional[str]:
+    """
+    返回访问者类别，返回None表示不缓存
+
+    非管理员看到的列表只取决于是否登录以及是否查看自己的媒体：
+    管理员和查看自己媒体的用户结果因人而异，不缓存
+    """
+    if current_user is None:
+        return "anon"
+    if current_user.is_admin or query.owner_id == current_user.id:
+        return None
+    return "user"
+
+
+def normalize_query(query: MediaListQuery) -> dict:
+    """规范化查询条件，等价的查询得到相同的缓存键"""
+    params = query.model_dump(exclude_none=True, mode="json")
+    if query.search:
+        params["search"] = query.search.strip()
+    if query.tags is not None:
+        params["tags"] = sorted(parse_tags(query.tags))
+    if query.order:
+        params["order"] = query.order.lower()
+    if query.cursor:
+        # 游标分页忽略页码
+        params.pop("page", None)
+    return params
+
+
+class FeedCache:
+    """媒体列表响应缓存"""
+
+    def __init__(self):
+        self._local = TTLCache(settings.FEED_CACHE_L1_SIZE)
+        self._version = 0
+        self._version_checked_at = 0.0
+        self._redis = RedisBackoff("媒体列表缓存", "暂时只使用进程内缓存")
+
+    @property
+    def enabled(self) -> bool:
+        return settings.FEED_CACHE_ENABLED
+
+    async def get_version(self) -> int:
+        """当前列表版本号，按间隔从Redis同步"""
+        now = time.monotonic()
+        if now - self._version_checked_at < settings.FEED_CACHE_VERSION_CHECK_SECONDS:
+            return self._version
+
+        self._version_checked_at = now
+        client = self._redis.client()
+        if client is not None:
+            try:
+                version = int(await client.get(FEED_VERSION_KEY) or 0)
+                if version != self._version:
+                    self._version = version
+                    self._local.clear()
+            except Exception as e:
+                self._redis.failed(e)
+        return self._version
+
+    async def bump_version(self):
+        """媒体变更后递增版本号，使已缓存的列表失效"""
+        if not self.enabled:
+            return
+
+        self._local.clear()
+        client = self._redis.client()
+        if client is not None:
+            try:
+                self._version = int(await client.incr(FEED_VERSION_KEY))
+                self._version_checked_at = time.monotonic()
+                return
+            except Exception as e:
+                self._redis.failed(e)
+        self._version += 1
+
+    async def make_key(self, query: MediaListQuery, viewer: str) -> str:
+        """生成缓存键"""
+        version = await self.get_version()
+        raw = json.dumps(normalize_query(query), sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha1(raw.encode()).hexdigest()
+        return f"{FEED_KEY_PREFIX}{version}:{viewer}:{digest}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """读取缓存的响应体，先查L1再查Redis"""
+        body = self._local.get(key)
+        if body is not None:
+            record_cache("feed_l1", True)
+            return body
+        record_cache("feed_l1", False)
+
+        client = self._redis.client()
+        if client is None:
+            return None
+        try:
+            value = await client.get(key)
+        except Exception as e:
+            self._redis.failed(e)
+            return None
+        record_cache("feed_redis", value is not None)
+        if value is None:
+            return None
+
+        body = value.encode() if isinstance(value, str) else value
+        self._local.set(key, body, settings.FEED_CACHE_TTL)
+        return body
+
+    async def set(self, key: str, body: bytes):
+        """写入L1和Redis"""
+        self._local.set(key, body, settings.FEED_CACHE_TTL)
+
+        client = self._redis.client()
+        if client is None:
+            return
+        try:
+            await client.set(key, body.decode(), ex=settings.FEED_CACHE_TTL)
+        except Exception as e:
+            self._redis.failed(e)
+
+
+feed_cache = FeedCache()
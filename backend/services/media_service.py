@@ -2,20 +2,41 @@
 媒体管理服务
 """
 
-from typing import Optional, List, Tuple
+import asyncio
+import logging
+from collections import Counter
+from typing import Optional, List, Tuple, Set, Iterable
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_, or_, desc, asc, select, func
+from sqlalchemy import and_, or_, desc, asc, select, func, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from fastapi import UploadFile, HTTPException
 from datetime import datetime
 
-from models.media import Media, MediaCategory, MediaPurchase, MediaType, MediaStatus
+from models.media import Media, MediaCategory, MediaPurchase, MediaBlob, MediaLike, MediaType, MediaStatus
 from models.user import User
 from schemas.media import (
     MediaCreate, MediaUpdate, MediaListQuery, MediaCategoryCreate, 
     MediaCategoryUpdate, MediaResponse, MediaListResponse, MediaStatsResponse
 )
-from utils.file import process_uploaded_file, get_file_url, delete_file
+from config import settings
+from database import AsyncSessionLocal
+from storage.base import get_storage, normalize_key
+from utils.file import stage_uploaded_file, finalize_uploaded_file, get_file_url, delete_file
 from utils.exceptions import FileUploadError
+from utils.signed_url import protected_media
+from utils.pagination import encode_cursor, decode_cursor, cursor_columns, build_keyset_condition
+from services.search_service import MediaSearchService, build_search_subquery
+from services.tag_service import TagService, build_tag_filter
+from services.feed_cache import feed_cache
+from services.counter_service import media_counters
+from services.stats_service import MediaStatsService, stats_snapshot
+from services.analytics_service import analytics, METRIC_MEDIA_VIEW
+from services.user_cache import user_cache
+from utils.logger import get_logger
+
+
+logger = get_logger(__name__)
 
 
 class MediaService:
@@ -31,55 +52,33 @@ class MediaService:
         media_data: Optional[MediaCreate] = None
     ) -> Media:
         """上传媒体文件"""
+        staged = None
+        file_info = None
+        created = False
         try:
-            # 处理文件上传
-            file_info = await process_uploaded_file(file, user_id)
-            
-            # 打印文件信息
-            print(f"[MediaService.upload_media] 文件处理结果:")
-            print(f"  filename: {file_info['filename']}")
-            print(f"  file_path: {file_info['file_path']}")
-            print(f"  thumbnail_path: {file_info.get('thumbnail_path')}")
-            print(f"  file_type: {file_info['file_type']}")
-            
-            # 创建媒体记录
-            file_url = get_file_url(file_info["file_path"])
-            thumbnail_url = get_file_url(file_info["thumbnail_path"]) if file_info.get("thumbnail_path") else None
+            # 处理文件上传（内容相同的文件复用已存储的文件和缩略图）
+            staged = await stage_uploaded_file(file)
+            file_info, created = await self._acquire_blob(staged)
             
-            print(f"[MediaService.upload_media] URL生成结果:")
-            print(f"  file_url: {file_url}")
-            print(f"  thumbnail_url: {thumbnail_url}")
-            
-            media = Media(
-                filename=file_info["filename"],
-                original_filename=file_info["original_filename"],
-                file_path=file_info["file_path"],
-                file_url=file_url,
-                thumbnail_path=file_info.get("thumbnail_path"),
-                thumbnail_url=thumbnail_url,
-                media_type=MediaType.IMAGE if file_info["file_type"] == "image" else MediaType.VIDEO,
-                mime_type=file_info["mime_type"],
-                file_size=file_info["file_size"],
-                width=file_info.get("width"),
-                height=file_info.get("height"),
-                owner_id=user_id,
-                published_at=datetime.utcnow()
+            logger.debug(
+                "上传文件处理结果: filename=%s, file_path=%s, thumbnail_path=%s, file_type=%s",
+                file_info["filename"], file_info["file_path"], file_info.get("thumbnail_path"), file_info["file_type"]
             )
             
-            # 设置媒体属性
-            if media_data:
-                media.title = media_data.title
-                media.description = media_data.description
-                media.tags = media_data.tags
-                media.category_id = media_data.category_id
-                media.is_paid = media_data.is_paid
-                media.price = media_data.price
-                media.is_private = media_data.is_private
-                media.is_featured = media_data.is_featured
+            # 创建媒体记录
+            media = self._build_media(file_info, user_id, media_data)
             
             self.db.add(media)
+            await self.db.flush()
+            await TagService(self.db).set_media_tags(media.id, media.tags)
+            await MediaSearchService(self.db).index_media(media)
+            stats = MediaStatsService(self.db)
+            stats.add(media)
+            await stats.apply()
             await self.db.commit()
             await self.db.refresh(media)
+            await protected_media.refresh_path(self.db, media.file_url)
+            await feed_cache.bump_version()
             
             # 更新用户媒体计数
             await self._update_user_media_count(user_id)
@@ -87,11 +86,164 @@ class MediaService:
             return media
             
         except FileUploadError as e:
+            await self.db.rollback()
+            await self._discard_upload(staged, file_info, created)
             raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             await self.db.rollback()
+            await self._discard_upload(staged, file_info, created)
             raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
     
+    async def _discard_upload(self, staged: Optional[dict], file_info: Optional[dict], created: bool):
+        """上传失败（事务已回滚）后清理：删除本次写入且未被引用的文件，或未能落盘的暂存文件"""
+        if created:
+            await self._delete_unreferenced_files([file_info])
+        elif staged and file_info is None:
+            await delete_file(staged["temp_path"])
+    
+    async def upload_media_batch(
+        self,
+        files: List[UploadFile],
+        user_id: int,
+        media_data: Optional[MediaCreate] = None
+    ) -> List[dict]:
+        """
+        批量上传媒体文件
+
+        文件并发写入暂存区，新文件的缩略图在线程池中并行生成；全部媒体记录
+        在一个事务中写入，用户媒体计数只在最后更新一次。
+        返回与上传顺序一致的逐项结果（filename / media / error）。
+        """
+        results = [{"filename": file.filename, "media": None, "error": None} for file in files]
+        semaphore = asyncio.Semaphore(settings.MEDIA_WORKER_THREADS)
+        
+        async def stage(index: int, file: UploadFile) -> Optional[dict]:
+            async with semaphore:
+                try:
+                    return await stage_uploaded_file(file)
+                except FileUploadError as e:
+                    results[index]["error"] = e.detail
+                    return None
+        
+        staged_list = await asyncio.gather(*(stage(i, file) for i, file in enumerate(files)))
+        
+        # 一次查询本批次涉及的已登记文件
+        blobs = {}
+        hashes = {staged["content_hash"] for staged in staged_list if staged}
+        if hashes:
+            result = await self.db.execute(
+                select(MediaBlob).filter(MediaBlob.content_hash.in_(hashes))
+            )
+            blobs = {blob.content_hash: blob for blob in result.scalars().all()}
+        
+        storage = get_storage()
+        reusable = set()
+        for content_hash, blob in blobs.items():
+            if await storage.exists(normalize_key(blob.file_path)):
+                reusable.add(content_hash)
+        
+        # 批次内内容相同的文件只生成一次，引用数按批次内的文件数一次性增加
+        ref_counts = Counter(staged["content_hash"] for staged in staged_list if staged)
+        first_staged = {}
+        for staged in staged_list:
+            if staged:
+                first_staged.setdefault(staged["content_hash"], staged)
+        
+        async def finalize(staged: dict):
+            async with semaphore:
+                try:
+                    return await finalize_uploaded_file(staged)
+                except Exception as e:
+                    return e
+        
+        async def finalize_all(pending: dict) -> dict:
+            finalized = await asyncio.gather(*(finalize(staged) for staged in pending.values()))
+            return {
+                content_hash: file_info
+                for content_hash, file_info in zip(pending.keys(), finalized)
+                if not isinstance(file_info, Exception)
+            }
+        
+        pending = {h: staged for h, staged in first_staged.items() if h not in reusable}
+        new_files = await finalize_all(pending)
+        
+        # 复用的文件原子地增加引用；期间最后一个引用被释放（文件已删除）时改为重新写入
+        lost = {}
+        for content_hash in reusable:
+            if not await self._increment_blob_refs(content_hash, ref_counts[content_hash]):
+                lost[content_hash] = first_staged[content_hash]
+        if lost:
+            reusable -= lost.keys()
+            pending.update(lost)
+            new_files.update(await finalize_all(lost))
+        
+        for content_hash, file_info in new_files.items():
+            await self._register_blob(file_info, ref_counts[content_hash])
+        
+        created = []
+        for index, staged in enumerate(staged_list):
+            if not staged:
+                continue
+            
+            content_hash = staged["content_hash"]
+            if pending.get(content_hash) is not staged:
+                await delete_file(staged["temp_path"])
+            
+            if content_hash in reusable:
+                file_info = self._blob_file_info(blobs[content_hash], staged)
+            elif content_hash in new_files:
+                file_info = dict(new_files[content_hash], original_filename=staged["original_filename"])
+            else:
+                await delete_file(staged["temp_path"])
+                results[index]["error"] = "文件处理失败"
+                continue
+            
+            media = self._build_media(file_info, user_id, media_data)
+            self.db.add(media)
+            created.append((index, media))
+        
+        if not created:
+            return results
+        
+        try:
+            await self.db.flush()
+            await TagService(self.db).set_media_tags_many([(media.id, media.tags) for _, media in created])
+            await MediaSearchService(self.db).index_many(media for _, media in created)
+            stats = MediaStatsService(self.db)
+            for _, media in created:
+                stats.add(media)
+            await stats.apply()
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            # 事务失败时清理本批次新写入、且没有被其他已提交记录引用的文件
+            await self._delete_unreferenced_files(new_files.values())
+            raise HTTPException(status_code=500, detail=f"批量上传失败: {str(e)}")
+        
+        await feed_cache.bump_version()
+        
+        # 一次查询加载数据库生成的字段
+        media_ids = [media.id for _, media in created]
+        result = await self.db.execute(
+            select(Media).filter(Media.id.in_(media_ids)).execution_options(populate_existing=True)
+        )
+        result.scalars().all()
+        
+        for index, media in created:
+            results[index]["media"] = media
+        
+        # 付费媒体，以及引用已有文件的媒体（可能改变共享文件的保护状态）需要重新判断
+        refresh_urls = {
+            media.file_url for _, media in created
+            if media.is_paid or media.content_hash in reusable
+        }
+        for file_url in refresh_urls:
+            await protected_media.refresh_path(self.db, file_url)
+        
+        await self._update_user_media_count(user_id)
+        
+        return results
+    
     async def get_media_list(
         self, 
         query: MediaListQuery,
@@ -99,23 +251,117 @@ class MediaService:
         is_admin: bool = False
     ) -> MediaListResponse:
         """获取媒体列表"""
+        filters, search_hits = self._build_list_filters(query, current_user_id, is_admin)
+        
+        # 动态排序（有搜索词时默认按相关度）
+        sort_field = query.sort_by or ("relevance" if search_hits is not None else "created_at")
+        sort_order = (query.order or "desc").lower()
+        
+        # 映射排序字段
+        sort_column_map = {
+            "created_at": Media.created_at,
+            "views": Media.view_count,
+            "likes": Media.like_count,
+            "title": Media.title,
+            "updated_at": Media.updated_at,
+            "file_size": Media.file_size
+        }
+        
+        # 排序键：最后一列为主键，保证顺序唯一，可用于游标分页
+        if sort_field == "relevance" and search_hits is not None:
+            sort_keys = [(search_hits.c.rank, False), (Media.id, True)]
+        else:
+            if sort_field not in sort_column_map:
+                sort_field = "created_at"
+            descending = sort_order != "asc"
+            sort_keys = [
+                (Media.is_featured, True),
+                (sort_column_map[sort_field], descending),
+                (Media.id, descending)
+            ]
+        cursor_sort_key = f"{sort_field}:{sort_order}"
+        
+        # 构建查询（同时取出排序键用于生成下一页游标）
+        stmt = select(Media, *cursor_columns(sort_keys)).filter(and_(*filters))
+        count_stmt = select(func.count(Media.id)).filter(and_(*filters))
+        if search_hits is not None:
+            stmt = stmt.join(search_hits, search_hits.c.media_id == Media.id)
+            count_stmt = count_stmt.join(search_hits, search_hits.c.media_id == Media.id)
+        
+        # 计算总数（游标分页默认不计算，避免每次翻页都做全量COUNT）
+        with_total = query.with_total if query.with_total is not None else not query.cursor
+        total = None
+        if with_total:
+            count_result = await self.db.execute(count_stmt)
+            total = count_result.scalar()
+        
+        stmt = stmt.order_by(*[desc(column) if descending else asc(column) for column, descending in sort_keys])
+        
+        # 分页：有游标时从游标位置继续，否则按页码偏移；多取一条判断是否还有下一页
+        if query.cursor:
+            cursor_values = decode_cursor(query.cursor, cursor_sort_key)
+            if cursor_values is None or len(cursor_values) != len(sort_keys):
+                raise HTTPException(status_code=400, detail="无效的分页游标")
+            stmt = stmt.filter(build_keyset_condition(sort_keys, cursor_values))
+        else:
+            stmt = stmt.offset((query.page - 1) * query.page_size)
+        stmt = stmt.limit(query.page_size + 1)
+        
+        result = await self.db.execute(stmt)
+        rows = result.all()
+        has_more = len(rows) > query.page_size
+        rows = rows[:query.page_size]
+        media_list = [row[0] for row in rows]
+        next_cursor = encode_cursor(cursor_sort_key, tuple(rows[-1])[1:]) if has_more else None
+        
+        # 转换为响应对象
+        from schemas.media import MediaResponse
+        media_responses = [MediaResponse.from_orm_model(media) for media in media_list]
+        
+        logger.debug("媒体列表: 总数=%s, 本页=%d, 有下一页=%s", total, len(media_list), has_more)
+        if logger.isEnabledFor(logging.DEBUG):
+            for media_resp in media_responses:
+                logger.debug(
+                    "  - ID=%s, 标题=%s, file_url=%s, thumbnail_url=%s",
+                    media_resp.id, media_resp.title, media_resp.file_url, media_resp.thumbnail_url
+                )
+        
+        # 计算总页数
+        total_pages = (total + query.page_size - 1) // query.page_size if total is not None else None
+        
+        return MediaListResponse(
+            media_list=media_responses,
+            total=total,
+            page=query.page,
+            page_size=query.page_size,
+            total_pages=total_pages,
+            next_cursor=next_cursor,
+            has_more=has_more
+        )
+    
+    def _build_list_filters(
+        self,
+        query: MediaListQuery,
+        current_user_id: Optional[int] = None,
+        is_admin: bool = False
+    ):
+        """构造列表过滤条件，返回 (过滤条件, 全文检索子查询)"""
         filters = []
         
-        print(f"[MediaService.get_media_list] 用户ID: {current_user_id}, 是否管理员: {is_admin}")
+        logger.debug("媒体列表过滤: 用户ID=%s, 管理员=%s", current_user_id, is_admin)
         
         # 基础过滤条件
         if not is_admin:
             # 非管理员只能看到状态为active的媒体
             filters.append(Media.status == MediaStatus.ACTIVE)
-            print(f"[MediaService.get_media_list] 添加过滤: status == ACTIVE")
             
             # 如果不是所有者，不能看到私密内容
             if query.owner_id != current_user_id:
                 filters.append(Media.is_private == False)
-                print(f"[MediaService.get_media_list] 添加过滤: is_private == False")
         
-        # 搜索条件
-        if query.search:
+        # 搜索条件：优先使用全文索引，不可用时回退为LIKE匹配
+        search_hits = build_search_subquery(query.search) if query.search else None
+        if query.search and search_hits is None:
             search_term = f"%{query.search}%"
             filters.append(
                 or_(
@@ -141,79 +387,29 @@ class MediaService:
             filters.append(Media.status == query.status)
         if query.owner_id:
             filters.append(Media.owner_id == query.owner_id)
-        if query.tags:
-            filters.append(Media.tags.ilike(f"%{query.tags}%"))
-        
-        # 构建查询
-        stmt = select(Media).filter(and_(*filters))
-        
-        # 计算总数
-        count_stmt = select(func.count(Media.id)).filter(and_(*filters))
-        count_result = await self.db.execute(count_stmt)
-        total = count_result.scalar()
-        
-        print(f"[MediaService.get_media_list] 符合条件的总数: {total}")
         
-        # 动态排序
-        sort_field = query.sort_by or "created_at"
-        sort_order = query.order or "desc"
+        # 标签过滤（规范化标签表精确匹配）
+        tag_filter = build_tag_filter(query.tags, query.tag_mode)
+        if tag_filter is not None:
+            filters.append(tag_filter)
         
-        # 映射排序字段
-        sort_column_map = {
-            "created_at": Media.created_at,
-            "views": Media.view_count,
-            "likes": Media.like_count,
-            "title": Media.title,
-            "updated_at": Media.updated_at,
-            "file_size": Media.file_size
-        }
-        
-        # 获取排序列
-        sort_column = sort_column_map.get(sort_field, Media.created_at)
-        
-        # 应用排序方向
-        if sort_order.lower() == "asc":
-            order_by_clause = asc(sort_column)
-        else:
-            order_by_clause = desc(sort_column)
-        
-        # 分页和排序
-        stmt = (
-            stmt
-            .order_by(desc(Media.is_featured), order_by_clause)
-            .offset((query.page - 1) * query.page_size)
-            .limit(query.page_size)
-        )
-        
-        result = await self.db.execute(stmt)
-        media_list = result.scalars().all()
-        
-        print(f"[MediaService.get_media_list] 查询到 {len(media_list)} 条数据")
-        for media in media_list:
-            print(f"  - Media ID: {media.id}, 标题: {media.title}, 状态: {media.status}, 私密: {media.is_private}")
-        
-        # 转换为响应对象
-        from schemas.media import MediaResponse
-        media_responses = [MediaResponse.from_orm_model(media) for media in media_list]
-        
-        # 打印转换后的响应数据
-        print(f"[MediaService.get_media_list] 转换为响应对象后:")
-        for media_resp in media_responses:
-            print(f"  - ID: {media_resp.id}, 标题: {media_resp.title}")
-            print(f"    file_url: {media_resp.file_url}")
-            print(f"    thumbnail_url: {media_resp.thumbnail_url}")
-            print(f"    media_type: {media_resp.media_type}")
+        return filters, search_hits
+    
+    async def get_tag_facets(
+        self,
+        query: MediaListQuery,
+        current_user_id: Optional[int] = None,
+        is_admin: bool = False,
+        limit: int = 20
+    ) -> List[dict]:
+        """统计当前筛选条件下的热门标签"""
+        filters, search_hits = self._build_list_filters(query, current_user_id, is_admin)
         
-        # 计算总页数
-        total_pages = (total + query.page_size - 1) // query.page_size
+        media_ids = select(Media.id).filter(and_(*filters))
+        if search_hits is not None:
+            media_ids = media_ids.join(search_hits, search_hits.c.media_id == Media.id)
         
-        return MediaListResponse(
-            media_list=media_responses,
-            total=total,
-            page=query.page,
-            page_size=query.page_size,
-            total_pages=total_pages
-        )
+        return await TagService(self.db).get_tag_facets(media_ids, limit)
     
     async def get_media_by_id(self, media_id: int, current_user_id: Optional[int] = None, is_admin: bool = False) -> Optional[Media]:
         """根据ID获取媒体"""
@@ -234,10 +430,10 @@ class MediaService:
             if media.is_private and media.owner_id != current_user_id:
                 return None
         
-        # 增加查看次数
+        # 增加查看次数（缓冲后批量落库，不在读请求中写数据库）
         if current_user_id != media.owner_id:  # 不对所有者计数
-            media.view_count += 1
-            await self.db.commit()
+            await media_counters.incr(media.id, "view_count")
+            analytics.record(METRIC_MEDIA_VIEW)
         
         return media
     
@@ -255,12 +451,22 @@ class MediaService:
             raise HTTPException(status_code=403, detail="无权限修改该媒体")
         
         # 更新字段
-        for field, value in update_data.dict(exclude_unset=True).items():
+        before = stats_snapshot(media)
+        update_fields = update_data.dict(exclude_unset=True)
+        for field, value in update_fields.items():
             setattr(media, field, value)
         
         media.updated_at = datetime.utcnow()
+        if "tags" in update_fields:
+            await TagService(self.db).set_media_tags(media.id, media.tags)
+        await MediaSearchService(self.db).index_media(media)
+        stats = MediaStatsService(self.db)
+        stats.change(before, media)
+        await stats.apply()
         await self.db.commit()
         await self.db.refresh(media)
+        await protected_media.refresh_path(self.db, media.file_url)
+        await feed_cache.bump_version()
         
         return media
     
@@ -278,15 +484,25 @@ class MediaService:
             raise HTTPException(status_code=403, detail="无权限删除该媒体")
         
         try:
-            # 删除文件
-            if media.file_path:
-                await delete_file(media.file_path)
-            if media.thumbnail_path:
-                await delete_file(media.thumbnail_path)
+            # 共享文件只在最后一个引用删除时才删除
+            remove_files = await self._release_blob(media.content_hash)
             
             # 删除数据库记录
+            await MediaSearchService(self.db).remove_media(media.id)
+            await TagService(self.db).remove_media_tags(media.id)
+            await self.db.execute(delete(MediaLike).where(MediaLike.media_id == media.id))
+            stats = MediaStatsService(self.db)
+            stats.remove(media)
+            await stats.apply()
             await self.db.delete(media)
             await self.db.commit()
+            await protected_media.refresh_path(self.db, media.file_url)
+            await feed_cache.bump_version()
+            
+            # 删除文件
+            if remove_files:
+                keys = [normalize_key(path) for path in (media.file_path, media.thumbnail_path) if path]
+                await get_storage().delete_many(keys)
             
             # 更新用户媒体计数
             await self._update_user_media_count(media.owner_id)
@@ -298,48 +514,227 @@ class MediaService:
             raise HTTPException(status_code=500, detail=f"删除媒体失败: {str(e)}")
     
     async def toggle_like(self, media_id: int, user_id: int) -> Tuple[bool, int]:
-        """切换点赞状态"""
-        stmt = select(Media).filter(Media.id == media_id)
+        """切换点赞状态，返回 (是否已点赞, 点赞数)"""
+        stmt = select(Media.id).filter(Media.id == media_id)
         result = await self.db.execute(stmt)
-        media = result.scalar_one_or_none()
-        
-        if not media:
+        if result.scalar_one_or_none() is None:
             raise HTTPException(status_code=404, detail="媒体不存在")
         
-        # 这里简化处理，实际应该有单独的点赞表
-        # 暂时只更新点赞数，不跟踪具体用户
-        media.like_count += 1
+        # 已点赞则取消，否则新增；like_count 与点赞记录在同一事务中原子更新
+        result = await self.db.execute(
+            delete(MediaLike).where(MediaLike.user_id == user_id, MediaLike.media_id == media_id)
+        )
+        if result.rowcount:
+            is_liked, delta = False, -1
+        else:
+            try:
+                async with self.db.begin_nested():
+                    self.db.add(MediaLike(user_id=user_id, media_id=media_id))
+                is_liked, delta = True, 1
+            except IntegrityError:
+                # 并发请求已点赞
+                is_liked, delta = True, 0
+        
+        if delta:
+            await self.db.execute(
+                update(Media)
+                .where(Media.id == media_id)
+                .values(like_count=func.max(func.coalesce(Media.like_count, 0) + delta, 0))
+            )
         await self.db.commit()
         
-        return True, media.like_count
+        result = await self.db.execute(select(Media.like_count).filter(Media.id == media_id))
+        return is_liked, result.scalar() or 0
+    
+    async def get_liked_media_ids(self, user_id: int, media_ids: Iterable[int]) -> Set[int]:
+        """批量查询用户点赞过的媒体（一次主键索引查询）"""
+        media_ids = list(set(media_ids))
+        if not media_ids:
+            return set()
+        
+        result = await self.db.execute(
+            select(MediaLike.media_id).where(
+                MediaLike.user_id == user_id,
+                MediaLike.media_id.in_(media_ids)
+            )
+        )
+        return set(result.scalars().all())
     
     async def get_media_stats(self, user_id: Optional[int] = None) -> MediaStatsResponse:
-        """获取媒体统计信息"""
-        stmt = select(Media)
+        """获取媒体统计信息（读取增量维护的汇总表）"""
+        return await MediaStatsService(self.db).get_stats(owner_id=user_id)
+    
+    def _build_media(self, file_info: dict, user_id: int, media_data: Optional[MediaCreate] = None) -> Media:
+        """根据文件处理结果创建媒体记录"""
+        file_url = get_file_url(file_info["file_path"])
+        thumbnail_url = get_file_url(file_info["thumbnail_path"]) if file_info.get("thumbnail_path") else None
+        
+        logger.debug("媒体URL: file_url=%s, thumbnail_url=%s", file_url, thumbnail_url)
+        
+        media = Media(
+            filename=file_info["filename"],
+            original_filename=file_info["original_filename"],
+            file_path=file_info["file_path"],
+            file_url=file_url,
+            thumbnail_path=file_info.get("thumbnail_path"),
+            thumbnail_url=thumbnail_url,
+            media_type=MediaType.IMAGE if file_info["file_type"] == "image" else MediaType.VIDEO,
+            mime_type=file_info["mime_type"],
+            file_size=file_info["file_size"],
+            width=file_info.get("width"),
+            height=file_info.get("height"),
+            content_hash=file_info["content_hash"],
+            owner_id=user_id,
+            published_at=datetime.utcnow()
+        )
         
-        if user_id:
-            stmt = stmt.filter(Media.owner_id == user_id)
+        # 设置媒体属性
+        if media_data:
+            media.title = media_data.title
+            media.description = media_data.description
+            media.tags = media_data.tags
+            media.category_id = media_data.category_id
+            media.is_paid = media_data.is_paid
+            media.price = media_data.price
+            media.is_private = media_data.is_private
+            media.is_featured = media_data.is_featured
+        
+        return media
+    
+    @staticmethod
+    def _blob_file_info(blob: MediaBlob, staged: dict) -> dict:
+        """已登记文件的信息"""
+        return {
+            "filename": blob.filename,
+            "original_filename": staged["original_filename"],
+            "file_path": blob.file_path,
+            "thumbnail_path": blob.thumbnail_path,
+            "file_type": blob.media_type.value,
+            "file_size": blob.file_size,
+            "mime_type": blob.mime_type,
+            "width": blob.width,
+            "height": blob.height,
+            "content_hash": blob.content_hash
+        }
+    
+    @staticmethod
+    def _blob_values(file_info: dict) -> dict:
+        """新写入文件登记到文件记录的字段"""
+        return {
+            "filename": file_info["filename"],
+            "file_path": file_info["file_path"],
+            "thumbnail_path": file_info.get("thumbnail_path"),
+            "media_type": MediaType.IMAGE if file_info["file_type"] == "image" else MediaType.VIDEO,
+            "mime_type": file_info["mime_type"],
+            "file_size": file_info["file_size"],
+            "width": file_info.get("width"),
+            "height": file_info.get("height"),
+        }
+    
+    @staticmethod
+    async def _delete_unreferenced_files(file_infos: Iterable[dict]):
+        """
+        删除写入后未能登记的文件
+
+        文件按内容哈希寻址，并发上传相同内容的请求可能已提交并引用同一个key，
+        删除前在新会话中重新检查文件记录和媒体记录，仍被引用的key保留
+        """
+        file_infos = list(file_infos)
+        keys = set()
+        for file_info in file_infos:
+            keys.add(file_info["file_path"])
+            if file_info.get("thumbnail_path"):
+                keys.add(file_info["thumbnail_path"])
+        if not keys:
+            return
+        
+        hashes = [file_info["content_hash"] for file_info in file_infos]
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(MediaBlob.file_path, MediaBlob.thumbnail_path).where(MediaBlob.content_hash.in_(hashes))
+            )
+            referenced = {path for row in result.all() for path in row if path}
+            result = await session.execute(
+                select(Media.file_path, Media.thumbnail_path).where(
+                    or_(Media.file_path.in_(keys), Media.thumbnail_path.in_(keys))
+                )
+            )
+            referenced.update(path for row in result.all() for path in row if path)
         
+        await get_storage().delete_many(keys - referenced)
+    
+    async def _increment_blob_refs(self, content_hash: str, count: int = 1) -> bool:
+        """原子地增加引用计数（UPDATE ... SET ref_count = ref_count + n），记录已被删除时返回False"""
+        result = await self.db.execute(
+            update(MediaBlob)
+            .where(MediaBlob.content_hash == content_hash)
+            .values(ref_count=MediaBlob.ref_count + count)
+        )
+        return result.rowcount > 0
+    
+    async def _register_blob(self, file_info: dict, count: int = 1):
+        """
+        登记新写入的文件并增加引用
+
+        用 INSERT ... ON CONFLICT(content_hash) DO UPDATE 一条语句完成：并发上传相同内容时
+        后写入的请求在冲突时累加引用，不会因唯一约束失败；登记记录存在但文件已丢失时同时重新指向新文件
+        """
+        values = self._blob_values(file_info)
+        stmt = sqlite_insert(MediaBlob).values(content_hash=file_info["content_hash"], ref_count=count, **values)
+        await self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[MediaBlob.content_hash],
+            set_={
+                "ref_count": MediaBlob.ref_count + stmt.excluded.ref_count,
+                **{name: stmt.excluded[name] for name in values},
+            }
+        ))
+    
+    async def _acquire_blob(self, staged: dict) -> Tuple[dict, bool]:
+        """
+        按内容哈希获取文件：已存在则增加引用并删除暂存文件，否则落盘并登记
+
+        返回 (文件信息, 是否新写入了文件)
+        """
+        stmt = select(MediaBlob).filter(MediaBlob.content_hash == staged["content_hash"])
         result = await self.db.execute(stmt)
-        media_list = result.scalars().all()
-        
-        total_media = len(media_list)
-        total_images = len([m for m in media_list if m.media_type == MediaType.IMAGE])
-        total_videos = len([m for m in media_list if m.media_type == MediaType.VIDEO])
-        total_size = sum(m.file_size or 0 for m in media_list)
-        total_size_mb = round(total_size / 1024 / 1024, 2)
-        paid_media = len([m for m in media_list if m.is_paid])
-        free_media = total_media - paid_media
-        
-        return MediaStatsResponse(
-            total_media=total_media,
-            total_images=total_images,
-            total_videos=total_videos,
-            total_size=total_size,
-            total_size_mb=total_size_mb,
-            paid_media=paid_media,
-            free_media=free_media
+        blob = result.scalar_one_or_none()
+        
+        if (
+            blob
+            and await get_storage().exists(normalize_key(blob.file_path))
+            and await self._increment_blob_refs(blob.content_hash)
+        ):
+            await delete_file(staged["temp_path"])
+            return self._blob_file_info(blob, staged), False
+        
+        # 新文件、文件已丢失，或期间最后一个引用被释放（文件随之删除）时重新写入
+        file_info = await finalize_uploaded_file(staged)
+        try:
+            await self._register_blob(file_info)
+        except Exception:
+            await self._delete_unreferenced_files([file_info])
+            raise
+        return file_info, True
+    
+    async def _release_blob(self, content_hash: Optional[str]) -> bool:
+        """减少文件引用计数，返回是否需要删除物理文件"""
+        if not content_hash:
+            # 去重之前上传的媒体没有登记记录，直接删除文件
+            return True
+        
+        result = await self.db.execute(
+            update(MediaBlob)
+            .where(MediaBlob.content_hash == content_hash)
+            .values(ref_count=MediaBlob.ref_count - 1)
+        )
+        if not result.rowcount:
+            return True
+        
+        # 只有条件删除确实删掉了记录（没有并发请求增加引用）才删除物理文件
+        result = await self.db.execute(
+            delete(MediaBlob).where(MediaBlob.content_hash == content_hash, MediaBlob.ref_count <= 0)
         )
+        return result.rowcount > 0
     
     async def _update_user_media_count(self, user_id: int):
         """更新用户媒体计数"""
@@ -356,6 +751,7 @@ class MediaService:
         if user:
             user.media_count = count
             await self.db.commit()
+            await user_cache.invalidate(user_id)
 
 
 class MediaCategoryService:
@@ -0,0 +1,202 @@
+"""
+媒体全文检索服务（SQLite FTS5）
+
+FTS5 自带的 unicode61 分词器会把连续的中文当作一个词，无法按词检索；
+这里在写入索引和构造查询时先把中日韩文字拆成单字，中文关键词按相邻单字的
+短语匹配，英文和数字按词前缀匹配，结果使用 BM25 排序。
+非 SQLite 数据库或 SQLite 未编译 FTS5 时不启用，检索回退为 LIKE 匹配。
+"""
+import re
+from typing import Iterable, Optional
+
+from sqlalchemy import text, func, select, literal_column, bindparam
+from sqlalchemy.sql import table, column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.media import Media
+
+
+FTS_TABLE = "media_fts"
+
+# 字段权重：标题 > 标签 > 描述 > 文件名
+_BM25_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+# 中日韩统一表意文字、假名、谚文
+_CJK_RE = re.compile(r"([぀-ヿ㐀-䶿一-鿿豈-﫿가-힯])")
+_WORD_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]+|[^\W_]+")
+
+_fts_table = table(
+    FTS_TABLE,
+    column("rowid"),
+    column("title"),
+    column("description"),
+    column("tags"),
+    column("filename")
+)
+
+# 在 create_all_tables 中根据数据库能力设置
+_fts_enabled = False
+
+
+def is_search_index_enabled() -> bool:
+    """全文索引是否可用"""
+    return _fts_enabled
+
+
+def tokenize_for_index(value: Optional[str]) -> str:
+    """在中日韩文字两侧加空格，使每个字成为单独的词"""
+    if not value:
+        return ""
+    return _CJK_RE.sub(r" \1 ", value)
+
+
+def build_match_query(keywords: str) -> Optional[str]:
+    """
+    将用户输入转换为 FTS5 MATCH 表达式
+
+    多个关键词之间为 AND；中文按相邻单字的短语匹配，英文和数字按前缀匹配。
+    """
+    terms = []
+    for word in _WORD_RE.findall(keywords or ""):
+        if _CJK_RE.match(word):
+            terms.append('"' + " ".join(word) + '"')
+        else:
+            terms.append(f'"{word}"*')
+    return " ".join(terms) or None
+
+
+def build_search_subquery(keywords: str):
+    """
+    构造检索子查询（media_id, rank），rank 越小越相关
+
+    索引不可用或关键词中没有可检索的词时返回None
+    """
+    if not _fts_enabled:
+        return None
+
+    match_query = build_match_query(keywords)
+    if not match_query:
+        return None
+
+    fts = literal_column(FTS_TABLE)
+    return (
+        select(
+            _fts_table.c.rowid.label("media_id"),
+            func.bm25(fts, *_BM25_WEIGHTS).label("rank")
+        )
+        .select_from(_fts_table)
+        .where(fts.op("MATCH")(bindparam("match_query", match_query)))
+        .subquery("search_hits")
+    )
+
+
+def _index_values(media: Media) -> dict:
+    return {
+        "media_id": media.id,
+        "title": tokenize_for_index(media.title),
+        "description": tokenize_for_index(media.description),
+        "tags": tokenize_for_index(media.tags.replace(",", " ") if media.tags else None),
+        "filename": tokenize_for_index(media.original_filename)
+    }
+
+
+_DELETE_SQL = text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :media_id")
+_INSERT_SQL = text(
+    f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags, filename) "
+    "VALUES (:media_id, :title, :description, :tags, :filename)"
+)
+
+
+def create_search_index(sync_conn):
+    """创建全文索引表；新建时用现有媒体数据填充"""
+    global _fts_enabled
+
+    if sync_conn.dialect.name != "sqlite":
+        _fts_enabled = False
+        return
+
+    exists = sync_conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE}
+    ).first()
+    if exists:
+        _fts_enabled = True
+        return
+
+    try:
+        sync_conn.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, description, tags, filename, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+    except Exception as e:
+        print(f"⚠️  SQLite 不支持 FTS5，全文检索回退为 LIKE 匹配: {e}")
+        _fts_enabled = False
+        return
+
+    _fts_enabled = True
+    rows = sync_conn.execute(
+        select(Media.id, Media.title, Media.description, Media.tags, Media.original_filename)
+    )
+    values = [_index_values(row) for row in rows]
+    if values:
+        sync_conn.execute(_INSERT_SQL, values)
+        print(f"✅ 全文索引已建立，共 {len(values)} 条媒体")
+
+
+class MediaSearchService:
+    """媒体全文索引维护，与媒体记录在同一事务中写入"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def index_media(self, media: Media):
+        """写入或更新媒体的索引（media.id 需已生成）"""
+        if not _fts_enabled:
+            return
+        await self.db.execute(_DELETE_SQL, {"media_id": media.id})
+        await self.db.execute(_INSERT_SQL, _index_values(media))
+
+    async def index_many(self, media_list: Iterable[Media]):
+        """批量写入索引"""
+        if not _fts_enabled:
+            return
+        values = [_index_values(media) for media in media_list]
+        if not values:
+            return
+        await self.db.execute(_DELETE_SQL, [{"media_id": value["media_id"]} for value in values])
+        await self.db.execute(_INSERT_SQL, values)
+
+    async def remove_media(self, media_id: int):
+        """删除媒体的索引"""
+        if not _fts_enabled:
+            return
+        await self.db.execute(_DELETE_SQL, {"media_id": media_id})
+
+    async def rebuild(self, batch_size: int = 500) -> int:
+        """清空并按主键分批重建索引，返回索引条数"""
+        if not _fts_enabled:
+            return 0
+
+        await self.db.execute(text(f"DELETE FROM {FTS_TABLE}"))
+
+        indexed_count = 0
+        last_id = 0
+        while True:
+            result = await self.db.execute(
+                select(Media.id, Media.title, Media.description, Media.tags, Media.original_filename)
+                .where(Media.id > last_id)
+                .order_by(Media.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            await self.db.execute(_INSERT_SQL, [_index_values(row) for row in rows])
+            indexed_count += len(rows)
+            last_id = rows[-1].id
+
+        # 合并索引段，提高查询效率
+        await self.db.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"))
+        await self.db.commit()
+        return indexed_count
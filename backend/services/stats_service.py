@@ -0,0 +1,188 @@
+"""
+媒体统计服务
+
+统计数据保存在 media_stats_rollup 汇总表中（全站、每个所有者、每个分类各一行），
+与媒体记录在同一事务中增量更新，查询统计只读一行。
+汇总表缺失或需要校正时，用分组聚合查询从 media 表重建。
+"""
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, delete, func, case, insert as sa_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.media import Media, MediaStatsRollup, MediaType
+from schemas.media import MediaStatsResponse
+
+
+SCOPE_GLOBAL = "global"
+SCOPE_OWNER = "owner"
+SCOPE_CATEGORY = "category"
+
+STAT_FIELDS = ("total_media", "total_images", "total_videos", "total_size", "paid_media")
+
+
+def stats_snapshot(media: Media) -> Tuple:
+    """影响统计的字段，更新前后比较用"""
+    return (media.owner_id, media.category_id, media.media_type, media.file_size or 0, bool(media.is_paid))
+
+
+def _snapshot_deltas(snapshot: Tuple, sign: int) -> Dict[Tuple[str, int], Dict[str, int]]:
+    owner_id, category_id, media_type, file_size, is_paid = snapshot
+    values = {
+        "total_media": sign,
+        "total_images": sign if media_type == MediaType.IMAGE else 0,
+        "total_videos": sign if media_type == MediaType.VIDEO else 0,
+        "total_size": sign * file_size,
+        "paid_media": sign if is_paid else 0,
+    }
+    scopes = [(SCOPE_GLOBAL, 0), (SCOPE_OWNER, owner_id)]
+    if category_id:
+        scopes.append((SCOPE_CATEGORY, category_id))
+    return {scope: values for scope in scopes}
+
+
+def aggregate_columns():
+    """统计用的聚合列（一次扫描同时得到全部计数）"""
+    return (
+        func.count(Media.id).label("total_media"),
+        func.coalesce(func.sum(case((Media.media_type == MediaType.IMAGE, 1), else_=0)), 0).label("total_images"),
+        func.coalesce(func.sum(case((Media.media_type == MediaType.VIDEO, 1), else_=0)), 0).label("total_videos"),
+        func.coalesce(func.sum(Media.file_size), 0).label("total_size"),
+        func.coalesce(func.sum(case((Media.is_paid == True, 1), else_=0)), 0).label("paid_media"),
+    )
+
+
+def _to_response(total_media=0, total_images=0, total_videos=0, total_size=0, paid_media=0) -> MediaStatsResponse:
+    return MediaStatsResponse(
+        total_media=total_media,
+        total_images=total_images,
+        total_videos=total_videos,
+        total_size=total_size,
+        total_size_mb=round(total_size / 1024 / 1024, 2),
+        paid_media=paid_media,
+        free_media=total_media - paid_media
+    )
+
+
+def _rollup_queries():
+    """计算汇总行的分组聚合查询：[(维度, 分组列, 查询)]"""
+    queries = [(SCOPE_GLOBAL, None, select(*aggregate_columns()))]
+    for scope, column in ((SCOPE_OWNER, Media.owner_id), (SCOPE_CATEGORY, Media.category_id)):
+        queries.append((scope, column, select(column, *aggregate_columns()).where(column.isnot(None)).group_by(column)))
+    return queries
+
+
+def _rollup_rows(scope: str, column, result_rows) -> list:
+    rows = []
+    for row in result_rows:
+        if column is None and not row.total_media:
+            continue
+        scope_id = 0 if column is None else row[0]
+        rows.append({"scope": scope, "scope_id": scope_id, **{field: getattr(row, field) for field in STAT_FIELDS}})
+    return rows
+
+
+def create_stats_rollup(sync_conn):
+    """汇总表为空而已有媒体时（首次升级）从 media 表回填"""
+    has_rollup = sync_conn.execute(select(MediaStatsRollup.scope).limit(1)).first()
+    if has_rollup:
+        return
+
+    rows = []
+    for scope, column, stmt in _rollup_queries():
+        rows.extend(_rollup_rows(scope, column, sync_conn.execute(stmt).all()))
+    if rows:
+        sync_conn.execute(sa_insert(MediaStatsRollup), rows)
+        print(f"✅ 媒体统计汇总已建立，共 {len(rows)} 行")
+
+
+class MediaStatsService:
+    """媒体统计汇总维护与查询"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._deltas: Dict[Tuple[str, int], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+
+    def add(self, media: Media):
+        """记录新增的媒体"""
+        self._merge(_snapshot_deltas(stats_snapshot(media), 1))
+
+    def remove(self, media: Media):
+        """记录删除的媒体"""
+        self._merge(_snapshot_deltas(stats_snapshot(media), -1))
+
+    def change(self, before: Tuple, media: Media):
+        """记录媒体属性变化（before 为修改前的 stats_snapshot）"""
+        after = stats_snapshot(media)
+        if before != after:
+            self._merge(_snapshot_deltas(before, -1))
+            self._merge(_snapshot_deltas(after, 1))
+
+    def _merge(self, deltas: Dict[Tuple[str, int], Dict[str, int]]):
+        for scope, values in deltas.items():
+            for field, value in values.items():
+                self._deltas[scope][field] += value
+
+    async def apply(self):
+        """把累计的增量写入汇总表（调用方负责提交事务）"""
+        rows = [
+            {"scope": scope, "scope_id": scope_id, **values}
+            for (scope, scope_id), values in self._deltas.items()
+            if any(values.values())
+        ]
+        self._deltas.clear()
+        if not rows:
+            return
+
+        stmt = sqlite_insert(MediaStatsRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MediaStatsRollup.scope, MediaStatsRollup.scope_id],
+            set_={field: getattr(MediaStatsRollup, field) + getattr(stmt.excluded, field) for field in STAT_FIELDS}
+        )
+        await self.db.execute(stmt, rows)
+
+    async def get_stats(self, owner_id: Optional[int] = None, category_id: Optional[int] = None) -> MediaStatsResponse:
+        """读取汇总统计（按主键取一行）"""
+        if owner_id:
+            scope, scope_id = SCOPE_OWNER, owner_id
+        elif category_id:
+            scope, scope_id = SCOPE_CATEGORY, category_id
+        else:
+            scope, scope_id = SCOPE_GLOBAL, 0
+
+        result = await self.db.execute(
+            select(*(getattr(MediaStatsRollup, field) for field in STAT_FIELDS)).where(
+                MediaStatsRollup.scope == scope,
+                MediaStatsRollup.scope_id == scope_id
+            )
+        )
+        row = result.first()
+        if row is None:
+            return _to_response()
+        return _to_response(**row._asdict())
+
+    async def compute_stats(self, owner_id: Optional[int] = None, category_id: Optional[int] = None) -> MediaStatsResponse:
+        """直接用聚合查询计算统计（用于校验汇总表）"""
+        stmt = select(*aggregate_columns())
+        if owner_id:
+            stmt = stmt.where(Media.owner_id == owner_id)
+        if category_id:
+            stmt = stmt.where(Media.category_id == category_id)
+
+        result = await self.db.execute(stmt)
+        return _to_response(**result.one()._asdict())
+
+    async def rebuild(self) -> int:
+        """用分组聚合查询重建汇总表，返回行数"""
+        rows = []
+        for scope, column, stmt in _rollup_queries():
+            result = await self.db.execute(stmt)
+            rows.extend(_rollup_rows(scope, column, result.all()))
+
+        await self.db.execute(delete(MediaStatsRollup))
+        if rows:
+            await self.db.execute(sa_insert(MediaStatsRollup), rows)
+        await self.db.commit()
+        return len(rows)
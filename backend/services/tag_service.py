@@ -0,0 +1,126 @@
+"""
+标签服务
+
+Media.tags 保留逗号分隔的原始标签用于展示，检索和统计使用规范化的
+tags / media_tags 表（标签名去空白、转小写后精确匹配）。
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, insert, func, desc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.media import Media, Tag, MediaTag
+
+
+TAG_MAX_LENGTH = 50
+
+
+def parse_tags(tags: Optional[str]) -> List[str]:
+    """解析逗号分隔的标签（支持中文逗号），去重并保持顺序"""
+    if not tags:
+        return []
+
+    names = []
+    for name in tags.replace("，", ",").split(","):
+        name = name.strip().lower()[:TAG_MAX_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def build_tag_filter(tags: Optional[str], mode: str = "any"):
+    """
+    构造按标签过滤媒体的条件
+
+    mode 为 any 时匹配任一标签（OR），为 all 时必须包含全部标签（AND）
+    """
+    names = parse_tags(tags)
+    if not names:
+        return None
+
+    media_ids = (
+        select(MediaTag.media_id)
+        .join(Tag, Tag.id == MediaTag.tag_id)
+        .where(Tag.name.in_(names))
+    )
+    if mode == "all" and len(names) > 1:
+        media_ids = media_ids.group_by(MediaTag.media_id).having(func.count(MediaTag.tag_id) == len(names))
+
+    return Media.id.in_(media_ids)
+
+
+class TagService:
+    """标签服务"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_or_create_tags(self, names: Iterable[str]) -> Dict[str, int]:
+        """获取标签ID，不存在的标签自动创建"""
+        names = list(names)
+        if not names:
+            return {}
+
+        result = await self.db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names)))
+        tag_ids = dict(result.all())
+
+        for name in names:
+            if name in tag_ids:
+                continue
+            try:
+                async with self.db.begin_nested():
+                    tag = Tag(name=name)
+                    self.db.add(tag)
+                tag_ids[name] = tag.id
+            except IntegrityError:
+                # 并发请求已创建同名标签
+                result = await self.db.execute(select(Tag.id).where(Tag.name == name))
+                tag_ids[name] = result.scalar_one()
+
+        return tag_ids
+
+    async def set_media_tags(self, media_id: int, tags: Optional[str]):
+        """用逗号分隔的标签替换媒体的标签关联"""
+        await self.set_media_tags_many([(media_id, tags)])
+
+    async def set_media_tags_many(self, items: List[Tuple[int, Optional[str]]]):
+        """批量替换多个媒体的标签关联（media_id, 逗号分隔标签）"""
+        if not items:
+            return
+
+        parsed = [(media_id, parse_tags(tags)) for media_id, tags in items]
+        all_names = {name for _, names in parsed for name in names}
+        tag_ids = await self.get_or_create_tags(sorted(all_names))
+
+        await self.db.execute(
+            delete(MediaTag).where(MediaTag.media_id.in_([media_id for media_id, _ in parsed]))
+        )
+        rows = [
+            {"media_id": media_id, "tag_id": tag_ids[name]}
+            for media_id, names in parsed
+            for name in names
+        ]
+        if rows:
+            await self.db.execute(insert(MediaTag), rows)
+
+    async def remove_media_tags(self, media_id: int):
+        """删除媒体的全部标签关联"""
+        await self.db.execute(delete(MediaTag).where(MediaTag.media_id == media_id))
+
+    async def get_tag_facets(self, media_ids, limit: int = 20) -> List[dict]:
+        """
+        统计一组媒体中出现最多的标签
+
+        media_ids 为返回媒体ID的子查询，计数由数据库完成
+        """
+        count_column = func.count(MediaTag.media_id).label("count")
+        result = await self.db.execute(
+            select(Tag.name, count_column)
+            .join(MediaTag, MediaTag.tag_id == Tag.id)
+            .where(MediaTag.media_id.in_(media_ids))
+            .group_by(Tag.id, Tag.name)
+            .order_by(desc(count_column), Tag.name)
+            .limit(limit)
+        )
+        return [{"name": name, "count": count} for name, count in result.all()]
@@ -0,0 +1,166 @@
+"""
+已认证用户缓存
+
+get_current_user 每个请求都要按ID查询 users 表。这里缓存用户的列值（不含密码哈希）：
+进程内L1的TTL较短，Redis中的L2的TTL较长。
+用户信息变更后调用 invalidate()，删除本进程L1和Redis中的缓存；
+其他进程的L1最多在 USER_CACHE_L1_TTL 秒后过期。
+
+未命中时 get() 同时返回失效版本号，查询数据库后带着它调用 set()：
+期间用户被 invalidate() 过（如被禁用）时不写入缓存，避免把变更前读到的旧记录写回。
+
+缓存返回的 User 是未绑定会话的临时对象，只能读取列属性；
+需要修改用户时应在当前会话中重新查询。
+"""
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import DateTime, Enum
+
+from config import settings
+from database import RedisBackoff
+from models.user import User
+from utils.cache import TTLCache
+from utils.metrics import record_cache
+
+
+USER_KEY_PREFIX = "auth:user:"
+# 用户缓存的失效版本号，每次 invalidate() 递增
+USER_GENERATION_KEY_PREFIX = "auth:user:gen:"
+USER_GENERATION_TTL = 24 * 3600
+
+# 失效版本号与读取数据库前一致时才写入：KEYS 为缓存键、版本号键，ARGV 为版本号、缓存值、TTL
+SET_IF_CURRENT_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+# (本进程失效次数, Redis中的失效版本号；Redis不可用时为None)
+Generation = Tuple[int, Optional[str]]
+
+# 不进入缓存的列
+EXCLUDED_COLUMNS = {"hashed_password"}
+
+
+def _serialize(user: User) -> str:
+    data = {}
+    for column in User.__table__.columns:
+        if column.name in EXCLUDED_COLUMNS:
+            continue
+        value = getattr(user, column.name)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif hasattr(value, "value"):
+            value = value.value
+        data[column.name] = value
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _deserialize(raw: str) -> User:
+    data = json.loads(raw)
+    for column in User.__table__.columns:
+        value = data.get(column.name)
+        if value is None:
+            continue
+        if isinstance(column.type, DateTime):
+            data[column.name] = datetime.fromisoformat(value)
+        elif isinstance(column.type, Enum) and column.type.enum_class is not None:
+            data[column.name] = column.type.enum_class(value)
+    return User(**data)
+
+
+class UserCache:
+    """已认证用户缓存（L1 进程内 + L2 Redis）"""
+
+    def __init__(self):
+        self._local = TTLCache(settings.USER_CACHE_L1_SIZE)
+        self._redis = RedisBackoff("用户缓存", "暂时只使用进程内缓存")
+        # 本进程的失效次数，查询数据库期间有任何用户失效时不写入L1
+        self._local_generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.USER_CACHE_ENABLED
+
+    async def get(self, user_id: int) -> Tuple[Optional[User], Optional[Generation]]:
+        """读取缓存的用户，返回 (用户, 失效版本号)；未命中时用户为None，版本号传给 set()"""
+        if not self.enabled:
+            return None, None
+
+        raw = self._local.get(user_id)
+        record_cache("user_l1", raw is not None)
+        if raw is not None:
+            # 每次返回新对象，调用方修改属性不会影响缓存
+            return _deserialize(raw), None
+
+        local_generation = self._local_generation
+        client = self._redis.client()
+        if client is None:
+            return None, (local_generation, None)
+        try:
+            raw, generation = await client.mget(
+                f"{USER_KEY_PREFIX}{user_id}", f"{USER_GENERATION_KEY_PREFIX}{user_id}"
+            )
+        except Exception as e:
+            self._redis.failed(e)
+            return None, (local_generation, None)
+        record_cache("user_redis", raw is not None)
+        if raw is None:
+            return None, (local_generation, generation or "0")
+
+        if self._local_generation == local_generation:
+            self._local.set(user_id, raw, settings.USER_CACHE_L1_TTL)
+        return _deserialize(raw), None
+
+    async def set(self, user: User, generation: Optional[Generation]):
+        """缓存从数据库读取的用户，generation 为查询数据库前 get() 返回的失效版本号"""
+        if not self.enabled or generation is None:
+            return
+
+        local_generation, redis_generation = generation
+        if self._local_generation != local_generation:
+            return
+
+        raw = _serialize(user)
+        if redis_generation is not None:
+            client = self._redis.client()
+            if client is None:
+                return
+            try:
+                stored = await self._redis.script(client, SET_IF_CURRENT_SCRIPT)(
+                    keys=[f"{USER_KEY_PREFIX}{user.id}", f"{USER_GENERATION_KEY_PREFIX}{user.id}"],
+                    args=[redis_generation, raw, settings.USER_CACHE_TTL]
+                )
+            except Exception as e:
+                self._redis.failed(e)
+                return
+            if not stored or self._local_generation != local_generation:
+                return
+
+        self._local.set(user.id, raw, settings.USER_CACHE_L1_TTL)
+
+    async def invalidate(self, user_id: int):
+        """用户信息变更后删除缓存，并使查询中的旧记录不再写入"""
+        self._local_generation += 1
+        self._local.delete(user_id)
+
+        client = self._redis.client()
+        if client is None:
+            return
+        generation_key = f"{USER_GENERATION_KEY_PREFIX}{user_id}"
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.incr(generation_key)
+                pipe.expire(generation_key, USER_GENERATION_TTL)
+                pipe.delete(f"{USER_KEY_PREFIX}{user_id}")
+                await pipe.execute()
+        except Exception as e:
+            self._redis.failed(e)
+
+
+# 全局已认证用户缓存
+user_cache = UserCache()
@@ -9,7 +9,9 @@ from datetime import datetime, timedelta
 
 from models.user import User, UserRole, UserStatus
 from schemas.user import UserCreate, UserUpdate, UserAdminUpdate, UserListQuery
-from utils.auth import get_password_hash, verify_password
+from utils.auth import get_password_hash_async, verify_password_async, verify_and_update_password_async
+from services.analytics_service import analytics, AnalyticsService, METRIC_USER_SIGNUP
+from services.user_cache import user_cache
 from utils.exceptions import (
     DuplicateResourceError, 
     ResourceNotFoundError, 
@@ -65,7 +67,7 @@ async def create_user(db: AsyncSession, user_data: UserCreate) -> User:
         raise DuplicateResourceError("用户名已被使用")
     
     # 创建用户
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
     user = User(
         email=user_data.email,
@@ -82,6 +84,7 @@ async def create_user(db: AsyncSession, user_data: UserCreate) -> User:
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    analytics.record(METRIC_USER_SIGNUP)
     
     return user
 
@@ -93,16 +96,22 @@ async def authenticate_user(db: AsyncSession, identifier: str, password: str) ->
     if not user:
         return None
     
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not verified:
         return None
     
     if not user.is_active or user.status != UserStatus.ACTIVE:
         return None
     
+    # 旧算法或低成本的哈希随登录升级
+    if new_hash:
+        user.hashed_password = new_hash
+    
     # 更新登录信息
     user.last_login_at = datetime.utcnow()
     user.login_count += 1
     await db.commit()
+    await user_cache.invalidate(user.id)
     
     return user
 
@@ -119,6 +128,7 @@ async def update_user(db: AsyncSession, user_id: int, user_data: UserUpdate) ->
     
     await db.commit()
     await db.refresh(user)
+    await user_cache.invalidate(user.id)
     
     return user
 
@@ -130,12 +140,13 @@ async def update_user_password(db: AsyncSession, user_id: int, old_password: str
         raise ResourceNotFoundError("用户不存在")
     
     # 验证旧密码
-    if not verify_password(old_password, user.hashed_password):
+    if not await verify_password_async(old_password, user.hashed_password):
         raise AuthenticationError("当前密码错误")
     
     # 更新密码
-    user.hashed_password = get_password_hash(new_password)
+    user.hashed_password = await get_password_hash_async(new_password)
     await db.commit()
+    await user_cache.invalidate(user.id)
     
     return True
 
@@ -152,6 +163,7 @@ async def admin_update_user(db: AsyncSession, user_id: int, admin_data: UserAdmi
     
     await db.commit()
     await db.refresh(user)
+    await user_cache.invalidate(user.id)
     
     return user
 
@@ -166,6 +178,7 @@ async def delete_user(db: AsyncSession, user_id: int) -> bool:
     user.is_active = False
     user.status = UserStatus.INACTIVE
     await db.commit()
+    await user_cache.invalidate(user.id)
     
     return True
 
@@ -245,23 +258,15 @@ async def get_user_stats(db: AsyncSession) -> dict:
     )
     admin_users = admin_users.scalar()
     
-    # 今日新用户
-    today = datetime.now().date()
-    today_users = await db.execute(
-        select(func.count(User.id)).where(
-            func.date(User.created_at) == today
-        )
+    # 今日、本月新用户（读取注册事件的按天汇总，UTC）
+    now = datetime.utcnow()
+    analytics_service = AnalyticsService(db)
+    today_users, _ = await analytics_service.get_total(
+        METRIC_USER_SIGNUP, now.replace(hour=0, minute=0, second=0, microsecond=0), now + timedelta(days=1)
     )
-    today_users = today_users.scalar()
-    
-    # 本月新用户
-    this_month = datetime.now().replace(day=1).date()
-    month_users = await db.execute(
-        select(func.count(User.id)).where(
-            User.created_at >= this_month
-        )
+    month_users, _ = await analytics_service.get_total(
+        METRIC_USER_SIGNUP, now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), now + timedelta(days=1)
     )
-    month_users = month_users.scalar()
     
     return {
         "total_users": total_users,
@@ -289,6 +294,7 @@ async def update_user_vip_status(
     
     await db.commit()
     await db.refresh(user)
+    await user_cache.invalidate(user.id)
     
     return user
 
@@ -316,5 +322,7 @@ async def check_vip_expiration(db: AsyncSession) -> int:
     
     if count > 0:
         await db.commit()
+        for user in expired_users:
+            await user_cache.invalidate(user.id)
     
     return count
\ No newline at end of file
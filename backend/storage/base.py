@@ -0,0 +1,135 @@
+"""
+存储后端接口
+"""
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import AsyncIterator, Iterable, List, Optional
+
+from config import settings
+
+
+# 媒体文件对外URL前缀（由 api/v1/files.py 分发）
+MEDIA_URL_PREFIX = "/static/uploads/"
+
+
+@dataclass
+class StoredObject:
+    """存储对象元信息"""
+    key: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    content_type: Optional[str] = None
+
+
+class StorageBackend(ABC):
+    """
+    存储后端抽象
+
+    key 为相对路径（如 image/ab/cd/<hash>.jpg），与具体存储位置无关
+    """
+
+    # 远程存储无法由本服务直接发送文件，分发时重定向到预签名URL
+    is_remote = False
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> StoredObject:
+        """写入对象"""
+
+    @abstractmethod
+    async def put_file(self, key: str, local_path: str, content_type: Optional[str] = None) -> StoredObject:
+        """从本地文件写入对象，写入后本地文件由后端接管（移动或删除）"""
+
+    @abstractmethod
+    async def put_multipart(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: Optional[str] = None
+    ) -> StoredObject:
+        """分段写入大对象"""
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """读取整个对象"""
+
+    @abstractmethod
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """流式读取对象，end 为闭区间"""
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        """获取对象元信息，不存在时返回None"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> bool:
+        """删除对象"""
+
+    @abstractmethod
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        """批量删除对象，返回删除数量"""
+
+    @abstractmethod
+    def presign(self, key: str, expires_in: Optional[int] = None) -> str:
+        """生成带有效期的下载URL"""
+
+    async def exists(self, key: str) -> bool:
+        """对象是否存在"""
+        return await self.stat(key) is not None
+
+    def url(self, key: str) -> str:
+        """对象的对外URL"""
+        return f"{MEDIA_URL_PREFIX}{key}"
+
+    def local_path(self, key: str) -> Optional[str]:
+        """对象在本机上的文件路径（可零拷贝发送），非本地存储返回None"""
+        return None
+
+    async def close(self):
+        """释放后端资源"""
+
+
+def is_thumbnail_key(key: str) -> bool:
+    """是否为缩略图（文件名以 thumb_ 开头）"""
+    return key.rsplit("/", 1)[-1].startswith("thumb_")
+
+
+def normalize_key(path: Optional[str]) -> Optional[str]:
+    """
+    将存储路径规范为存储key
+
+    早期记录保存的是带 UPLOAD_DIR 前缀的本地路径，这里去掉前缀以兼容
+    """
+    if not path:
+        return path
+
+    key = path.replace(os.sep, "/")
+    upload_dir = settings.UPLOAD_DIR.replace(os.sep, "/").strip("/")
+    stripped = key.lstrip("./")
+    if stripped.startswith(upload_dir + "/"):
+        key = stripped[len(upload_dir) + 1:]
+    return key.lstrip("/")
+
+
+@lru_cache()
+def get_storage() -> StorageBackend:
+    """获取配置的存储后端实例（单例模式）"""
+    if settings.STORAGE_BACKEND == "s3":
+        from storage.s3 import S3Storage
+        return S3Storage(
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            bucket=settings.S3_BUCKET,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            region=settings.S3_REGION,
+            public_base_url=settings.S3_PUBLIC_BASE_URL,
+            part_size=settings.S3_MULTIPART_PART_SIZE,
+            public_thumbnails_only=settings.S3_PUBLIC_THUMBNAILS_ONLY
+        )
+
+    from storage.local import LocalDiskStorage
+    roots: List[str] = settings.STORAGE_LOCAL_ROOTS or [settings.UPLOAD_DIR]
+    return LocalDiskStorage(roots)
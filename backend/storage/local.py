@@ -0,0 +1,152 @@
+"""
+本地磁盘存储后端
+
+支持多个根目录（如挂载在不同磁盘上的目录），对象按 key 的哈希分片写入；
+读取时先查主分片，再依次查其他目录，因此增加目录后旧文件仍可访问。
+"""
+import os
+import zlib
+import shutil
+import asyncio
+import mimetypes
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional
+
+import aiofiles
+
+from storage.base import StorageBackend, StoredObject
+
+
+class LocalDiskStorage(StorageBackend):
+    """本地磁盘存储"""
+
+    def __init__(self, roots: List[str], chunk_size: int = 256 * 1024):
+        if not roots:
+            raise ValueError("至少需要一个存储目录")
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.chunk_size = chunk_size
+        for root in self.roots:
+            os.makedirs(root, exist_ok=True)
+
+    def _primary_root(self, key: str) -> str:
+        if len(self.roots) == 1:
+            return self.roots[0]
+        return self.roots[zlib.crc32(key.encode()) % len(self.roots)]
+
+    def _join(self, root: str, key: str) -> Optional[str]:
+        """拼接路径并防止越界"""
+        full_path = os.path.realpath(os.path.join(root, key))
+        if os.path.commonpath([root, full_path]) != root:
+            return None
+        return full_path
+
+    def _write_path(self, key: str) -> str:
+        full_path = self._join(self._primary_root(key), key)
+        if full_path is None:
+            raise ValueError(f"非法的存储key: {key}")
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        return full_path
+
+    def local_path(self, key: str) -> Optional[str]:
+        primary = self._primary_root(key)
+        for root in [primary] + [r for r in self.roots if r != primary]:
+            full_path = self._join(root, key)
+            if full_path and os.path.isfile(full_path):
+                return full_path
+        return None
+
+    def _stored_object(self, key: str, full_path: str) -> StoredObject:
+        file_stat = os.stat(full_path)
+        return StoredObject(
+            key=key,
+            size=file_stat.st_size,
+            last_modified=datetime.utcfromtimestamp(file_stat.st_mtime),
+            content_type=mimetypes.guess_type(full_path)[0]
+        )
+
+    async def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> StoredObject:
+        full_path = self._write_path(key)
+        temp_path = f"{full_path}.part"
+        async with aiofiles.open(temp_path, "wb") as f:
+            await f.write(data)
+        os.replace(temp_path, full_path)
+        return self._stored_object(key, full_path)
+
+    async def put_file(self, key: str, local_path: str, content_type: Optional[str] = None) -> StoredObject:
+        full_path = self._write_path(key)
+        try:
+            # 同一文件系统内直接重命名，避免复制
+            os.replace(local_path, full_path)
+        except OSError:
+            await asyncio.to_thread(shutil.move, local_path, full_path)
+        return self._stored_object(key, full_path)
+
+    async def put_multipart(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: Optional[str] = None
+    ) -> StoredObject:
+        full_path = self._write_path(key)
+        temp_path = f"{full_path}.part"
+        try:
+            async with aiofiles.open(temp_path, "wb") as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        os.replace(temp_path, full_path)
+        return self._stored_object(key, full_path)
+
+    async def get(self, key: str) -> bytes:
+        full_path = self.local_path(key)
+        if full_path is None:
+            raise FileNotFoundError(key)
+        async with aiofiles.open(full_path, "rb") as f:
+            return await f.read()
+
+    async def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        full_path = self.local_path(key)
+        if full_path is None:
+            raise FileNotFoundError(key)
+        async with aiofiles.open(full_path, "rb") as f:
+            await f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                chunk = await f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        full_path = self.local_path(key)
+        if full_path is None:
+            return None
+        return self._stored_object(key, full_path)
+
+    async def delete(self, key: str) -> bool:
+        full_path = self.local_path(key)
+        if full_path is None:
+            return True
+        try:
+            os.remove(full_path)
+            return True
+        except OSError as e:
+            print(f"删除文件失败: {e}")
+            return False
+
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        deleted_count = 0
+        for key in keys:
+            if await self.delete(key):
+                deleted_count += 1
+        return deleted_count
+
+    def presign(self, key: str, expires_in: Optional[int] = None) -> str:
+        from utils.signed_url import sign_media_url
+        return sign_media_url(self.url(key), expires_in)
@@ -0,0 +1,382 @@
+"""
+S3兼容存储后端（AWS S3 / MinIO 等）
+
+直接使用 httpx 调用 S3 REST API 并做 SigV4 签名，使用路径风格寻址，
+因此可以对接本地 MinIO 之类的兼容服务。
+"""
+import os
+import hmac
+import base64
+import hashlib
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+from xml.etree import ElementTree
+
+import aiofiles
+import httpx
+
+from storage.base import StorageBackend, StoredObject, is_thumbnail_key
+
+
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+# DeleteObjects 单次最多1000个key
+_DELETE_BATCH_SIZE = 1000
+# 除最后一段外，分段上传每段至少5MB
+_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def _strip_namespace(tag: str) -> str:
+    return tag.split("}", 1)[-1]
+
+
+def _find_text(root: ElementTree.Element, name: str) -> Optional[str]:
+    for element in root.iter():
+        if _strip_namespace(element.tag) == name:
+            return element.text
+    return None
+
+
+class S3Error(Exception):
+    """S3请求错误"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"S3请求失败 ({status_code}): {body[:200]}")
+        self.status_code = status_code
+
+
+class S3Storage(StorageBackend):
+    """S3兼容存储"""
+
+    is_remote = True
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        public_base_url: str = "",
+        part_size: int = 8 * 1024 * 1024,
+        public_thumbnails_only: bool = False
+    ):
+        if not endpoint_url or not bucket:
+            raise ValueError("S3存储需要配置 S3_ENDPOINT_URL 和 S3_BUCKET")
+        if public_base_url and not public_thumbnails_only:
+            # 付费原始文件与缩略图在同一个桶中，公共读策略必须只覆盖缩略图，否则付费内容可绕过签名直接下载
+            raise ValueError(
+                "配置 S3_PUBLIC_BASE_URL 前需将桶的公共读策略限制为缩略图（*/thumb_*），"
+                "并设置 S3_PUBLIC_THUMBNAILS_ONLY=true"
+            )
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.host = httpx.URL(self.endpoint_url).netloc.decode()
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.public_base_url = public_base_url.rstrip("/")
+        self.part_size = max(part_size, _MIN_PART_SIZE)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---------- SigV4 签名 ----------
+
+    def _canonical_uri(self, key: str = "") -> str:
+        path = f"/{self.bucket}"
+        if key:
+            path += "/" + _quote(key, safe="-_.~/")
+        return path
+
+    def _credential_scope(self, date_stamp: str) -> str:
+        return f"{date_stamp}/{self.region}/s3/aws4_request"
+
+    def _signing_key(self, date_stamp: str) -> bytes:
+        key = _hmac(f"AWS4{self.secret_key}".encode(), date_stamp)
+        key = _hmac(key, self.region)
+        key = _hmac(key, "s3")
+        return _hmac(key, "aws4_request")
+
+    def _signature(
+        self,
+        method: str,
+        canonical_uri: str,
+        query: Dict[str, str],
+        headers: Dict[str, str],
+        payload_hash: str,
+        amz_date: str
+    ) -> Tuple[str, str]:
+        """返回 (签名, SignedHeaders)"""
+        canonical_query = "&".join(
+            f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items())
+        )
+        lowered = {k.lower(): " ".join(str(v).split()) for k, v in headers.items()}
+        signed_headers = ";".join(sorted(lowered))
+        canonical_headers = "".join(f"{k}:{lowered[k]}\n" for k in sorted(lowered))
+
+        canonical_request = "\n".join([
+            method,
+            canonical_uri,
+            canonical_query,
+            canonical_headers,
+            signed_headers,
+            payload_hash
+        ])
+
+        date_stamp = amz_date[:8]
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            self._credential_scope(date_stamp),
+            _sha256_hex(canonical_request.encode())
+        ])
+        signature = hmac.new(
+            self._signing_key(date_stamp), string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+        return signature, signed_headers
+
+    async def _request(
+        self,
+        method: str,
+        key: str = "",
+        query: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        content: Optional[bytes] = None,
+        expected: Tuple[int, ...] = (200,)
+    ) -> httpx.Response:
+        query = query or {}
+        amz_date = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        payload_hash = _sha256_hex(content) if content is not None else UNSIGNED_PAYLOAD
+
+        request_headers = dict(headers or {})
+        request_headers.update({
+            "host": self.host,
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash,
+        })
+
+        canonical_uri = self._canonical_uri(key)
+        signature, signed_headers = self._signature(
+            method, canonical_uri, query, request_headers, payload_hash, amz_date
+        )
+        request_headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{self._credential_scope(amz_date[:8])}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+
+        url = self.endpoint_url + canonical_uri
+        if query:
+            url += "?" + "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items()))
+
+        response = await self.client.request(method, url, headers=request_headers, content=content)
+        if response.status_code not in expected:
+            raise S3Error(response.status_code, response.text)
+        return response
+
+    # ---------- 对象操作 ----------
+
+    def _stored_object(self, key: str, response: httpx.Response, size: Optional[int] = None) -> StoredObject:
+        last_modified = response.headers.get("last-modified")
+        return StoredObject(
+            key=key,
+            size=size if size is not None else int(response.headers.get("content-length", 0)),
+            etag=response.headers.get("etag"),
+            last_modified=parsedate_to_datetime(last_modified) if last_modified else None,
+            content_type=response.headers.get("content-type")
+        )
+
+    async def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> StoredObject:
+        headers = {"content-type": content_type} if content_type else {}
+        response = await self._request("PUT", key, headers=headers, content=data)
+        return self._stored_object(key, response, size=len(data))
+
+    async def put_file(self, key: str, local_path: str, content_type: Optional[str] = None) -> StoredObject:
+        try:
+            file_size = os.path.getsize(local_path)
+            if file_size <= self.part_size:
+                async with aiofiles.open(local_path, "rb") as f:
+                    data = await f.read()
+                return await self.put(key, data, content_type)
+
+            async def read_chunks():
+                async with aiofiles.open(local_path, "rb") as f:
+                    while True:
+                        chunk = await f.read(self.part_size)
+                        if not chunk:
+                            break
+                        yield chunk
+
+            return await self.put_multipart(key, read_chunks(), content_type)
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+    async def put_multipart(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: Optional[str] = None
+    ) -> StoredObject:
+        headers = {"content-type": content_type} if content_type else {}
+        response = await self._request("POST", key, query={"uploads": ""}, headers=headers, content=b"")
+        upload_id = _find_text(ElementTree.fromstring(response.content), "UploadId")
+        if not upload_id:
+            raise S3Error(response.status_code, "缺少UploadId")
+
+        parts: List[Tuple[int, str]] = []
+        total_size = 0
+        buffer = bytearray()
+
+        async def upload_part(data: bytes):
+            part_number = len(parts) + 1
+            part_response = await self._request(
+                "PUT", key,
+                query={"partNumber": str(part_number), "uploadId": upload_id},
+                content=data
+            )
+            parts.append((part_number, part_response.headers.get("etag", "")))
+
+        try:
+            # 攒够一段再上传，保证除最后一段外都不小于最小分段大小
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                total_size += len(chunk)
+                while len(buffer) >= self.part_size:
+                    await upload_part(bytes(buffer[:self.part_size]))
+                    del buffer[:self.part_size]
+            if buffer or not parts:
+                await upload_part(bytes(buffer))
+
+            body = "<CompleteMultipartUpload>" + "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in parts
+            ) + "</CompleteMultipartUpload>"
+            response = await self._request(
+                "POST", key, query={"uploadId": upload_id}, content=body.encode()
+            )
+        except Exception:
+            await self._request(
+                "DELETE", key, query={"uploadId": upload_id}, expected=(200, 204, 404)
+            )
+            raise
+
+        return StoredObject(
+            key=key,
+            size=total_size,
+            etag=_find_text(ElementTree.fromstring(response.content), "ETag"),
+            content_type=content_type
+        )
+
+    async def get(self, key: str) -> bytes:
+        try:
+            response = await self._request("GET", key)
+        except S3Error as e:
+            if e.status_code == 404:
+                raise FileNotFoundError(key)
+            raise
+        return response.content
+
+    async def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        url = self.presign(key)
+        headers = {}
+        if start or end is not None:
+            headers["range"] = f"bytes={start}-{'' if end is None else end}"
+        async with self.client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 404:
+                raise FileNotFoundError(key)
+            if response.status_code not in (200, 206):
+                raise S3Error(response.status_code, (await response.aread()).decode(errors="ignore"))
+            async for chunk in response.aiter_bytes():
+                yield chunk
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        response = await self._request("HEAD", key, expected=(200, 404))
+        if response.status_code == 404:
+            return None
+        return self._stored_object(key, response)
+
+    async def delete(self, key: str) -> bool:
+        await self._request("DELETE", key, expected=(200, 204, 404))
+        return True
+
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        keys = list(keys)
+        deleted_count = 0
+        for i in range(0, len(keys), _DELETE_BATCH_SIZE):
+            batch = keys[i:i + _DELETE_BATCH_SIZE]
+            objects = "".join(
+                f"<Object><Key>{_xml_escape(key)}</Key></Object>" for key in batch
+            )
+            body = f"<Delete><Quiet>true</Quiet>{objects}</Delete>".encode()
+            response = await self._request(
+                "POST",
+                query={"delete": ""},
+                headers={"content-md5": base64.b64encode(hashlib.md5(body).digest()).decode()},
+                content=body
+            )
+            # Quiet 模式下只返回失败的对象
+            errors = sum(
+                1 for element in ElementTree.fromstring(response.content).iter()
+                if _strip_namespace(element.tag) == "Error"
+            ) if response.content else 0
+            deleted_count += len(batch) - errors
+        return deleted_count
+
+    def presign(self, key: str, expires_in: Optional[int] = None) -> str:
+        from config import settings
+
+        amz_date = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{self._credential_scope(amz_date[:8])}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires_in or settings.MEDIA_URL_EXPIRE_SECONDS),
+            "X-Amz-SignedHeaders": "host",
+        }
+        canonical_uri = self._canonical_uri(key)
+        signature, _ = self._signature(
+            "GET", canonical_uri, query, {"host": self.host}, UNSIGNED_PAYLOAD, amz_date
+        )
+        query["X-Amz-Signature"] = signature
+        return self.endpoint_url + canonical_uri + "?" + "&".join(
+            f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items())
+        )
+
+    def url(self, key: str) -> str:
+        # 只有缩略图走公共CDN；原始文件（含付费内容）经由本服务校验签名后重定向到预签名地址
+        if self.public_base_url and is_thumbnail_key(key):
+            return f"{self.public_base_url}/{key}"
+        return super().url(key)
+
+
+def _xml_escape(value: str) -> str:
+    return (
+        value.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&apos;")
+    )
@@ -1,10 +1,12 @@
 """
 认证和授权工具函数
 """
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,10 +14,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from config import settings
 from database import get_db
 from models.user import User
-from utils.exceptions import AuthenticationError, AuthorizationError
-
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from utils.exceptions import AuthenticationError, AuthorizationError, ServiceUnavailableError
+from services.user_cache import user_cache
+from utils.password_hashing import (
+    pwd_context, get_context_options, load_context_options,
+    verify_password, verify_and_update_password, get_password_hash
+)
 
 # JWT Bearer认证
 security = HTTPBearer()
@@ -23,14 +27,97 @@ security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+class PasswordHashPool:
+    """
+    密码哈希执行池
+
+    bcrypt 单次计算需要上百毫秒，在事件循环中执行会阻塞同一进程的所有请求。
+    这里放到独立的有界执行池中：安装了 bcrypt 库时计算会释放GIL，可用线程池；
+    passlib 回退到 os_crypt 等不释放GIL的后端时需用进程池。
+    排队和执行中的任务数达到上限时直接返回503，避免登录洪峰拖垮其他接口。
+    """
+
+    def __init__(self, workers: int, max_pending: int, executor_type: str = "process"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor_type = executor_type
+        self._executor = None
+        self.pending = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_total = 0.0
+
+    def _get_executor(self):
+        # 首次使用时创建，导入本模块的脚本不会启动进程
+        if self._executor is None:
+            if self.executor_type == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            else:
+                # 子进程按当前生效的算法和成本初始化
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=load_context_options,
+                    initargs=(get_context_options(),)
+                )
+        return self._executor
+
+    async def run(self, func, *args):
+        """在执行池中执行哈希计算"""
+        if self.workers <= 0:
+            return func(*args)
+
+        if self.pending >= self.max_pending:
+            self.rejected_total += 1
+            raise ServiceUnavailableError("登录请求过多，请稍后再试")
+
+        self.pending += 1
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            self.completed_total += 1
+            self.wait_seconds_total += time.monotonic() - started
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度等运行指标"""
+        return {
+            "executor": self.executor_type if self.workers > 0 else "inline",
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+        }
+
+
+password_hash_pool = PasswordHashPool(
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_MAX_PENDING,
+    settings.PASSWORD_HASH_EXECUTOR
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在密码哈希执行池中验证密码"""
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    """在密码哈希执行池中验证密码，哈希需要升级时同时返回新哈希"""
+    return await password_hash_pool.run(verify_and_update_password, plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
-    """生成密码哈希"""
-    return pwd_context.hash(password)
+async def get_password_hash_async(password: str) -> str:
+    """在密码哈希执行池中生成密码哈希"""
+    return await password_hash_pool.run(get_password_hash, password)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -92,11 +179,14 @@ async def get_current_user(
         if user_id is None:
             raise AuthenticationError("令牌中缺少用户ID")
         
-        # 从数据库获取用户信息
-        from services.user_service import get_user_by_id
-        user = await get_user_by_id(db, int(user_id))
+        # 优先读取缓存，未命中再查询数据库
+        user, generation = await user_cache.get(int(user_id))
         if user is None:
-            raise AuthenticationError("用户不存在")
+            from services.user_service import get_user_by_id
+            user = await get_user_by_id(db, int(user_id))
+            if user is None:
+                raise AuthenticationError("用户不存在")
+            await user_cache.set(user, generation)
         
         if not user.is_active:
             raise AuthenticationError("用户已被禁用")
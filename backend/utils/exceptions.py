@@ -77,11 +77,24 @@ class DuplicateResourceError(CustomHTTPException):
 class RateLimitError(CustomHTTPException):
     """请求限流错误"""
     
-    def __init__(self, detail: str = "请求过于频繁，请稍后再试"):
+    def __init__(self, detail: str = "请求过于频繁，请稍后再试", retry_after: Optional[int] = None):
         super().__init__(
             status_code=429,
             detail=detail,
-            error_code="RATE_LIMIT_EXCEEDED"
+            error_code="RATE_LIMIT_EXCEEDED",
+            headers={"Retry-After": str(retry_after)} if retry_after is not None else None
+        )
+
+
+class ServiceUnavailableError(CustomHTTPException):
+    """服务繁忙错误（过载保护）"""
+    
+    def __init__(self, detail: str = "服务繁忙，请稍后再试", retry_after: int = 1):
+        super().__init__(
+            status_code=503,
+            detail=detail,
+            error_code="SERVICE_UNAVAILABLE",
+            headers={"Retry-After": str(retry_after)}
         )
 
 
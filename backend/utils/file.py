@@ -4,15 +4,40 @@
 import os
 import cv2
 import uuid
+import asyncio
+import hashlib
 import aiofiles
 import mimetypes
 from PIL import Image
 from pathlib import Path
 from fastapi import UploadFile
-from typing import Tuple, List
+from typing import Tuple, List, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
 
 from config import settings
+from storage.base import get_storage, normalize_key
 from utils.exceptions import FileUploadError
+from utils.metrics import observe_duration, THUMBNAIL_DURATION, UPLOAD_DURATION
+from utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# 上传文件流式读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 缩略图、图片尺寸读取等CPU密集操作的线程池（Pillow/OpenCV处理时会释放GIL）
+_media_executor = ThreadPoolExecutor(
+    max_workers=settings.MEDIA_WORKER_THREADS,
+    thread_name_prefix="media-worker"
+)
+
+
+async def run_in_media_worker(func: Callable, *args):
+    """在媒体处理线程池中执行阻塞函数，避免阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_media_executor, func, *args)
 
 
 def generate_filename(original_filename: str) -> str:
@@ -51,28 +76,71 @@ def validate_file_size(file: UploadFile) -> bool:
     return True
 
 
-def get_upload_path(file_type: str, user_id: int) -> str:
-    """获取上传路径"""
-    base_path = Path(settings.UPLOAD_DIR)
-    user_path = base_path / file_type / str(user_id)
-    user_path.mkdir(parents=True, exist_ok=True)
-    return str(user_path)
+def get_upload_key(file_type: str, content_hash: str, filename: str) -> str:
+    """
+    获取上传文件在存储后端中的key
+
+    按内容哈希前缀分目录（如 image/ab/cd/<hash>.jpg），避免单个目录下文件过多
+    """
+    levels = [content_hash[i * 2:i * 2 + 2] for i in range(settings.UPLOAD_FANOUT_LEVELS)]
+    return "/".join([file_type, *levels, filename])
+
+
+def is_sharded_key(key: str) -> bool:
+    """判断key是否已经是哈希分目录布局"""
+    parts = key.split("/")
+    if len(parts) != settings.UPLOAD_FANOUT_LEVELS + 2:
+        return False
+    
+    content_hash = Path(parts[-1]).stem.replace("thumb_", "", 1)
+    return get_upload_key(parts[0], content_hash, parts[-1]) == key
+
+
+def get_thumbnail_filename(file_type: str, filename: str) -> str:
+    """获取缩略图文件名（视频缩略图统一使用 .jpg 扩展名）"""
+    if file_type == "video":
+        return f"thumb_{Path(filename).stem}.jpg"
+    return f"thumb_{filename}"
+
+
+async def stream_uploaded_file(file: UploadFile, file_path: str) -> Tuple[str, int]:
+    """分块保存上传的文件，同时计算内容SHA-256，返回 (哈希, 大小)"""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, 'wb') as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise FileUploadError(f"文件大小超过限制 ({settings.MAX_FILE_SIZE / 1024 / 1024:.1f}MB)")
+                digest.update(chunk)
+                await f.write(chunk)
+    except Exception:
+        await delete_file(file_path)
+        raise
+    return digest.hexdigest(), size
 
 
 async def save_uploaded_file(file: UploadFile, file_path: str) -> bool:
     """保存上传的文件"""
     try:
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        await stream_uploaded_file(file, file_path)
         return True
     except Exception as e:
-        print(f"保存文件失败: {e}")
+        logger.warning("保存文件失败: %s", e)
         return False
 
 
 async def create_image_thumbnail(image_path: str, thumbnail_path: str, size: Tuple[int, int] = (300, 300)) -> bool:
     """创建图片缩略图"""
+    with observe_duration(THUMBNAIL_DURATION, "image"):
+        return await run_in_media_worker(_create_image_thumbnail, image_path, thumbnail_path, size)
+
+
+def _create_image_thumbnail(image_path: str, thumbnail_path: str, size: Tuple[int, int]) -> bool:
     try:
         with Image.open(image_path) as img:
             # 保持纵横比的缩略图
@@ -87,12 +155,17 @@ async def create_image_thumbnail(image_path: str, thumbnail_path: str, size: Tup
             img.save(thumbnail_path, "JPEG", quality=85, optimize=True)
         return True
     except Exception as e:
-        print(f"创建图片缩略图失败: {e}")
+        logger.warning("创建图片缩略图失败: %s", e)
         return False
 
 
 async def create_video_thumbnail(video_path: str, thumbnail_path: str, size: Tuple[int, int] = (300, 300)) -> bool:
     """创建视频缩略图（提取第一帧）"""
+    with observe_duration(THUMBNAIL_DURATION, "video"):
+        return await run_in_media_worker(_create_video_thumbnail, video_path, thumbnail_path, size)
+
+
+def _create_video_thumbnail(video_path: str, thumbnail_path: str, size: Tuple[int, int]) -> bool:
     try:
         # 打开视频文件
         video = cv2.VideoCapture(video_path)
@@ -102,7 +175,7 @@ async def create_video_thumbnail(video_path: str, thumbnail_path: str, size: Tup
         video.release()
         
         if not success or frame is None:
-            print(f"无法读取视频帧: {video_path}")
+            logger.warning("无法读取视频帧: %s", video_path)
             return False
         
         # 将 OpenCV 的 BGR 格式转换为 RGB
@@ -117,23 +190,24 @@ async def create_video_thumbnail(video_path: str, thumbnail_path: str, size: Tup
         # 保存为 JPEG
         img.save(thumbnail_path, "JPEG", quality=85, optimize=True)
         
-        print(f"视频缩略图创建成功: {thumbnail_path}")
+        logger.debug("视频缩略图创建成功: %s", thumbnail_path)
         return True
         
     except Exception as e:
-        print(f"创建视频缩略图失败: {e}")
+        logger.warning("创建视频缩略图失败: %s", e)
         import traceback
         traceback.print_exc()
         return False
 
 
-def get_file_info(file_path: str) -> dict:
+def get_file_info(file_path: str, mime_type: Optional[str] = None) -> dict:
     """获取文件信息"""
     if not os.path.exists(file_path):
         return {}
     
     stat = os.stat(file_path)
-    mime_type, _ = mimetypes.guess_type(file_path)
+    if not mime_type:
+        mime_type, _ = mimetypes.guess_type(file_path)
     
     info = {
         "size": stat.st_size,
@@ -162,16 +236,12 @@ async def delete_file(file_path: str) -> bool:
             os.remove(file_path)
         return True
     except Exception as e:
-        print(f"删除文件失败: {e}")
+        logger.warning("删除文件失败: %s", e)
         return False
 
 
-async def process_uploaded_file(
-    file: UploadFile,
-    user_id: int,
-    create_thumb: bool = True
-) -> dict:
-    """处理上传的文件"""
+async def stage_uploaded_file(file: UploadFile) -> dict:
+    """校验上传文件并流式写入临时文件，同时计算内容哈希"""
     # 验证文件类型
     is_valid, file_type_or_error = validate_file_type(file)
     if not is_valid:
@@ -181,70 +251,101 @@ async def process_uploaded_file(
     if not validate_file_size(file):
         raise FileUploadError(f"文件大小超过限制 ({settings.MAX_FILE_SIZE / 1024 / 1024:.1f}MB)")
     
-    file_type = file_type_or_error
+    temp_dir = Path(settings.UPLOAD_DIR) / ".tmp"
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    temp_path = str(temp_dir / uuid.uuid4().hex)
     
-    # 生成文件名和路径
-    filename = generate_filename(file.filename)
-    upload_path = get_upload_path(file_type, user_id)
-    file_path = os.path.join(upload_path, filename)
-    
-    # 保存文件
-    success = await save_uploaded_file(file, file_path)
-    if not success:
+    try:
+        content_hash, file_size = await stream_uploaded_file(file, temp_path)
+    except FileUploadError:
+        raise
+    except Exception:
         raise FileUploadError("文件保存失败")
     
+    return {
+        "temp_path": temp_path,
+        "content_hash": content_hash,
+        "file_size": file_size,
+        "file_type": file_type_or_error,
+        "original_filename": file.filename,
+        "content_type": file.content_type
+    }
+
+
+async def finalize_uploaded_file(staged: dict, create_thumb: bool = True) -> dict:
+    """生成缩略图并将暂存文件写入存储后端（以内容哈希命名）"""
+    with observe_duration(UPLOAD_DURATION, staged["file_type"]):
+        return await _finalize_uploaded_file(staged, create_thumb)
+
+
+async def _finalize_uploaded_file(staged: dict, create_thumb: bool) -> dict:
+    storage = get_storage()
+    file_type = staged["file_type"]
+    temp_path = staged["temp_path"]
+    
+    # 生成文件名和存储key
+    file_extension = Path(staged["original_filename"] or "").suffix.lower()
+    filename = f"{staged['content_hash']}{file_extension}"
+    file_key = get_upload_key(file_type, staged["content_hash"], filename)
+    
     # 获取文件信息
-    file_info = get_file_info(file_path)
+    file_info = await run_in_media_worker(get_file_info, temp_path, staged["content_type"])
     
-    # 创建缩略图
-    thumbnail_path = None
+    # 创建缩略图（在本地暂存文件上生成，再写入存储后端）
+    thumbnail_key = None
     if create_thumb:
-        thumbnail_filename = f"thumb_{filename}"
-        # 视频缩略图统一使用 .jpg 扩展名
-        if file_type == "video":
-            thumbnail_filename = f"thumb_{Path(filename).stem}.jpg"
-        thumbnail_path = os.path.join(upload_path, thumbnail_filename)
+        thumbnail_filename = get_thumbnail_filename(file_type, filename)
+        thumbnail_temp_path = f"{temp_path}_thumb"
         
+        success = False
         if file_type == "image":
             # 为图片创建缩略图
-            success = await create_image_thumbnail(file_path, thumbnail_path)
-            if not success:
-                thumbnail_path = None
+            success = await create_image_thumbnail(temp_path, thumbnail_temp_path)
         elif file_type == "video":
             # 为视频创建缩略图（提取第一帧）
-            success = await create_video_thumbnail(file_path, thumbnail_path)
-            if not success:
-                thumbnail_path = None
+            success = await create_video_thumbnail(temp_path, thumbnail_temp_path)
+        
+        if success:
+            thumbnail_key = get_upload_key(file_type, staged["content_hash"], thumbnail_filename)
+            await storage.put_file(thumbnail_key, thumbnail_temp_path, "image/jpeg")
+        else:
+            await delete_file(thumbnail_temp_path)
+    
+    await storage.put_file(file_key, temp_path, staged["content_type"])
     
     return {
         "filename": filename,
-        "original_filename": file.filename,
-        "file_path": file_path,
-        "thumbnail_path": thumbnail_path,
+        "original_filename": staged["original_filename"],
+        "file_path": file_key,
+        "thumbnail_path": thumbnail_key,
         "file_type": file_type,
-        "file_size": file_info.get("size", 0),
-        "mime_type": file_info.get("mime_type", file.content_type),
+        "file_size": file_info.get("size", staged["file_size"]),
+        "mime_type": file_info.get("mime_type") or staged["content_type"],
         "width": file_info.get("width"),
-        "height": file_info.get("height")
+        "height": file_info.get("height"),
+        "content_hash": staged["content_hash"]
     }
 
 
+async def process_uploaded_file(
+    file: UploadFile,
+    user_id: int,
+    create_thumb: bool = True
+) -> dict:
+    """处理上传的文件"""
+    staged = await stage_uploaded_file(file)
+    return await finalize_uploaded_file(staged, create_thumb)
+
+
 def get_file_url(file_path: str) -> str:
     """获取文件的URL路径"""
     if not file_path:
-        print(f"[get_file_url] 警告: file_path 为空")
+        logger.debug("get_file_url: file_path 为空")
         return None
     
-    # 移除uploads目录前的路径部分
-    relative_path = file_path.replace(settings.UPLOAD_DIR, "").lstrip("/\\")
-    url = f"/static/uploads/{relative_path.replace(os.sep, '/')}"
-    
-    print(f"[get_file_url] 转换:")
-    print(f"  file_path: {file_path}")
-    print(f"  UPLOAD_DIR: {settings.UPLOAD_DIR}")
-    print(f"  relative_path: {relative_path}")
-    print(f"  最终URL: {url}")
-    
+    key = normalize_key(file_path)
+    url = get_storage().url(key)
+    logger.debug("get_file_url: file_path=%s, storage_key=%s, url=%s", file_path, key, url)
     return url
 
 
@@ -260,7 +361,7 @@ def clean_empty_directories(directory: str):
                 except OSError:
                     pass
     except Exception as e:
-        print(f"清理空目录失败: {e}")
+        logger.warning("清理空目录失败: %s", e)
 
 
 async def batch_delete_files(file_paths: List[str]) -> int:
@@ -0,0 +1,257 @@
+"""
+媒体文件分发工具：Range 请求、强 ETag 与条件 GET
+"""
+import os
+import re
+import asyncio
+import hashlib
+import mimetypes
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+import aiofiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from config import settings
+
+
+# 文件名为32位十六进制（uuid4 / 内容哈希）的原始文件和缩略图都不会被原地改写
+_IMMUTABLE_NAME_RE = re.compile(r"^(thumb_)?[0-9a-f]{32,64}(\.[A-Za-z0-9]+)?$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _ETagCache:
+    """内容哈希缓存：(路径, 大小, 修改时间) -> ETag，避免重复读取整个文件"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+    def get(self, key: Tuple[str, int, int]) -> Optional[str]:
+        etag = self._entries.get(key)
+        if etag is not None:
+            self._entries.move_to_end(key)
+        return etag
+
+    def set(self, key: Tuple[str, int, int], etag: str):
+        self._entries[key] = etag
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_etag_cache = _ETagCache()
+
+
+def _hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def get_strong_etag(file_path: str, file_stat: os.stat_result) -> str:
+    """获取基于内容哈希的强ETag（结果按 大小+修改时间 缓存）"""
+    key = (file_path, file_stat.st_size, file_stat.st_mtime_ns)
+    etag = _etag_cache.get(key)
+    if etag is None:
+        content_hash = await asyncio.to_thread(_hash_file, file_path)
+        etag = f'"{content_hash[:32]}"'
+        _etag_cache.set(key, etag)
+    return etag
+
+
+def is_immutable_file(file_path: str) -> bool:
+    """判断文件是否为不可变的派生文件（缩略图、哈希命名文件）"""
+    return bool(_IMMUTABLE_NAME_RE.match(os.path.basename(file_path)))
+
+
+def get_cache_control(file_path: str, private: bool = False) -> str:
+    """根据文件类型生成 Cache-Control"""
+    if private:
+        # 签名URL访问的付费内容只允许浏览器缓存，不允许共享缓存
+        return f"private, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+    if is_immutable_file(file_path):
+        return f"public, max-age={settings.MEDIA_IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+
+
+def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range 请求头，返回闭区间 (start, end)
+
+    不支持的格式（多段 Range 等）返回 None，由调用方退回完整响应；
+    范围无法满足时抛出 ValueError。
+    """
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        return None
+
+    start_str, end_str = match.groups()
+    if not start_str and not end_str:
+        return None
+
+    if not start_str:
+        # 后缀范围：bytes=-500 表示最后500字节
+        suffix_length = int(end_str)
+        if suffix_length == 0:
+            raise ValueError("无法满足的范围")
+        start = max(file_size - suffix_length, 0)
+        end = file_size - 1
+    else:
+        start = int(start_str)
+        end = int(end_str) if end_str else file_size - 1
+        end = min(end, file_size - 1)
+
+    if start >= file_size or start > end:
+        raise ValueError("无法满足的范围")
+
+    return start, end
+
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    """判断 If-None-Match / If-Range 是否命中当前ETag"""
+    if header_value.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header_value.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def is_not_modified(request_headers: Headers, etag: str, last_modified: float) -> bool:
+    """条件GET判断：If-None-Match 优先于 If-Modified-Since"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= int(since)
+
+    return False
+
+
+class MediaFileResponse(Response):
+    """
+    支持 Range / 条件GET 的文件响应
+
+    服务器提供 zerocopysend 扩展时使用 sendfile 零拷贝发送，
+    完整文件时优先使用 pathsend 扩展，否则分块流式读取。
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        file_stat: os.stat_result,
+        request_headers: Headers,
+        etag: str,
+        method: str = "GET",
+        media_type: Optional[str] = None,
+        private: bool = False,
+    ):
+        self.file_path = file_path
+        self.file_size = file_stat.st_size
+        self.send_body = method != "HEAD"
+        self.background = None
+        self.body = b""
+        self.media_type = media_type or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+        last_modified = file_stat.st_mtime
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(last_modified, usegmt=True),
+            "cache-control": get_cache_control(file_path, private),
+        }
+
+        self.range: Optional[Tuple[int, int]] = None
+        if is_not_modified(request_headers, etag, last_modified):
+            self.status_code = 304
+            self.send_body = False
+        else:
+            self.status_code = 200
+            range_header = request_headers.get("range")
+            if_range = request_headers.get("if-range")
+            # If-Range 与当前ETag不一致时忽略Range，返回完整内容
+            if range_header and (if_range is None or _etag_matches(if_range, etag)):
+                try:
+                    self.range = parse_range_header(range_header, self.file_size)
+                except ValueError:
+                    self.status_code = 416
+                    self.send_body = False
+                    headers["content-range"] = f"bytes */{self.file_size}"
+
+            if self.range is not None:
+                start, end = self.range
+                self.status_code = 206
+                headers["content-range"] = f"bytes {start}-{end}/{self.file_size}"
+                headers["content-length"] = str(end - start + 1)
+            elif self.status_code == 200:
+                headers["content-length"] = str(self.file_size)
+            else:
+                headers["content-length"] = "0"
+
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        start, end = self.range if self.range is not None else (0, self.file_size - 1)
+        count = end - start + 1
+        if count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+
+        if "http.response.zerocopysend" in extensions:
+            with open(self.file_path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": start,
+                    "count": count,
+                    "more_body": False,
+                })
+            return
+
+        if self.range is None and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.file_path)})
+            return
+
+        chunk_size = settings.MEDIA_STREAM_CHUNK_SIZE
+        async with aiofiles.open(self.file_path, "rb") as f:
+            await f.seek(start)
+            remaining = count
+            while remaining > 0:
+                chunk = await f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+            if remaining > 0:
+                # 文件在发送过程中被截断，结束响应体
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,161 @@
+"""
+日志工具
+
+业务模块通过 get_logger(__name__) 获取日志记录器，消息使用 % 占位符延迟格式化：
+    logger = get_logger(__name__)
+    logger.debug("查询到 %d 条数据", len(items))
+级别未开启时参数不会被格式化；需要额外计算（如遍历列表）的调试输出用
+`if logger.isEnabledFor(logging.DEBUG):` 包裹，关闭时只有一次缓存的级别判断。
+
+LOG_LEVEL 支持按模块设置级别，如 "INFO,services.media_service=DEBUG,utils.file=WARNING"。
+
+日志记录先放入有界内存队列，由后台线程（QueueListener）格式化为JSON行并写入 LOG_FILE（按大小轮转），
+请求处理过程中不做磁盘IO；队列满时直接丢弃并计数，不阻塞事件循环。
+LOG_FILE 为空时写到标准输出。
+"""
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Tuple
+
+from config import settings
+
+
+# 访问日志
+access_logger = logging.getLogger("access")
+access_logger.propagate = False
+
+
+def parse_log_levels(spec: str) -> Tuple[int, Dict[str, int]]:
+    """解析 LOG_LEVEL，返回 (默认级别, {模块名: 级别})"""
+    default_level = logging.INFO
+    module_levels: Dict[str, int] = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, level = part.rpartition("=")
+        level_value = logging.getLevelName(level.strip().upper())
+        if not isinstance(level_value, int):
+            raise ValueError(f"无效的日志级别: {part}")
+        if name:
+            module_levels[name.strip()] = level_value
+        else:
+            default_level = level_value
+    return default_level, module_levels
+
+
+def configure_log_levels(spec: Optional[str] = None):
+    """按 LOG_LEVEL 设置根记录器和各模块记录器的级别"""
+    default_level, module_levels = parse_log_levels(spec if spec is not None else settings.LOG_LEVEL)
+    logging.getLogger().setLevel(default_level)
+    for name, level in module_levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取模块日志记录器，name 传 __name__"""
+    return logging.getLogger(name)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条记录输出一行JSON，结构化字段取自 extra={"fields": {...}}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃记录而不是阻塞或报错"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 格式化留给后台线程，这里只处理异常信息（traceback 对象不能跨线程保留）
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """队列 + 后台写入线程"""
+
+    def __init__(self):
+        self.handler: Optional[DroppingQueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+
+    def _create_output_handler(self) -> logging.Handler:
+        if settings.LOG_FILE:
+            directory = os.path.dirname(settings.LOG_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(
+                settings.LOG_FILE,
+                maxBytes=settings.LOG_MAX_BYTES,
+                backupCount=settings.LOG_BACKUP_COUNT,
+                encoding="utf-8"
+            )
+        else:
+            handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonLinesFormatter())
+        return handler
+
+    def start(self):
+        """启动后台写入线程并挂载到各日志记录器"""
+        if self._listener is not None:
+            return
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+        self._listener = QueueListener(self.handler.queue, self._create_output_handler())
+        self._listener.start()
+
+        access_logger.addHandler(self.handler)
+        access_logger.setLevel(logging.INFO)
+        logging.getLogger().addHandler(self.handler)
+
+    def stop(self):
+        """卸载处理器并写完队列中剩余的记录"""
+        if self._listener is None:
+            return
+        access_logger.removeHandler(self.handler)
+        logging.getLogger().removeHandler(self.handler)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+
+    def stats(self) -> dict:
+        if self.handler is None:
+            return {"queued": 0, "dropped": 0}
+        return {"queued": self.handler.queue.qsize(), "dropped": self.handler.dropped}
+
+
+log_pipeline = LogPipeline()
+
+
+configure_log_levels()
@@ -0,0 +1,124 @@
+"""
+Prometheus 指标
+
+多进程部署时设置 PROMETHEUS_MULTIPROC_DIR：各worker把指标写入该目录下的文件，
+/metrics 用 MultiProcessCollector 汇总所有进程。目录需由启动脚本在启动worker前清空，
+worker退出时调用 mark_process_dead() 清理其在线连接数等实时指标。
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from config import settings
+
+# prometheus_client 在导入时决定是否使用多进程模式，必须先设置环境变量
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(settings.PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+from sqlalchemy import event
+
+
+# 数据库查询耗时分桶（秒）
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# 上传和缩略图耗时分桶（秒）
+FILE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP请求耗时", ["method", "route", "status"]
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL语句耗时", ["operation"], buckets=DB_BUCKETS
+)
+WS_CONNECTIONS = Gauge(
+    "ws_connections", "聊天房间的在线WebSocket连接数", ["room"], multiprocess_mode="livesum"
+)
+WS_BROADCAST_DURATION = Histogram(
+    "ws_broadcast_duration_seconds", "房间广播耗时", buckets=DB_BUCKETS
+)
+WS_BROADCAST_RECIPIENTS = Histogram(
+    "ws_broadcast_recipients", "单次广播的接收连接数", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+UPLOAD_DURATION = Histogram(
+    "upload_duration_seconds", "上传文件入库耗时（缩略图和写入存储）", ["file_type"], buckets=FILE_BUCKETS
+)
+THUMBNAIL_DURATION = Histogram(
+    "thumbnail_duration_seconds", "缩略图生成耗时", ["file_type"], buckets=FILE_BUCKETS
+)
+DB_WRITE_BATCH_SIZE = Histogram(
+    "db_write_batch_size", "写入协调器每次组提交包含的作业数", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "缓存读取次数，按命中结果区分", ["cache", "result"]
+)
+
+
+def http_route_label(scope) -> str:
+    """请求匹配到的路由模板，未匹配的请求归为一类，避免标签基数随URL增长"""
+    # 新版 FastAPI 保留子路由结构，scope["route"] 的路径不含 include_router 的前缀
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path_format", None) or getattr(scope.get("route"), "path", None)
+    return path if path else "unmatched"
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def observe_duration(histogram, *labels):
+    """统计代码块耗时"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        target = histogram.labels(*labels) if labels else histogram
+        target.observe(time.perf_counter() - started)
+
+
+def _query_operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return keyword if keyword in ("select", "insert", "update", "delete") else "other"
+
+
+def instrument_engine(engine):
+    """通过引擎事件统计每条SQL的耗时（查询次数即直方图的 _count）"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_query_start"].pop()
+        DB_QUERY_DURATION.labels(_query_operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(context):
+        # 出错的语句不会触发 after_cursor_execute，丢弃其开始时间
+        conn = context.connection
+        if conn is not None and conn.info.get("metrics_query_start"):
+            conn.info["metrics_query_start"].pop()
+
+
+def render_metrics() -> bytes:
+    """生成 /metrics 的响应内容"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead():
+    """worker退出时清理本进程的实时指标文件"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
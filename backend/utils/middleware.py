@@ -1,50 +1,354 @@
 """
 自定义中间件
 """
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
+import math
+import random
 import time
-import redis.asyncio as redis
-from typing import Callable
-import asyncio
-from collections import defaultdict
+from typing import Optional
+from collections import OrderedDict
 
 from config import settings
+from database import RedisBackoff
+from utils.auth import verify_token
 from utils.exceptions import RateLimitError
+from utils.logger import access_logger, get_logger
+from utils.metrics import HTTP_REQUEST_DURATION, http_route_label
+from utils.sql_profiler import profile_queries, recent_profiles
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """请求日志中间件"""
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
-        
-        # 记录请求信息
-        client_ip = request.client.host
-        if "x-forwarded-for" in request.headers:
-            client_ip = request.headers["x-forwarded-for"].split(",")[0].strip()
-        
-        response = await call_next(request)
-        
-        # 计算处理时间
-        process_time = time.time() - start_time
-        
-        # 记录日志
-        log_data = {
-            "method": request.method,
-            "url": str(request.url),
-            "client_ip": client_ip,
-            "status_code": response.status_code,
-            "process_time": round(process_time, 4),
-            "user_agent": request.headers.get("user-agent", ""),
-            "timestamp": int(time.time())
-        }
-        
-        # 这里可以发送到日志系统或数据库
-        print(f"Request: {log_data}")
-        
-        # 添加处理时间到响应头
-        response.headers["X-Process-Time"] = str(process_time)
-        
-        return response
\ No newline at end of file
+logger = get_logger(__name__)
+
+
+def get_client_ip(scope) -> str:
+    """客户端IP，RATE_LIMIT_TRUST_PROXY 开启时取 X-Forwarded-For 中的第一个地址"""
+    if settings.RATE_LIMIT_TRUST_PROXY:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AccessLogMiddleware:
+    """
+    访问日志中间件（纯ASGI，不缓冲响应体，流式响应不受影响）
+
+    按 ACCESS_LOG_SAMPLE_RATE 抽样记录，错误响应和慢请求总是记录；
+    记录经 utils.logger 的队列由后台线程写入，不阻塞响应
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ACCESS_LOG_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+        body_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # 添加处理时间到响应头
+                process_time = time.perf_counter() - start_time
+                headers = list(message.get("headers", []))
+                headers.append((b"x-process-time", f"{process_time:.4f}".encode()))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            if (
+                status_code >= 400
+                or duration_ms >= settings.ACCESS_LOG_SLOW_MS
+                or random.random() < settings.ACCESS_LOG_SAMPLE_RATE
+            ):
+                user_agent = ""
+                for name, value in scope.get("headers", ()):
+                    if name == b"user-agent":
+                        user_agent = value.decode("latin-1")
+                        break
+                access_logger.info("access", extra={"fields": {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "status_code": status_code,
+                    "duration_ms": round(duration_ms, 2),
+                    "bytes": body_size,
+                    "client_ip": get_client_ip(scope),
+                    "user_agent": user_agent,
+                }})
+
+
+class MetricsMiddleware:
+    """请求耗时指标中间件（纯ASGI），按方法、路由模板和状态码统计"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 路由匹配后 scope 中才有 route
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], http_route_label(scope), str(status_code)
+            ).observe(time.perf_counter() - start_time)
+
+
+class SqlProfilerMiddleware:
+    """
+    SQL分析中间件（开发用，SQL_PROFILER_ENABLED 开启时注册）
+
+    记录每个请求执行的SQL，在响应头返回 X-DB-Queries / X-DB-Time（毫秒，统计到响应头发出时），
+    请求结束后把完整结果放入最近记录，重复执行的语句形状记为 N+1 候选并输出警告
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        with profile_queries() as profile:
+            async def send_wrapper(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(profile.count).encode()))
+                    headers.append((b"x-db-time", f"{profile.total_time * 1000:.2f}".encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                summary = profile.summary()
+                summary.update({
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status_code": status_code,
+                    "at": time.time(),
+                })
+                recent_profiles.append(summary)
+                for candidate in summary["n_plus_one"]:
+                    logger.warning(
+                        "疑似N+1查询: %s %s 执行 %d 次: %s",
+                        scope["method"], scope["path"], candidate["count"], candidate["shape"]
+                    )
+
+# GCRA 限流脚本：KEYS 为各策略的计数键，ARGV 依次为每个键的 (请求数, 窗口毫秒)
+# 所有策略都放行时才记录本次请求；返回0表示放行，否则返回需要等待的毫秒数
+RATE_LIMIT_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local tats = {}
+local retry = 0
+for i = 1, #KEYS do
+    local limit = tonumber(ARGV[2 * i - 1])
+    local window = tonumber(ARGV[2 * i])
+    local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+    if tat < now then
+        tat = now
+    end
+    local new_tat = tat + window / limit
+    local wait = new_tat - window - now
+    if wait > retry then
+        retry = wait
+    end
+    tats[i] = new_tat
+end
+if retry > 0 then
+    return math.ceil(retry)
+end
+for i = 1, #KEYS do
+    redis.call('SET', KEYS[i], string.format('%.3f', tats[i]), 'PX', math.ceil(tats[i] - now))
+end
+return 0
+"""
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit:"
+
+# 进程内令牌桶最多保留的键数
+LOCAL_BUCKET_MAX_KEYS = 100000
+
+
+class RateLimitPolicy:
+    """
+    限流策略
+
+    paths 为路径前缀，methods 为空表示所有方法；
+    key_by 为 "ip" 时按客户端IP计数，为 "user" 时已登录按用户、未登录按IP计数
+    """
+
+    def __init__(self, name: str, limit: int, window: int, paths=("/",), methods=(), key_by: str = "user"):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.paths = tuple(paths)
+        self.methods = tuple(methods)
+        self.key_by = key_by
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods and method not in self.methods:
+            return False
+        return any(path.startswith(prefix) for prefix in self.paths)
+
+
+def default_rate_limit_policies():
+    """默认策略：登录注册按IP严格限制，上传按用户限制，其余API按用户/IP整体限制"""
+    return [
+        RateLimitPolicy(
+            "auth", settings.RATE_LIMIT_AUTH_REQUESTS, settings.RATE_LIMIT_AUTH_WINDOW,
+            paths=("/api/v1/auth/login", "/api/v1/auth/register", "/api/v1/auth/change-password"),
+            methods=("POST",), key_by="ip"
+        ),
+        RateLimitPolicy(
+            "upload", settings.RATE_LIMIT_UPLOAD_REQUESTS, settings.RATE_LIMIT_UPLOAD_WINDOW,
+            paths=("/api/v1/media/upload",), methods=("POST",)
+        ),
+        RateLimitPolicy(
+            "api", settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW,
+            paths=("/api/",)
+        ),
+    ]
+
+
+class LocalTokenBuckets:
+    """进程内令牌桶，Redis不可用时使用（限额按进程计算）"""
+
+    def __init__(self, max_keys: int = LOCAL_BUCKET_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def acquire(self, checks) -> float:
+        """checks 为 [(键, 请求数, 窗口秒)]，全部有令牌时各扣一个并返回0，否则返回需等待的秒数"""
+        now = time.monotonic()
+        states = []
+        retry = 0.0
+        for key, limit, window in checks:
+            rate = limit / window
+            tokens, updated_at = self._buckets.get(key, (float(limit), now))
+            tokens = min(float(limit), tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                retry = max(retry, (1 - tokens) / rate)
+            states.append((key, tokens))
+
+        if retry > 0:
+            return retry
+
+        for key, tokens in states:
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0
+
+
+class RateLimitMiddleware:
+    """
+    限流中间件（纯ASGI）
+
+    在路由和数据库之前按策略计数：Redis可用时用 GCRA 脚本在所有进程间共享限额，
+    Redis不可用时退回进程内令牌桶。超限返回429和 Retry-After。
+    """
+
+    def __init__(self, app, policies=None):
+        self.app = app
+        self.policies = policies if policies is not None else default_rate_limit_policies()
+        self._local = LocalTokenBuckets()
+        self._redis = RedisBackoff("限流", "暂时使用进程内令牌桶")
+
+    def _redis_script(self):
+        client = self._redis.client()
+        if client is None:
+            return None
+        return self._redis.script(client, RATE_LIMIT_SCRIPT)
+
+    @staticmethod
+    def _user_id(scope) -> Optional[str]:
+        """从Bearer令牌取用户ID，只校验签名，不查询数据库"""
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token:
+                    return None
+                try:
+                    return str(verify_token(token, "access").get("sub") or "") or None
+                except Exception:
+                    return None
+        return None
+
+    async def _retry_after(self, checks) -> float:
+        """返回需要等待的秒数，0 表示放行"""
+        script = self._redis_script()
+        if script is not None:
+            keys = [RATE_LIMIT_KEY_PREFIX + key for key, _, _ in checks]
+            args = []
+            for _, limit, window in checks:
+                args.extend((limit, window * 1000))
+            try:
+                return int(await script(keys=keys, args=args)) / 1000
+            except Exception as e:
+                self._redis.failed(e)
+        return self._local.acquire(checks)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        policies = [policy for policy in self.policies if policy.matches(method, path)]
+        if method == "OPTIONS" or not policies:
+            await self.app(scope, receive, send)
+            return
+
+        ip = get_client_ip(scope)
+        user_id = None
+        if any(policy.key_by == "user" for policy in policies):
+            user_id = self._user_id(scope)
+
+        checks = []
+        for policy in policies:
+            identity = f"u:{user_id}" if policy.key_by == "user" and user_id else f"ip:{ip}"
+            checks.append((f"{policy.name}:{identity}", policy.limit, policy.window))
+
+        retry_after = await self._retry_after(checks)
+        if retry_after <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        error = RateLimitError(retry_after=math.ceil(retry_after))
+        response = JSONResponse(
+            status_code=error.status_code,
+            content={"success": False, "message": error.detail, "error_code": error.error_code},
+            headers=error.headers
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,79 @@
+"""
+游标（keyset）分页工具
+
+游标中保存上一页最后一条记录的排序键，下一页用 WHERE 条件从该位置继续，
+查询代价与页码深度无关。排序键的最后一列必须唯一（通常为主键）。
+NULL 的比较规则与 SQLite 一致：升序时 NULL 排在最前，降序时排在最后。
+"""
+import json
+import base64
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, false, literal, cast, String, DateTime
+
+
+def encode_cursor(sort_key: str, values: Sequence[Any]) -> str:
+    """将排序方式和排序键编码为URL安全的游标"""
+    payload = {"s": sort_key, "v": list(values)}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str) -> Optional[List[Any]]:
+    """解析游标，格式错误或排序方式不一致时返回None"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload.get("s") != sort_key:
+            return None
+        values = payload["v"]
+        if not isinstance(values, list):
+            return None
+        return values
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+
+def cursor_columns(keys: Sequence[Tuple[Any, bool]]) -> list:
+    """
+    查询中附带的排序键列，用于生成下一页游标
+
+    时间列取数据库中存储的原始文本：服务端默认值（CURRENT_TIMESTAMP）不带微秒，
+    按 DateTime 类型回写时会带上微秒，导致相等比较失败
+    """
+    return [
+        (cast(column, String) if isinstance(column.type, DateTime) else column).label(f"sort_key_{i}")
+        for i, (column, _) in enumerate(keys)
+    ]
+
+
+def _strictly_after(column, value, descending: bool):
+    if descending:
+        if value is None:
+            return false()
+        return or_(column < literal(value), column.is_(None))
+    if value is None:
+        return column.isnot(None)
+    return column > literal(value)
+
+
+def _equal(column, value):
+    if value is None:
+        return column.is_(None)
+    return column == literal(value)
+
+
+def build_keyset_condition(keys: Sequence[Tuple[Any, bool]], values: Sequence[Any]):
+    """
+    构造“位于游标之后”的条件
+
+    keys 为 [(列, 是否降序), ...]，与 ORDER BY 一致；values 为游标中的排序键
+    """
+    column, descending = keys[-1]
+    condition = _strictly_after(column, values[-1], descending)
+    for (column, descending), value in reversed(list(zip(keys[:-1], values[:-1]))):
+        condition = or_(
+            _strictly_after(column, value, descending),
+            and_(_equal(column, value), condition)
+        )
+    return condition
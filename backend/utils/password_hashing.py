@@ -0,0 +1,160 @@
+"""
+密码哈希算法与成本参数
+
+支持 bcrypt 和 argon2id（需要安装 argon2-cffi）。成本参数（bcrypt 的 rounds、argon2 的 time_cost）
+可以固定配置，也可以在启动时按 PASSWORD_HASH_TARGET_MS 延迟预算自动校准。
+旧算法或成本低于当前设置的哈希在用户登录成功时自动重新计算（passlib 的 needs_update）。
+"""
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+from passlib.hash import argon2 as argon2_hash
+
+from config import settings
+
+
+SCHEME_BCRYPT = "bcrypt"
+SCHEME_ARGON2 = "argon2"
+
+# 各算法允许的成本范围，下限是安全底线，预算不足时也不会低于它
+COST_LIMITS = {
+    SCHEME_BCRYPT: (10, 16),
+    SCHEME_ARGON2: (2, 12),
+}
+
+# 未校准时使用的默认成本
+DEFAULT_COSTS = {
+    SCHEME_BCRYPT: 12,
+    SCHEME_ARGON2: 3,
+}
+
+# 校准时使用的样例密码
+CALIBRATION_PASSWORD = "calibration-password"
+
+
+def build_context_options(
+    scheme: str,
+    cost: int,
+    argon2_memory_kb: int = 65536,
+    argon2_parallelism: int = 2
+) -> Dict[str, Any]:
+    """
+    生成 CryptContext 配置
+
+    新哈希使用 scheme 和 cost；其他算法标记为过时，
+    成本低于 cost 的同算法哈希同样需要更新
+    """
+    options: Dict[str, Any] = {
+        "schemes": [scheme] + [other for other in (SCHEME_BCRYPT, SCHEME_ARGON2) if other != scheme],
+        "default": scheme,
+        "deprecated": "auto",
+        # argon2 的 rounds 即 time_cost
+        f"{scheme}__rounds": cost,
+        f"{scheme}__min_rounds": cost,
+    }
+    if scheme == SCHEME_ARGON2:
+        options["argon2__type"] = "id"
+        options["argon2__memory_cost"] = argon2_memory_kb
+        options["argon2__parallelism"] = argon2_parallelism
+    return options
+
+
+def _resolve_scheme(scheme: str) -> str:
+    scheme = scheme.lower()
+    if scheme not in COST_LIMITS:
+        raise ValueError(f"不支持的密码哈希算法: {scheme}")
+    if scheme == SCHEME_ARGON2 and not argon2_hash.has_backend():
+        print("⚠️ 未安装 argon2-cffi，密码哈希改用 bcrypt")
+        return SCHEME_BCRYPT
+    return scheme
+
+
+# 当前生效的配置，进程池的子进程按它初始化
+_context_options = build_context_options(SCHEME_BCRYPT, DEFAULT_COSTS[SCHEME_BCRYPT])
+
+# 密码加密上下文，启动时由 configure_password_hashing() 按配置重新加载
+pwd_context = CryptContext(**_context_options)
+
+
+def load_context_options(options: Dict[str, Any]):
+    """按给定配置重新加载密码加密上下文"""
+    global _context_options
+    pwd_context.load(options)
+    _context_options = options
+
+
+def get_context_options() -> Dict[str, Any]:
+    return dict(_context_options)
+
+
+def measure_hash_ms(scheme: str, cost: int, argon2_memory_kb: int, argon2_parallelism: int) -> float:
+    """测量给定成本下单次哈希的耗时（毫秒）"""
+    context = CryptContext(**build_context_options(scheme, cost, argon2_memory_kb, argon2_parallelism))
+    started = time.perf_counter()
+    context.hash(CALIBRATION_PASSWORD)
+    return (time.perf_counter() - started) * 1000
+
+
+def calibrate_cost(scheme: str, target_ms: float, argon2_memory_kb: int, argon2_parallelism: int) -> Tuple[int, float]:
+    """
+    在延迟预算内选出最大的成本参数，返回 (成本, 预计耗时毫秒)
+
+    bcrypt 每加一轮耗时翻倍，argon2 耗时随 time_cost 线性增长，
+    先测量最低成本再按比例推算，最后实测一次确认
+    """
+    low, high = COST_LIMITS[scheme]
+    base_ms = min(measure_hash_ms(scheme, low, argon2_memory_kb, argon2_parallelism) for _ in range(2))
+
+    cost = low
+    while cost < high:
+        if scheme == SCHEME_BCRYPT:
+            estimate = base_ms * 2 ** (cost + 1 - low)
+        else:
+            estimate = base_ms * (cost + 1) / low
+        if estimate > target_ms:
+            break
+        cost += 1
+
+    elapsed = measure_hash_ms(scheme, cost, argon2_memory_kb, argon2_parallelism)
+    if elapsed > target_ms * 1.5 and cost > low:
+        cost -= 1
+        elapsed = measure_hash_ms(scheme, cost, argon2_memory_kb, argon2_parallelism)
+    return cost, elapsed
+
+
+def configure_password_hashing() -> Dict[str, Any]:
+    """按配置选择算法和成本并加载，返回生效的参数"""
+    scheme = _resolve_scheme(settings.PASSWORD_HASH_SCHEME)
+    memory_kb = settings.PASSWORD_HASH_ARGON2_MEMORY_KB
+    parallelism = settings.PASSWORD_HASH_ARGON2_PARALLELISM
+
+    elapsed: Optional[float] = None
+    if settings.PASSWORD_HASH_COST > 0:
+        low, high = COST_LIMITS[scheme]
+        cost = min(max(settings.PASSWORD_HASH_COST, low), high)
+    else:
+        cost, elapsed = calibrate_cost(scheme, settings.PASSWORD_HASH_TARGET_MS, memory_kb, parallelism)
+
+    load_context_options(build_context_options(scheme, cost, memory_kb, parallelism))
+
+    info = {"scheme": scheme, "cost": cost, "hash_ms": round(elapsed, 1) if elapsed is not None else None}
+    if elapsed is not None and cost == COST_LIMITS[scheme][0] and elapsed > settings.PASSWORD_HASH_TARGET_MS:
+        print(f"⚠️ 最低安全成本下密码哈希耗时 {elapsed:.0f}ms，超出预算 {settings.PASSWORD_HASH_TARGET_MS}ms")
+    print(f"✅ 密码哈希: {scheme}，成本 {cost}" + (f"，单次约 {elapsed:.0f}ms" if elapsed is not None else ""))
+    return info
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """验证密码"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码，哈希需要升级时同时返回新哈希"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    """生成密码哈希"""
+    return pwd_context.hash(password)
@@ -0,0 +1,66 @@
+"""
+SQL 查询预算 pytest 插件
+
+启用方式：pytest -p utils.pytest_query_budget，或在 conftest.py 中 pytest_plugins = ["utils.pytest_query_budget"]
+
+用法：
+    @pytest.mark.query_budget(5)
+    def test_media_list(client):
+        client.get("/api/v1/media/")
+
+    def test_chat_list(query_budget):
+        with query_budget(3):
+            ...
+
+测试（或代码块）执行的SQL超过预算时测试失败，失败信息列出执行的语句和N+1候选。
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from database import engine, reader_engine
+from utils.sql_profiler import QueryProfile, install_profiler, profile_queries
+
+
+def _budget_message(profile: QueryProfile, budget: int) -> str:
+    lines = [f"SQL查询数 {profile.count} 超出预算 {budget}，耗时 {profile.total_time * 1000:.1f}ms"]
+    for candidate in profile.repeated_shapes(threshold=2):
+        lines.append(f"  重复 {candidate['count']} 次: {candidate['shape']}")
+    lines.append("执行的语句:")
+    for index, (statement, duration) in enumerate(profile.statements, 1):
+        lines.append(f"  {index}. [{duration * 1000:.2f}ms] {' '.join(statement.split())}")
+    return "\n".join(lines)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "query_budget(max_queries): 测试执行的SQL语句数上限")
+    install_profiler(engine)
+    install_profiler(reader_engine)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_pyfunc_call(pyfuncitem):
+    marker = pyfuncitem.get_closest_marker("query_budget")
+    if marker is None:
+        yield
+        return
+
+    budget = marker.args[0] if marker.args else marker.kwargs["max_queries"]
+    with profile_queries(all_threads=True) as profile:
+        outcome = yield
+
+    if outcome.excinfo is None and profile.count > budget:
+        outcome.force_exception(pytest.fail.Exception(_budget_message(profile, budget), pytrace=False))
+
+
+@pytest.fixture
+def query_budget():
+    """返回上下文管理器，代码块内执行的SQL超过预算时测试失败"""
+    @contextmanager
+    def check(max_queries: int):
+        with profile_queries(all_threads=True) as profile:
+            yield profile
+        if profile.count > max_queries:
+            pytest.fail(_budget_message(profile, max_queries), pytrace=False)
+
+    return check
@@ -0,0 +1,168 @@
+"""
+付费媒体签名URL工具
+
+签名URL格式：/static/uploads/<路径>?expires=<时间戳>&signature=<HMAC>
+校验只做HMAC计算和时间比较，不访问数据库。
+"""
+import re
+import hmac
+import time
+import posixpath
+import asyncio
+import hashlib
+from typing import Optional, Set
+from urllib.parse import urlencode
+
+from config import settings
+from storage.base import MEDIA_URL_PREFIX
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+_CONTENT_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# 从SECRET_KEY派生独立的签名密钥，避免与JWT共用同一把密钥
+_signing_key = hmac.new(settings.SECRET_KEY.encode(), b"media-url-signing", hashlib.sha256).digest()
+
+
+def _compute_signature(path: str, expires: int) -> str:
+    message = f"{path}\n{expires}".encode()
+    return hmac.new(_signing_key, message, hashlib.sha256).hexdigest()
+
+
+def sign_media_url(file_url: str, expires_in: Optional[int] = None) -> str:
+    """为媒体URL生成带有效期的签名URL"""
+    if not file_url:
+        return file_url
+
+    expires = int(time.time()) + (expires_in or settings.MEDIA_URL_EXPIRE_SECONDS)
+    signature = _compute_signature(file_url, expires)
+    return f"{file_url}?{urlencode({'expires': expires, 'signature': signature})}"
+
+
+def verify_media_signature(path: str, expires: Optional[str], signature: Optional[str]) -> bool:
+    """校验签名URL（纯CPU计算，无数据库访问）"""
+    if not expires or not signature:
+        return False
+
+    try:
+        expires_at = int(expires)
+    except ValueError:
+        return False
+
+    if expires_at < time.time():
+        return False
+
+    return hmac.compare_digest(_compute_signature(path, expires_at), signature)
+
+
+def get_relative_media_path(file_url: Optional[str]) -> Optional[str]:
+    """将 /static/uploads/ 下的URL转换为相对路径"""
+    if not file_url or not file_url.startswith(MEDIA_URL_PREFIX):
+        return None
+    return file_url[len(MEDIA_URL_PREFIX):]
+
+
+def _free_media_count():
+    """分组内免费媒体的数量（is_paid 为空按免费处理）"""
+    from sqlalchemy import case, func
+    from models.media import Media
+
+    return func.sum(case((Media.is_paid == True, 0), else_=1))
+
+
+class ProtectedMediaRegistry:
+    """
+    付费媒体原始文件集合
+
+    按内容哈希记录（文件迁移到新目录后哈希不变，保护不会出现空窗），
+    早期没有内容哈希的文件按路径记录。启动时从数据库加载一次，
+    媒体上传/更新/删除时按该文件的全部引用重新判断，并定期刷新以覆盖其他工作进程的变更；
+    分发时只做集合查询。
+
+    去重后同一文件可能被多条媒体记录共享，只有引用它的媒体全部是付费媒体时才受保护：
+    有免费媒体引用同一份内容时，内容已可公开获取，要求签名只会让免费媒体无法访问。
+    """
+
+    def __init__(self):
+        self._paths: Set[str] = set()
+        self._hashes: Set[str] = set()
+
+    @staticmethod
+    def _content_hash(relative_path: str) -> Optional[str]:
+        stem = posixpath.splitext(posixpath.basename(relative_path))[0]
+        if _CONTENT_HASH_RE.match(stem):
+            return stem
+        return None
+
+    def is_protected(self, relative_path: str) -> bool:
+        if relative_path in self._paths:
+            return True
+        content_hash = self._content_hash(relative_path)
+        return content_hash is not None and content_hash in self._hashes
+
+    async def refresh_path(self, db, file_url: Optional[str]):
+        """按引用该文件的全部媒体记录重新判断是否受保护"""
+        from sqlalchemy import select, func
+        from models.media import Media
+
+        relative_path = get_relative_media_path(file_url)
+        if not relative_path:
+            return
+
+        content_hash = self._content_hash(relative_path)
+        condition = Media.content_hash == content_hash if content_hash else Media.file_url == file_url
+        result = await db.execute(select(func.count(Media.id), _free_media_count()).where(condition))
+        total, free = result.one()
+        protected = total > 0 and not free
+
+        if content_hash:
+            target = self._hashes
+            key = content_hash
+        else:
+            target = self._paths
+            key = relative_path
+        if protected:
+            target.add(key)
+        else:
+            target.discard(key)
+
+    async def load(self):
+        """从数据库加载只被付费媒体引用的文件"""
+        from sqlalchemy import select
+        from database import AsyncSessionLocal
+        from models.media import Media
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Media.content_hash)
+                .where(Media.content_hash.in_(select(Media.content_hash).where(Media.is_paid == True)))
+                .group_by(Media.content_hash)
+                .having(_free_media_count() == 0)
+            )
+            hashes = set(result.scalars().all())
+
+            result = await session.execute(
+                select(Media.file_url)
+                .where(Media.file_url.in_(select(Media.file_url).where(Media.is_paid == True)))
+                .group_by(Media.file_url)
+                .having(_free_media_count() == 0)
+            )
+            paths = {get_relative_media_path(url) for url in result.scalars().all()}
+
+        self._hashes = hashes
+        self._paths = {path for path in paths if path and not self._content_hash(path)}
+
+    async def refresh_periodically(self):
+        """后台定期刷新"""
+        while True:
+            await asyncio.sleep(settings.PROTECTED_MEDIA_REFRESH_SECONDS)
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("刷新付费媒体路径失败")
+
+
+# 全局付费媒体路径集合
+protected_media = ProtectedMediaRegistry()
@@ -0,0 +1,146 @@
+"""
+SQL 分析器（开发用）
+
+通过引擎事件记录当前上下文（一个请求或一个测试）执行的每条SQL及耗时。
+把参数、字面量和 IN 列表归一化后得到语句“形状”，同一形状重复执行多次的视为 N+1 候选。
+当前分析对象保存在 ContextVar 中，并发请求互不干扰；没有分析对象时事件回调只做一次判断。
+"""
+import re
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+from config import settings
+
+
+_current_profile: ContextVar[Optional["QueryProfile"]] = ContextVar("sql_profile", default=None)
+
+# 记录所有线程和任务的分析对象（测试中应用可能运行在其他线程，ContextVar 传不过去）
+_global_profiles: List["QueryProfile"] = []
+
+# 最近的请求分析结果，供调试接口查看
+recent_profiles: deque = deque(maxlen=settings.SQL_PROFILER_HISTORY)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_NAMED_PARAM_RE = re.compile(r"(?::\w+|%\(\w+\)s|\$\d+)")
+
+
+def statement_shape(statement: str) -> str:
+    """归一化SQL语句：参数、字面量替换为 ?，IN 列表折叠为 (?)"""
+    shape = _WHITESPACE_RE.sub(" ", statement).strip()
+    shape = _STRING_RE.sub("?", shape)
+    shape = _NAMED_PARAM_RE.sub("?", shape)
+    shape = _NUMBER_RE.sub("?", shape)
+    return _PARAM_LIST_RE.sub("(?)", shape)
+
+
+class QueryProfile:
+    """一个请求或测试中执行的SQL"""
+
+    def __init__(self):
+        self.statements: List[tuple] = []
+        self.total_time = 0.0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str, duration: float):
+        self.statements.append((statement, duration))
+        self.total_time += duration
+
+    def repeated_shapes(self, threshold: Optional[int] = None) -> List[Dict]:
+        """执行次数达到阈值的语句形状（N+1 候选），按次数降序"""
+        threshold = threshold or settings.SQL_PROFILER_REPEAT_THRESHOLD
+        counts = Counter(statement_shape(statement) for statement, _ in self.statements)
+        return [
+            {"shape": shape, "count": count}
+            for shape, count in counts.most_common()
+            if count >= threshold
+        ]
+
+    def summary(self) -> Dict:
+        return {
+            "queries": self.count,
+            "db_time_ms": round(self.total_time * 1000, 2),
+            "n_plus_one": self.repeated_shapes(),
+            "statements": [
+                {"sql": statement, "ms": round(duration * 1000, 3)}
+                for statement, duration in self.statements
+            ],
+        }
+
+
+@contextmanager
+def profile_queries(all_threads: bool = False):
+    """
+    在代码块内记录SQL，返回 QueryProfile
+
+    默认只记录当前上下文（当前请求）执行的SQL；
+    all_threads=True 时记录期间所有线程和任务执行的SQL
+    """
+    profile = QueryProfile()
+    if all_threads:
+        _global_profiles.append(profile)
+        try:
+            yield profile
+        finally:
+            _global_profiles.remove(profile)
+        return
+
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def current_profile() -> Optional[QueryProfile]:
+    return _current_profile.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None or _global_profiles:
+        conn.info.setdefault("profiler_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("profiler_query_start")
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, duration)
+    for global_profile in _global_profiles:
+        if global_profile is not profile:
+            global_profile.record(statement, duration)
+
+
+def _handle_error(context):
+    # 出错的语句不会触发 after_cursor_execute，丢弃其开始时间
+    conn = context.connection
+    if conn is not None and conn.info.get("profiler_query_start"):
+        conn.info["profiler_query_start"].pop()
+
+
+_LISTENERS = (
+    ("before_cursor_execute", _before_cursor_execute),
+    ("after_cursor_execute", _after_cursor_execute),
+    ("handle_error", _handle_error),
+)
+
+
+def install_profiler(engine):
+    """在引擎上注册事件，重复调用无副作用"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    for name, listener in _LISTENERS:
+        if not event.contains(sync_engine, name, listener):
+            event.listen(sync_engine, name, listener)
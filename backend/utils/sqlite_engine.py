@@ -0,0 +1,114 @@
+"""
+SQLite 引擎配置
+
+SQLite 同一时刻只允许一个写事务。这里把连接分为两个引擎：
+- 写引擎：连接池只有 SQLITE_WRITER_POOL_SIZE（默认1）个连接，进程内的写事务在连接池排队，
+  不会在文件锁上互相争抢；多进程之间靠 busy_timeout 等待
+- 读引擎：多个只读连接（query_only），WAL 模式下读不阻塞写、写也不阻塞读
+
+每个连接建立时设置 PRAGMA（WAL、synchronous=NORMAL、mmap、缓存、busy_timeout）。
+RoutingSession 按语句类型选择引擎：写语句和 flush 使用写连接，之后直到事务结束都固定使用写连接，
+保证同一事务内能读到自己未提交的修改；其余读语句使用读连接。
+非 SQLite 数据库只创建一个引擎，读写共用。
+"""
+from typing import Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Delete, Insert, Update
+from sqlalchemy.sql.elements import TextClause
+
+from config import settings
+
+
+WRITER_BIND_KEY = "use_writer"
+
+
+def is_sqlite_file(url: str) -> bool:
+    """是否为文件型 SQLite 数据库（内存数据库不能使用 WAL 和多连接）"""
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+def sqlite_pragmas(read_only: bool = False) -> list:
+    """连接建立时执行的 PRAGMA"""
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def _apply_pragmas(engine: AsyncEngine, read_only: bool):
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_engines(url: str) -> Tuple[AsyncEngine, AsyncEngine]:
+    """创建 (写引擎, 读引擎)，非文件型 SQLite 时两者为同一个引擎"""
+    if not is_sqlite_file(url):
+        engine = create_async_engine(url, echo=False)
+        return engine, engine
+
+    writer = create_async_engine(
+        url,
+        echo=False,
+        pool_size=settings.SQLITE_WRITER_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=settings.SQLITE_WRITER_POOL_TIMEOUT
+    )
+    reader = create_async_engine(
+        url,
+        echo=False,
+        pool_size=settings.SQLITE_READER_POOL_SIZE,
+        max_overflow=settings.SQLITE_READER_MAX_OVERFLOW
+    )
+    _apply_pragmas(writer, read_only=False)
+    _apply_pragmas(reader, read_only=True)
+    return writer, reader
+
+
+def _is_write_clause(clause) -> bool:
+    if isinstance(clause, (Insert, Update, Delete)):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith(("SELECT", "EXPLAIN"))
+    return False
+
+
+class RoutingSession(Session):
+    """按语句类型在读写引擎之间路由的会话（读写引擎通过 info 传入）"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        writer = self.info.get("writer_engine")
+        reader = self.info.get("reader_engine")
+        if writer is None or reader is None or writer is reader:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+        if self.info.get(WRITER_BIND_KEY) or self._flushing or _is_write_clause(clause):
+            # 事务内一旦写入，后续语句都使用写连接
+            self.info[WRITER_BIND_KEY] = True
+            return writer.sync_engine
+        return reader.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_writer_binding(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(WRITER_BIND_KEY, None)
@@ -0,0 +1,196 @@
+"""
+写入协调器（组提交）
+
+SQLite 同一时刻只有一个写事务。各服务各自提交时，进程内的写事务排队等写连接、每次提交各做一次 fsync，
+读后写的事务在 WAL 模式下还会因快照过期直接报 database is locked。
+
+这里把写操作封装为作业（接收会话的协程函数）交给后台任务执行：
+- 后台任务每次取出队列中的全部作业（最多 WRITE_BATCH_MAX_JOBS 个），在写连接上用 BEGIN IMMEDIATE 开启一个事务
+- 每个作业在各自的 SAVEPOINT 中执行，作业出错只回滚自己，异常抛给提交它的调用方
+- 整批只提交一次；遇到锁冲突时整批回滚并重试
+
+作业可能因重试被执行多次，只应修改数据库，不要自行 commit，外部副作用（缓存失效、广播等）放在作业返回之后。
+协调器未启动时（脚本、测试）作业在调用方直接执行。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import AsyncSessionLocal, engine
+from utils.exceptions import ServiceUnavailableError
+from utils.logger import get_logger
+from utils.metrics import DB_WRITE_BATCH_SIZE
+from utils.sqlite_engine import WRITER_BIND_KEY
+
+logger = get_logger(__name__)
+
+WriteJob = Callable[[AsyncSession], Awaitable[Any]]
+
+
+def _is_lock_error(error: Exception) -> bool:
+    return isinstance(error, OperationalError) and "locked" in str(error).lower()
+
+
+class _BatchRetry(Exception):
+    """批次中出现锁冲突，整批回滚后重试"""
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+
+
+class WriteCoordinator:
+    """写入协调器（单写连接 + 组提交）"""
+
+    def __init__(self, max_batch: int, max_pending: int, lock_retries: int):
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.lock_retries = lock_retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches_total = 0
+        self.jobs_total = 0
+        self.failed_total = 0
+        self.rejected_total = 0
+        self.retries_total = 0
+        self.max_batch_seen = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """执行完已提交的作业后停止"""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+
+    async def run(self, job: WriteJob) -> Any:
+        """提交写作业并等待其所在批次提交，返回作业的返回值"""
+        if not self.running:
+            outcomes = await self._execute([job])
+            ok, value = outcomes[0]
+            if ok:
+                return value
+            raise value
+
+        if self._queue.qsize() >= self.max_pending:
+            self.rejected_total += 1
+            raise ServiceUnavailableError("写入请求过多，请稍后再试")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((job, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # 调用方已取消的作业不再执行
+            pending = [(job, future) for job, future in batch if not future.done()]
+            try:
+                if pending:
+                    outcomes = await self._execute([job for job, _ in pending])
+                    for (_, future), (ok, value) in zip(pending, outcomes):
+                        if future.done():
+                            continue
+                        if ok:
+                            future.set_result(value)
+                        else:
+                            future.set_exception(value)
+            except Exception as e:
+                logger.exception("写入批次执行失败")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _execute(self, jobs: List[WriteJob]) -> List[tuple]:
+        """在一个事务中执行一批作业，返回每个作业的 (是否成功, 返回值或异常)"""
+        for attempt in range(self.lock_retries + 1):
+            try:
+                outcomes = await self._execute_once(jobs)
+            except _BatchRetry as retry:
+                error = retry.error
+            except Exception as e:
+                if not _is_lock_error(e):
+                    raise
+                error = e
+            else:
+                self.batches_total += 1
+                self.jobs_total += len(jobs)
+                self.failed_total += sum(1 for ok, _ in outcomes if not ok)
+                self.max_batch_seen = max(self.max_batch_seen, len(jobs))
+                DB_WRITE_BATCH_SIZE.observe(len(jobs))
+                return outcomes
+
+            if attempt == self.lock_retries:
+                self.failed_total += len(jobs)
+                raise error
+            self.retries_total += 1
+            logger.warning("写入批次遇到锁冲突，第 %d 次重试: %s", attempt + 1, error)
+            await asyncio.sleep(0.05 * (attempt + 1))
+
+    async def _execute_once(self, jobs: List[WriteJob]) -> List[tuple]:
+        outcomes = []
+        async with AsyncSessionLocal() as session:
+            # 整批都使用写连接；SQLite 先取得写锁，避免读后写时因快照过期失败
+            session.info[WRITER_BIND_KEY] = True
+            if engine.dialect.name == "sqlite":
+                await session.execute(text("BEGIN IMMEDIATE"))
+
+            for job in jobs:
+                try:
+                    async with session.begin_nested():
+                        value = await job(session)
+                except Exception as e:
+                    if _is_lock_error(e):
+                        raise _BatchRetry(e) from e
+                    outcomes.append((False, e))
+                else:
+                    outcomes.append((True, value))
+
+            await session.commit()
+        return outcomes
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度、批次大小等运行指标"""
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches_total": self.batches_total,
+            "jobs_total": self.jobs_total,
+            "avg_batch_size": round(self.jobs_total / self.batches_total, 2) if self.batches_total else 0,
+            "max_batch_size": self.max_batch_seen,
+            "failed_total": self.failed_total,
+            "rejected_total": self.rejected_total,
+            "lock_retries_total": self.retries_total,
+        }
+
+
+write_coordinator = WriteCoordinator(
+    settings.WRITE_BATCH_MAX_JOBS,
+    settings.WRITE_QUEUE_MAX_PENDING,
+    settings.WRITE_LOCK_RETRIES
+)